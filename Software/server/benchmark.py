@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Benchmark server triase tanpa hardware.
+
+App FastAPI dijalankan in-process (httpx ASGITransport) dengan sensor palsu
+dan backend model palsu (latensi batch bisa diatur), lalu /analyze dan
+/analyze/image ditembak pada beberapa tingkat konkurensi, dengan dan tanpa
+gambar. Dilaporkan throughput dan latensi p50/p95/p99, plus micro-benchmark
+decode, preprocessing dan evaluasi aturan. Hasil disimpan sebagai JSON supaya
+run bisa dibandingkan dari waktu ke waktu.
+
+Contoh:
+    python benchmark.py --concurrency 1,8,32 --requests 400
+    python benchmark.py --backend onnxruntime          # model export asli
+    python benchmark.py --compare bench_results/20250101-120000.json
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+# Log per request tidak ikut diukur (bisa di-override lewat environment)
+os.environ.setdefault("TRIAGE_LOG_LEVEL", "WARNING")
+
+import cv2
+import httpx
+import numpy as np
+
+import main
+from history import history_store
+from inference_backends import Detections, decode_yolo_output, get_backend_class
+from preprocessing import decode_image, prepare_frame
+from result_cache import ResultCache
+from serialization import available_formats, encode
+from sensor_service import sampler
+from sensor_trace import ReplaySource
+from triage_rules import evaluate_vitals, triage_batch
+from yolo_inference import yolo_analyzer
+
+MODES = ("sensor", "image", "image_bytes")
+
+
+class FakeSensor:
+    """Snapshot sensor palsu dengan variasi kecil (opsional latensi baca)"""
+
+    def __init__(self, latency_ms: float = 0.0, seed: int = 0):
+        self.latency = latency_ms / 1000.0
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self) -> Dict[str, Any]:
+        if self.latency:
+            time.sleep(self.latency)
+        return {
+            "temperature": round(float(self.rng.normal(37.0, 0.6)), 1),
+            "spo2": int(self.rng.integers(88, 100)),
+            "heartRate": int(self.rng.integers(55, 130)),
+            "bloodPressure": None,
+            "respiratoryRate": None,
+            "is_simulated": True,
+            "sampled_at": int(time.time() * 1000),
+        }
+
+
+class FakeBackend:
+    """
+    Backend model palsu: latensi = base_ms + per_image_ms x ukuran batch
+    (time.sleep melepas GIL seperti inferensi native)
+    """
+
+    name = "fake"
+    dynamic_imgsz = True
+
+    def __init__(self, imgsz: int = 640, base_ms: float = 20.0, per_image_ms: float = 5.0):
+        self.model_path = Path("fake-model")
+        self.imgsz = imgsz
+        self.base = base_ms / 1000.0
+        self.per_image = per_image_ms / 1000.0
+
+    def predict(self, images: List[np.ndarray], imgsz: Optional[int] = None) -> List[Detections]:
+        # Biaya per frame sebanding dengan jumlah piksel input
+        scale = ((imgsz or self.imgsz) / self.imgsz) ** 2
+        time.sleep(self.base + self.per_image * scale * len(images))
+        return [Detections(np.array([[100, 80, 300, 400]], np.float32),
+                           np.array([0.87], np.float32),
+                           np.array([2], np.int32)) for _ in images]
+
+
+def synthetic_jpeg(width: int, height: int, seed: int) -> bytes:
+    """Frame JPEG sintetis (gradasi + kotak + noise), berbeda per seed"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(30, 220, width, dtype=np.float32)
+    frame = np.repeat(np.tile(x, (height, 1))[:, :, None], 3, axis=2)
+    x0, y0 = int(rng.integers(0, width // 2)), int(rng.integers(0, height // 2))
+    frame[y0:y0 + height // 3, x0:x0 + width // 4] = rng.integers(150, 255, 3)
+    frame += rng.normal(0, 4, frame.shape)
+    return cv2.imencode('.jpg', np.clip(frame, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+
+
+_STUBBED = ("model", "model_fingerprint", "state", "state_detail", "backend_name", "cache")
+
+
+def install_stubs(args) -> Dict[str, Any]:
+    """
+    Pasang sensor palsu dan backend model ke app (tanpa lifespan/hardware).
+    Mengembalikan state lama untuk restore_stubs()
+    """
+    saved = {"get_sensor_data": main.get_sensor_data, "sensor_source": sampler.source,
+             "history_path": history_store.path, "validate_responses": main.config.VALIDATE_RESPONSES,
+             "yolo_available": main.YOLO_AVAILABLE,
+             **{name: getattr(yolo_analyzer, name) for name in _STUBBED}}
+    if args.sensor_trace:
+        # Sampler asli memutar ulang trace (PPG -> HR/SpO2 ikut terukur)
+        sampler.source = ReplaySource(args.sensor_trace, speed=args.sensor_trace_speed)
+        sampler.start()
+        deadline = time.monotonic() + 30.0
+        while True:
+            try:
+                sampler.snapshot()
+                break
+            except RuntimeError:
+                # Estimator PPG butuh satu window penuh sebelum HR/SpO2 ada
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+    else:
+        main.get_sensor_data = FakeSensor(latency_ms=args.sensor_latency_ms)
+
+    if args.backend == "fake":
+        backend = FakeBackend(imgsz=args.imgsz, base_ms=args.fake_base_ms, per_image_ms=args.fake_per_image_ms)
+    else:
+        yolo_analyzer.backend_name = args.backend
+        yolo_analyzer.load()
+        if not yolo_analyzer.ready:
+            raise SystemExit(f"Backend {args.backend} tidak siap: {yolo_analyzer.state_detail}")
+        backend = yolo_analyzer.model
+
+    yolo_analyzer.model = backend
+    yolo_analyzer.model_fingerprint = f"benchmark:{backend.name}:{backend.imgsz}"
+    yolo_analyzer.state = yolo_analyzer.STATE_READY
+    # Backend palsu tidak butuh library backend yang terinstall
+    main.YOLO_AVAILABLE = True
+    if args.history:
+        # Ukur /analyze dengan penulisan riwayat SQLite aktif
+        history_store.path = Path(args.history)
+        history_store.start()
+    if args.no_validate:
+        main.config.VALIDATE_RESPONSES = False
+    if not args.cache:
+        # Frame identik tidak boleh dilayani dari cache saat mengukur model
+        yolo_analyzer.cache = ResultCache(max_entries=0)
+    return saved
+
+
+def restore_stubs(saved: Dict[str, Any]):
+    main.get_sensor_data = saved.pop("get_sensor_data")
+    history_store.close()
+    history_store.path = saved.pop("history_path")
+    main.config.VALIDATE_RESPONSES = saved.pop("validate_responses")
+    main.YOLO_AVAILABLE = saved.pop("yolo_available")
+    source = saved.pop("sensor_source")
+    if sampler.source is not source:
+        sampler.stop()
+        sampler.source = source
+    for name, value in saved.items():
+        setattr(yolo_analyzer, name, value)
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {}
+    values = np.asarray(samples_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+async def run_load(client: httpx.AsyncClient, mode: str, concurrency: int, total: int,
+                   images: List[bytes], warmup: int) -> Dict[str, Any]:
+    """Tembak endpoint sebanyak total request dengan concurrency worker"""
+    encoded = ["data:image/jpeg;base64," + base64.b64encode(image).decode() for image in images]
+
+    async def one(i: int) -> httpx.Response:
+        if mode == "sensor":
+            response = await client.post("/analyze", json={})
+        elif mode == "image":
+            response = await client.post("/analyze", json={"imageData": encoded[i % len(encoded)]})
+        else:
+            response = await client.post("/analyze/image", content=images[i % len(images)],
+                                         headers={"content-type": "application/octet-stream"})
+        return response
+
+    for i in range(warmup):
+        await one(i)
+
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    tiers: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            response = await one(i)
+            latencies.append((time.perf_counter() - start) * 1000.0)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            # Tier degradasi vision yang dipakai (--budget-ms)
+            tier = response.headers.get("x-vision-tier")
+            if tier is not None:
+                tiers[tier] = tiers.get(tier, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "requests": total,
+        "seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "status": statuses,
+        "tiers": tiers,
+        **percentiles(latencies),
+    }
+
+
+def micro(name: str, fn: Callable[[], Any], repeat: int, inner: int = 1) -> Dict[str, Any]:
+    """Ukur fn() (inner kali per sampel) sebanyak repeat sampel"""
+    fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - start) * 1e6 / inner)
+    values = np.asarray(samples)
+    return {
+        "name": name,
+        "repeat": repeat,
+        "inner": inner,
+        "median_us": round(float(np.median(values)), 3),
+        "p95_us": round(float(np.percentile(values, 95)), 3),
+        "min_us": round(float(values.min()), 3),
+    }
+
+
+def run_micro(args, image: bytes) -> List[Dict[str, Any]]:
+    repeat = args.micro_repeat
+    encoded = base64.b64encode(image).decode()
+    buffer = np.empty((args.imgsz, args.imgsz, 3), dtype=np.uint8)
+    decoded, shape, reduction = decode_image(image, args.imgsz)
+    full = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+
+    rng = np.random.default_rng(0)
+    records = main.BATCH_RECORDS.validate_python([
+        {"temperature": float(t), "spo2": int(s), "heartRate": int(h),
+         "bloodPressure": {"systolic": int(sy), "diastolic": int(di)}}
+        for t, s, h, sy, di in zip(rng.uniform(35, 40, args.batch_records), rng.integers(80, 100, args.batch_records),
+                                   rng.integers(40, 160, args.batch_records), rng.integers(90, 200, args.batch_records),
+                                   rng.integers(50, 130, args.batch_records))
+    ])
+    # Keluaran mentah 8400 anchor: skor rendah kecuali ~30 kandidat deteksi
+    raw_output = rng.random((4 + 6, 8400), dtype=np.float32) * np.array([640, 640, 80, 80] + [0.2] * 6,
+                                                                         dtype=np.float32)[:, None]
+    raw_output[4 + rng.integers(0, 6, 30), rng.integers(0, 8400, 30)] = 0.8
+    sensor_reading = FakeSensor()()
+    vision = yolo_analyzer._build_analysis(FakeBackend().predict([buffer])[0], batch_size=1)
+    payload = main._build_payload(sensor_reading, vision)
+
+    return [
+        micro("base64_decode", lambda: base64.b64decode(encoded), repeat),
+        micro("imdecode_full", lambda: cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR), repeat),
+        micro("decode_reduced", lambda: decode_image(image, args.imgsz), repeat),
+        micro("letterbox_from_full", lambda: prepare_frame(full, args.imgsz, out=buffer), repeat),
+        micro("letterbox_from_reduced", lambda: prepare_frame(decoded, args.imgsz, shape=shape,
+                                                              reduction=reduction, out=buffer), repeat),
+        micro("decode_yolo_output", lambda: decode_yolo_output(raw_output, 0.3, 0.5), repeat),
+        micro("evaluate_vitals", lambda: evaluate_vitals(38.2, 91, 125, {"systolic": 150, "diastolic": 95}),
+              repeat, inner=100),
+        micro("build_response", lambda: main._build_response(sensor_reading, vision), repeat, inner=20),
+        micro(f"triage_batch_{args.batch_records}", lambda: triage_batch(records), max(3, repeat // 10)),
+        micro("serialize_validated_json", lambda: json.dumps(main.AnalyzeResponse.model_validate(
+            payload).model_dump(mode="json")).encode(), repeat, inner=20),
+    ] + [
+        micro(f"serialize_{media_type.split('/')[1]}", lambda media_type=media_type: encode(payload, media_type),
+              repeat, inner=20)
+        for media_type in available_formats()
+    ]
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(current: Dict[str, Any], previous_path: Path):
+    """Cetak perbandingan throughput dan p99 dengan run sebelumnya"""
+    previous = json.loads(previous_path.read_text(encoding="utf-8"))
+    before = {(r["mode"], r["concurrency"]): r for r in previous.get("load", [])}
+    print(f"\nPerbandingan dengan {previous_path} ({previous.get('environment', {}).get('git_commit')})")
+    for result in current["load"]:
+        old = before.get((result["mode"], result["concurrency"]))
+        if not old or "p99_ms" not in old or "p99_ms" not in result:
+            continue
+        print(f"  {result['mode']:<12} c={result['concurrency']:<4} "
+              f"rps {old['throughput_rps']:>9.1f} -> {result['throughput_rps']:>9.1f} "
+              f"({result['throughput_rps'] / old['throughput_rps'] - 1:+.1%})  "
+              f"p99 {old['p99_ms']:>8.2f} -> {result['p99_ms']:>8.2f} ms")
+    old_micro = {m["name"]: m for m in previous.get("micro", [])}
+    for m in current["micro"]:
+        old = old_micro.get(m["name"])
+        if old:
+            print(f"  {m['name']:<26} {old['median_us']:>10.1f} -> {m['median_us']:>10.1f} us "
+                  f"({m['median_us'] / old['median_us'] - 1:+.1%})")
+
+
+async def run(args) -> Dict[str, Any]:
+    saved = install_stubs(args)
+    model = {"backend": yolo_analyzer.model.name, "imgsz": yolo_analyzer.model.imgsz}
+    width, height = (int(v) for v in args.image_size.lower().split("x"))
+    if args.image:
+        images = [Path(args.image).read_bytes()]
+    else:
+        images = [synthetic_jpeg(width, height, seed) for seed in range(args.image_pool)]
+
+    load = []
+    headers = {"accept": args.accept}
+    if args.budget_ms:
+        headers["x-latency-budget-ms"] = str(args.budget_ms)
+    try:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=120.0,
+                                     headers=headers) as client:
+            for mode in args.modes:
+                for concurrency in args.concurrency:
+                    result = await run_load(client, mode, concurrency, args.requests, images, args.warmup)
+                    load.append(result)
+                    print(f"{mode:<12} c={concurrency:<4} {result['throughput_rps']:>9.1f} req/s  "
+                          f"p50 {result.get('p50_ms', 0):>8.2f}  p95 {result.get('p95_ms', 0):>8.2f}  "
+                          f"p99 {result.get('p99_ms', 0):>8.2f} ms  status {result['status']}"
+                          + (f"  tier {result['tiers']}" if args.budget_ms else ""))
+
+        micro_results = [] if args.no_micro else run_micro(args, images[0])
+        for m in micro_results:
+            print(f"{m['name']:<26} median {m['median_us']:>10.1f} us  p95 {m['p95_us']:>10.1f} us")
+        batching = yolo_analyzer.batcher.stats()
+        degradation = main.tier_planner.stats()
+        history_store.flush()
+        history = history_store.stats() if args.history else None
+    finally:
+        yolo_analyzer.batcher.close()
+        restore_stubs(saved)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "settings": {
+            **model,
+            "modes": args.modes,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "image": args.image or f"synthetic {args.image_size} x{args.image_pool}",
+            "image_bytes": len(images[0]),
+            "cache": args.cache,
+            "accept": args.accept,
+            "validate_responses": not args.no_validate,
+            "latency_budget_ms": args.budget_ms,
+            "sensor_latency_ms": args.sensor_latency_ms,
+            "sensor_trace": args.sensor_trace,
+            "fake_base_ms": args.fake_base_ms if args.backend == "fake" else None,
+            "fake_per_image_ms": args.fake_per_image_ms if args.backend == "fake" else None,
+            "batch_max_size": yolo_analyzer.batcher.max_batch_size,
+            "batch_max_wait_ms": yolo_analyzer.batcher.max_wait * 1000.0,
+            "vision_workers": main.config.VISION_WORKERS,
+        },
+        "load": load,
+        "batching": batching,
+        "degradation": degradation,
+        "history": history,
+        "micro": micro_results,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark server triase (in-process, tanpa hardware)")
+    parser.add_argument("--concurrency", default="1,4,16",
+                        type=lambda s: [int(v) for v in s.split(",") if v], help="daftar konkurensi, mis. 1,8,32")
+    parser.add_argument("--requests", type=int, default=200, help="request per kombinasi mode/konkurensi")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--modes", default=",".join(MODES),
+                        type=lambda s: [m for m in s.split(",") if m], help=f"subset dari {','.join(MODES)}")
+    parser.add_argument("--backend", default="fake", help="fake atau nama backend (torch/onnxruntime/openvino)")
+    parser.add_argument("--imgsz", type=int, default=main.config.INFERENCE_IMGSZ)
+    parser.add_argument("--fake-base-ms", type=float, default=20.0, help="latensi forward pass backend palsu")
+    parser.add_argument("--fake-per-image-ms", type=float, default=5.0, help="tambahan latensi per frame di batch")
+    parser.add_argument("--sensor-latency-ms", type=float, default=0.0)
+    parser.add_argument("--sensor-trace", help="replay trace sensor (.npy/.csv) lewat sampler asli")
+    parser.add_argument("--sensor-trace-speed", type=float, default=10.0, help="laju replay (0 = secepat mungkin)")
+    parser.add_argument("--image", help="file gambar (default: JPEG sintetis)")
+    parser.add_argument("--image-size", default="1280x720")
+    parser.add_argument("--image-pool", type=int, default=16, help="jumlah frame sintetis berbeda")
+    parser.add_argument("--history", help="aktifkan riwayat triase SQLite di file ini selama load test")
+    parser.add_argument("--cache", action="store_true", help="aktifkan result cache saat load test")
+    parser.add_argument("--accept", default="application/json",
+                        help="header Accept load test (application/msgpack, application/cbor)")
+    parser.add_argument("--no-validate", action="store_true", help="lewati validasi response (mode produksi)")
+    parser.add_argument("--budget-ms", type=float, default=0.0,
+                        help="header X-Latency-Budget-Ms load test (degradasi tier vision, 0 = tanpa)")
+    parser.add_argument("--no-micro", action="store_true", help="lewati micro-benchmark")
+    parser.add_argument("--micro-repeat", type=int, default=50)
+    parser.add_argument("--batch-records", type=int, default=10000)
+    parser.add_argument("--output", help="file JSON hasil (default: bench_results/<waktu>.json)")
+    parser.add_argument("--compare", type=Path, help="JSON run sebelumnya untuk dibandingkan")
+    args = parser.parse_args(argv)
+
+    unknown = set(args.modes) - set(MODES)
+    if unknown:
+        parser.error(f"mode tidak dikenal: {', '.join(sorted(unknown))}")
+    if args.backend != "fake":
+        get_backend_class(args.backend)
+    return args
+
+
+def main_cli(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    args = parse_args(argv)
+    results = asyncio.run(run(args))
+
+    output = Path(args.output) if args.output else \
+        Path(__file__).resolve().parent / "bench_results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"\nHasil disimpan ke {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return results
+
+
+if __name__ == "__main__":
+    main_cli(sys.argv[1:])
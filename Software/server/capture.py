@@ -0,0 +1,310 @@
+"""
+Ingest kamera lokal / file video langsung di server.
+
+Setiap sumber cv2.VideoCapture (kamera USB atau file video untuk testing)
+punya:
+- producer thread yang membaca frame secepat sumbernya dan menaruhnya di
+  slot "frame terbaru" (frame lama yang belum diproses ditimpa/dibuang)
+- consumer thread yang mengambil frame terbaru dan menganalisisnya dengan
+  YOLOHealthAnalyzer.analyze_frame (tanpa encode/base64/HTTP/decode)
+
+Analisis frame capture lewat vision_scheduler dengan prioritas di bawah
+LOW, jadi request HTTP/WebSocket selalu didahulukan dan bisa menggusur
+frame capture saat antrian penuh; frame yang ditolak/digusur dibuang.
+
+Hasil analisis terbaru per sumber dibaca lewat endpoint /capture.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import CancelledError, wait
+from typing import Any, Dict, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+import config
+from vision_scheduler import QueueFullError, vision_scheduler
+from yolo_inference import yolo_analyzer
+
+logger = logging.getLogger(__name__)
+
+# Prioritas antrian vision untuk frame capture: di bawah LOW (rank 0)
+CAPTURE_PRIORITY = -1
+CAPTURE_LABEL = "CAPTURE"
+
+
+def parse_sources(spec: str) -> Dict[str, Union[int, str]]:
+    """
+    Parse daftar sumber "nama=sumber,..." (sumber angka = index kamera)
+
+    Contoh: "bed-1=0,demo=videos/pasien.mp4". Tanpa "nama=" sumber
+    dinamai cam0, cam1, dst.
+    """
+    sources: Dict[str, Union[int, str]] = {}
+    for i, item in enumerate(part.strip() for part in spec.split(',')):
+        if not item:
+            continue
+        name, sep, source = item.partition('=')
+        if not sep:
+            name, source = f"cam{i}", item
+        source = source.strip()
+        sources[name.strip()] = int(source) if source.isdigit() else source
+    return sources
+
+
+class LatestFrame:
+    """Slot satu frame: put() menimpa frame yang belum diambil (frame dropping)"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._seq = 0
+        self._captured_at = 0.0
+        self._taken_seq = 0
+        self.dropped = 0
+
+    def put(self, frame: np.ndarray, captured_at: float):
+        with self._cond:
+            if self._frame is not None and self._seq != self._taken_seq:
+                self.dropped += 1
+            self._frame = frame
+            self._captured_at = captured_at
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, after_seq: int, timeout: Optional[float] = None) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Frame terbaru dengan nomor urut > after_seq, None jika timeout"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > after_seq, timeout):
+                return None
+            self._taken_seq = self._seq
+            return self._seq, self._frame, self._captured_at
+
+
+class CaptureSource:
+    """Satu sumber VideoCapture dengan producer dan consumer thread"""
+
+    def __init__(self, name: str, source: Union[int, str], analyzer, loop_video: bool = True,
+                 min_interval_s: float = 0.0, reconnect_s: float = 2.0, scheduler=None):
+        """
+        Args:
+            name: Nama sumber (juga dipakai sebagai station_id motion gate)
+            source: Index kamera atau path/URL video
+            analyzer: YOLOHealthAnalyzer
+            loop_video: Putar ulang file video dari awal saat habis
+            min_interval_s: Jeda minimum antar analisis (0 = secepat mungkin)
+            reconnect_s: Jeda sebelum membuka ulang sumber yang gagal
+            scheduler: VisionScheduler (default: vision_scheduler global)
+        """
+        self.name = name
+        self.source = source
+        self.analyzer = analyzer
+        self.loop_video = loop_video
+        self.min_interval = max(0.0, min_interval_s)
+        self.reconnect_s = reconnect_s
+        self.scheduler = scheduler if scheduler is not None else vision_scheduler
+
+        self.slot = LatestFrame()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+        self.opened = False
+        self.error: Optional[str] = None
+        self.frames_read = 0
+        self.frames_analyzed = 0
+        self.frames_rejected = 0
+        self.source_fps: Optional[float] = None
+        self.frame_shape: Optional[Tuple[int, ...]] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.result_captured_at: Optional[float] = None
+        self.result_at: Optional[float] = None
+        self.analysis_seconds: Optional[float] = None
+
+    @property
+    def is_file(self) -> bool:
+        return isinstance(self.source, str) and '://' not in self.source
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._produce, name=f"capture-{self.name}", daemon=True),
+            threading.Thread(target=self._consume, name=f"analyze-{self.name}", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=3.0)
+        self._threads = []
+
+    def _open(self) -> Optional[cv2.VideoCapture]:
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            cap.release()
+            return None
+        if not self.is_file:
+            # Kamera: jangan menumpuk frame di buffer driver
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.source_fps = fps if fps and fps > 0 else None
+        return cap
+
+    def _produce(self):
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                self.opened = False
+                self.error = f"Sumber {self.source!r} tidak bisa dibuka"
+                logger.warning("Sumber capture %s (%r) tidak bisa dibuka", self.name, self.source)
+                self._stop.wait(self.reconnect_s)
+                continue
+
+            self.opened = True
+            self.error = None
+            # File video dibaca sesuai fps aslinya seperti kamera sungguhan
+            frame_period = 1.0 / self.source_fps if self.is_file and self.source_fps else 0.0
+            next_due = time.monotonic()
+            try:
+                while not self._stop.is_set():
+                    ok, frame = cap.read()
+                    if not ok:
+                        if self.is_file and self.loop_video and self.frames_read:
+                            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                            continue
+                        self.error = "Stream berakhir" if self.is_file else "Gagal membaca frame"
+                        logger.warning("Capture %s: %s", self.name, self.error)
+                        break
+                    self.frames_read += 1
+                    self.frame_shape = frame.shape
+                    self.slot.put(frame, time.time())
+
+                    if frame_period:
+                        next_due += frame_period
+                        delay = next_due - time.monotonic()
+                        if delay > 0:
+                            self._stop.wait(delay)
+                        else:
+                            next_due = time.monotonic()
+            finally:
+                cap.release()
+                self.opened = False
+
+            if self.is_file and not self.loop_video:
+                return
+            self._stop.wait(self.reconnect_s)
+
+    def _consume(self):
+        last_seq = 0
+        while not self._stop.is_set():
+            if not self.analyzer.ready:
+                # Model belum siap: frame tetap dibaca (dan dibuang) producer
+                self.analyzer.wait_loaded(timeout=1.0)
+                if not self.analyzer.ready:
+                    self._stop.wait(1.0)
+                continue
+
+            item = self.slot.get(last_seq, timeout=1.0)
+            if item is None:
+                continue
+            last_seq, frame, captured_at = item
+
+            start = time.monotonic()
+            try:
+                result = self._analyze(frame)
+            except (QueueFullError, CancelledError) as e:
+                # Antrian vision penuh/digusur request: frame ini dibuang
+                with self._lock:
+                    self.frames_rejected += 1
+                self._stop.wait(getattr(e, 'retry_after_s', 0) or self.reconnect_s)
+                continue
+            if result is None:
+                continue
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.frames_analyzed += 1
+                self.result = result
+                self.result_captured_at = captured_at
+                self.result_at = time.time()
+                self.analysis_seconds = elapsed
+
+            if self.min_interval > elapsed:
+                self._stop.wait(self.min_interval - elapsed)
+
+    def _analyze(self, frame: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Analisis frame lewat antrian vision; None jika dihentikan saat menunggu"""
+        future = self.scheduler.submit(self.analyzer.analyze_frame, frame, self.name,
+                                       priority=CAPTURE_PRIORITY, label=CAPTURE_LABEL)
+        while not wait([future], timeout=0.5).done:
+            if self._stop.is_set():
+                future.cancel()
+                return None
+        return future.result()
+
+    def latest(self) -> Tuple[Optional[Dict[str, Any]], Optional[float], Optional[float]]:
+        """(hasil analisis terbaru, waktu frame ditangkap, waktu analisis selesai)"""
+        with self._lock:
+            return self.result, self.result_captured_at, self.result_at
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'source': self.source,
+                'opened': self.opened,
+                'error': self.error,
+                'source_fps': self.source_fps,
+                'frame_shape': list(self.frame_shape) if self.frame_shape else None,
+                'frames_read': self.frames_read,
+                'frames_analyzed': self.frames_analyzed,
+                'frames_dropped': self.slot.dropped,
+                'frames_rejected': self.frames_rejected,
+                'last_analysis_ms': round(self.analysis_seconds * 1000.0, 1) if self.analysis_seconds is not None else None
+            }
+
+
+class CaptureManager:
+    """Kumpulan sumber capture yang dijalankan bersama server"""
+
+    def __init__(self, analyzer, loop_video: bool = True, min_interval_s: float = 0.0, scheduler=None):
+        self.analyzer = analyzer
+        self.scheduler = scheduler
+        self.loop_video = loop_video
+        self.min_interval = min_interval_s
+        self.sources: Dict[str, CaptureSource] = {}
+
+    def add(self, name: str, source: Union[int, str]) -> CaptureSource:
+        if name in self.sources:
+            raise ValueError(f"Sumber capture '{name}' sudah ada")
+        capture = CaptureSource(name, source, self.analyzer, loop_video=self.loop_video,
+                                min_interval_s=self.min_interval, scheduler=self.scheduler)
+        self.sources[name] = capture
+        capture.start()
+        return capture
+
+    def start(self, spec: str) -> int:
+        """Jalankan semua sumber dari konfigurasi, return jumlah sumber"""
+        for name, source in parse_sources(spec).items():
+            self.add(name, source)
+        return len(self.sources)
+
+    def stop(self):
+        for capture in self.sources.values():
+            capture.stop()
+        self.sources.clear()
+
+    def get(self, name: str) -> Optional[CaptureSource]:
+        return self.sources.get(name)
+
+
+# Global instance, sumber dari TRIAGE_CAPTURE_SOURCES dijalankan saat startup
+capture_manager = CaptureManager(
+    yolo_analyzer,
+    loop_video=config.CAPTURE_LOOP_VIDEO,
+    min_interval_s=config.CAPTURE_MIN_INTERVAL_S
+)
@@ -0,0 +1,192 @@
+"""
+Konfigurasi server Health AI.
+
+Semua nilai bisa di-override lewat environment variable supaya deployment
+(Raspberry Pi, laptop dev, dll) tidak perlu mengubah kode.
+"""
+
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Jumlah thread untuk pembacaan sensor I2C. Default 1 karena semua sensor
+# berbagi satu bus I2C.
+SENSOR_WORKERS = _env_int("TRIAGE_SENSOR_WORKERS", 1)
+
+# Sampler sensor di background: PPG (MAX30102) dibaca SENSOR_PPG_RATE_HZ kali
+# per detik, suhu (MLX90614) tiap SENSOR_TEMP_INTERVAL_S detik. Ring buffer
+# menyimpan SENSOR_BUFFER_SECONDS detik terakhir.
+SENSOR_PPG_RATE_HZ = _env_float("TRIAGE_SENSOR_PPG_RATE_HZ", 50.0)
+SENSOR_TEMP_INTERVAL_S = _env_float("TRIAGE_SENSOR_TEMP_INTERVAL_S", 1.0)
+SENSOR_BUFFER_SECONDS = _env_float("TRIAGE_SENSOR_BUFFER_SECONDS", 30.0)
+
+# Jumlah sampel PPG per update HR/SpO2 (10 sampel @50Hz = 5 update/detik)
+SENSOR_PPG_CHUNK = _env_int("TRIAGE_SENSOR_PPG_CHUNK", 10)
+
+# Snapshot lebih tua dari ini dianggap sensor gagal (503)
+SENSOR_STALE_S = _env_float("TRIAGE_SENSOR_STALE_S", 3.0)
+
+# Waktu tunggu sampel pertama setelah sampler baru dimulai
+SENSOR_STARTUP_WAIT_S = _env_float("TRIAGE_SENSOR_STARTUP_WAIT_S", 2.0)
+
+# Konfigurasi beberapa station (bed) per Pi, masing-masing dengan sensor,
+# kamera dan pasien sendiri (lihat stations.example.json). Jika file tidak
+# ada, server berjalan dengan satu set sensor default.
+STATIONS_PATH = os.getenv("TRIAGE_STATIONS_PATH", "stations.json")
+
+# Sumber data sensor: "hardware" (MLX90614 + MAX30102 di I2C) atau "replay"
+# (putar ulang trace .npy/.csv dari sensor_trace.py). SENSOR_REPLAY_SPEED
+# mengalikan laju replay (0 = secepat mungkin). SENSOR_RECORD_PATH (opsional)
+# merekam sampel yang dibaca sampler ke trace.
+SENSOR_BACKEND = os.getenv("TRIAGE_SENSOR_BACKEND", "hardware").strip().lower()
+SENSOR_REPLAY_PATH = os.getenv("TRIAGE_SENSOR_REPLAY_PATH", "traces/sensor.npy")
+SENSOR_REPLAY_SPEED = _env_float("TRIAGE_SENSOR_REPLAY_SPEED", 1.0)
+SENSOR_REPLAY_LOOP = _env_bool("TRIAGE_SENSOR_REPLAY_LOOP", True)
+SENSOR_RECORD_PATH = os.getenv("TRIAGE_SENSOR_RECORD_PATH", "")
+
+# Model YOLO medis custom. Jika tidak ada, FALLBACK_MODEL (COCO) dipakai
+# untuk demo; ALLOW_MODEL_DOWNLOAD=0 mencegah ultralytics mengunduhnya.
+MODEL_PATH = os.getenv("TRIAGE_MODEL_PATH", os.getenv("AI_MODEL_PATH", "models/health_triage_yolo.pt"))
+FALLBACK_MODEL = os.getenv("TRIAGE_FALLBACK_MODEL", "yolov8n.pt")
+ALLOW_MODEL_DOWNLOAD = _env_bool("TRIAGE_ALLOW_MODEL_DOWNLOAD", True)
+
+# Backend inferensi (CPU): torch (ultralytics .pt), onnxruntime atau openvino.
+# Backend ONNX Runtime/OpenVINO memakai EXPORTED_MODEL_PATH, default file
+# .onnx di sebelah MODEL_PATH (hasil export train_yolo.py).
+INFERENCE_BACKEND = os.getenv("TRIAGE_INFERENCE_BACKEND", "torch")
+EXPORTED_MODEL_PATH = os.getenv("TRIAGE_EXPORTED_MODEL_PATH", "")
+
+# Ukuran input inferensi dan jumlah warm-up dengan frame dummy setelah model
+# dimuat. Model ONNX/OpenVINO dengan input tetap memakai ukuran dari model.
+INFERENCE_IMGSZ = _env_int("TRIAGE_INFERENCE_IMGSZ", 640)
+WARMUP_RUNS = _env_int("TRIAGE_WARMUP_RUNS", 1)
+
+# Decode JPEG langsung pada skala 1/2, 1/4 atau 1/8 selama sisi terpanjang
+# masih >= ukuran input inferensi (hemat waktu decode dan memori foto 12MP)
+REDUCED_DECODE = _env_bool("TRIAGE_REDUCED_DECODE", True)
+
+# Cache hasil inferensi per isi gambar (LRU + TTL) untuk frame yang dikirim
+# ulang client. RESULT_CACHE_SIZE=0 mematikan cache.
+RESULT_CACHE_SIZE = _env_int("TRIAGE_RESULT_CACHE_SIZE", 256)
+RESULT_CACHE_TTL_S = _env_float("TRIAGE_RESULT_CACHE_TTL_S", 30.0)
+
+# Motion gate untuk feed kamera per station: frame yang bagian berubahnya
+# (piksel thumbnail 64px dengan selisih > MOTION_PIXEL_DELTA) di bawah
+# MOTION_THRESHOLD memakai hasil deteksi sebelumnya, paling lama
+# MOTION_MAX_AGE_S detik. MOTION_THRESHOLD=0 mematikan gate.
+MOTION_THRESHOLD = _env_float("TRIAGE_MOTION_THRESHOLD", 0.02)
+MOTION_PIXEL_DELTA = _env_int("TRIAGE_MOTION_PIXEL_DELTA", 12)
+MOTION_MAX_AGE_S = _env_float("TRIAGE_MOTION_MAX_AGE_S", 10.0)
+# Jumlah station (ID dari client) yang state motion gate-nya disimpan (LRU)
+MOTION_MAX_STATIONS = _env_int("TRIAGE_MOTION_MAX_STATIONS", 64)
+
+# Capture kamera/video langsung di server: daftar "nama=sumber" dipisah koma,
+# sumber angka = index kamera USB, selain itu path/URL video. Contoh:
+# TRIAGE_CAPTURE_SOURCES="bed-1=0,demo=videos/pasien.mp4"
+CAPTURE_SOURCES = os.getenv("TRIAGE_CAPTURE_SOURCES", "")
+CAPTURE_LOOP_VIDEO = _env_bool("TRIAGE_CAPTURE_LOOP_VIDEO", True)
+CAPTURE_MIN_INTERVAL_S = _env_float("TRIAGE_CAPTURE_MIN_INTERVAL_S", 0.0)
+
+# Micro-batching inferensi YOLO: frame yang datang bersamaan dikumpulkan
+# sampai BATCH_MAX_SIZE frame atau BATCH_MAX_WAIT_MS milidetik, lalu
+# dijalankan dalam satu forward pass.
+BATCH_MAX_SIZE = _env_int("TRIAGE_BATCH_MAX_SIZE", 8)
+BATCH_MAX_WAIT_MS = _env_float("TRIAGE_BATCH_MAX_WAIT_MS", 15.0)
+
+# Jumlah thread untuk analisis visual (decode gambar + YOLO). Thread ini
+# sebagian besar menunggu hasil batch, jadi samakan dengan ukuran batch
+# supaya batch bisa terisi penuh.
+VISION_WORKERS = _env_int("TRIAGE_VISION_WORKERS", BATCH_MAX_SIZE)
+
+# Antrian prioritas pekerjaan vision (risiko sensor lalu waktu datang).
+# Jika VISION_QUEUE_SIZE pekerjaan sudah menunggu, request baru dijawab 429
+# + Retry-After (atau menggusur pekerjaan berisiko lebih rendah).
+VISION_QUEUE_SIZE = _env_int("TRIAGE_VISION_QUEUE_SIZE", 4 * VISION_WORKERS)
+
+# Degradasi vision berbasis deadline: anggaran latensi per request (header
+# X-Latency-Budget-Ms, default LATENCY_BUDGET_MS; 0 = tanpa batas). Tier
+# dipilih dari perkiraan waktu antri + latensi terukur per tier: full ->
+# reduced (input REDUCED_IMGSZ) -> small (SMALL_MODEL_PATH, mis. model n/int8
+# hasil export dengan kelas yang sama) -> sensor saja. Estimasi tier yang
+# tidak terukur selama TIER_STALE_S detik dilupakan supaya tier itu dicoba lagi.
+LATENCY_BUDGET_MS = _env_float("TRIAGE_LATENCY_BUDGET_MS", 0.0)
+REDUCED_IMGSZ = _env_int("TRIAGE_REDUCED_IMGSZ", 320)
+SMALL_MODEL_PATH = os.getenv("TRIAGE_SMALL_MODEL_PATH", "")
+TIER_STALE_S = _env_float("TRIAGE_TIER_STALE_S", 30.0)
+
+# Hasil analisis visual dalam bentuk kolom array (boxes/scores/classes) dan
+# ringkasan per kondisi, bukan dict per box
+VISION_COMPACT_OUTPUT = _env_bool("TRIAGE_VISION_COMPACT_OUTPUT", False)
+
+# Validasi response /analyze terhadap AnalyzeResponse sebelum dikirim.
+# Mode produksi: 0, payload dict langsung diserialisasi (orjson/msgpack/CBOR)
+VALIDATE_RESPONSES = _env_bool("TRIAGE_VALIDATE_RESPONSES", True)
+
+# Interval cek sensor untuk push WebSocket /ws/triage. Vitals hanya dikirim
+# jika ada sampel baru, hasil triase hanya jika berubah.
+WS_PUSH_INTERVAL_S = _env_float("TRIAGE_WS_PUSH_INTERVAL_S", 0.2)
+
+# Umur maksimum hasil analisis visual WebSocket. Tanpa frame baru selama ini,
+# triase kembali memakai sensor saja (0 = hasil visual tidak kedaluwarsa)
+WS_VISION_MAX_AGE_S = _env_float("TRIAGE_WS_VISION_MAX_AGE_S", 10.0)
+
+# Jumlah record maksimum per request /analyze/batch
+BATCH_TRIAGE_MAX_RECORDS = _env_int("TRIAGE_BATCH_TRIAGE_MAX_RECORDS", 100000)
+
+# File aturan triase deklaratif (relatif terhadap folder server) dan interval
+# pengecekan perubahan untuk hot reload
+RULES_PATH = os.getenv("TRIAGE_RULES_PATH", "triage_rules.json")
+RULES_RELOAD_INTERVAL_S = _env_float("TRIAGE_RULES_RELOAD_INTERVAL_S", 2.0)
+
+# Logging: level root (dan per logger, mis. "yolo_inference=DEBUG"), format
+# "text" atau "json", ukuran queue (record dibuang jika penuh), rate limit
+# per template pesan dan fraksi request yang pesan DEBUG/INFO-nya dicatat
+LOG_LEVEL = os.getenv("TRIAGE_LOG_LEVEL", "INFO")
+LOG_LEVELS = os.getenv("TRIAGE_LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("TRIAGE_LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = _env_int("TRIAGE_LOG_QUEUE_SIZE", 10000)
+LOG_RATE_LIMIT_PER_S = _env_float("TRIAGE_LOG_RATE_LIMIT_PER_S", 20.0)
+LOG_REQUEST_SAMPLE_RATE = _env_float("TRIAGE_LOG_REQUEST_SAMPLE_RATE", 1.0)
+
+# Riwayat hasil triase (SQLite WAL). Default kosong (nonaktif); isi dengan
+# path absolut (lihat setup_iot.md) supaya lokasi database tidak bergantung
+# pada direktori kerja proses. Record ditulis per batch (HISTORY_BATCH_SIZE record atau tiap
+# HISTORY_FLUSH_INTERVAL_S detik) oleh thread writer; jika queue
+# (HISTORY_QUEUE_SIZE) penuh, record dibuang dan dihitung.
+HISTORY_PATH = os.getenv("TRIAGE_HISTORY_PATH", "")
+HISTORY_BATCH_SIZE = _env_int("TRIAGE_HISTORY_BATCH_SIZE", 200)
+HISTORY_FLUSH_INTERVAL_S = _env_float("TRIAGE_HISTORY_FLUSH_INTERVAL_S", 1.0)
+HISTORY_QUEUE_SIZE = _env_int("TRIAGE_HISTORY_QUEUE_SIZE", 10000)
+
+# Deployment multi-worker: dengan IPC_MODE="remote" worker HTTP (uvicorn
+# --workers N) tidak memuat model maupun membuka sensor. Inferensi dan
+# pembacaan sensor dilayani `python ipc_service.py` lewat socket lokal
+# (path Unix socket atau host:port); frame gambar dikirim lewat shared
+# memory (IPC_FRAME_BYTES per koneksi, membesar jika frame lebih besar).
+IPC_MODE = os.getenv("TRIAGE_IPC_MODE", "local")
+IPC_INFERENCE_ADDRESS = os.getenv("TRIAGE_IPC_INFERENCE_ADDRESS", "/tmp/triage-inference.sock")
+IPC_SENSOR_ADDRESS = os.getenv("TRIAGE_IPC_SENSOR_ADDRESS", "/tmp/triage-sensors.sock")
+IPC_AUTHKEY = os.getenv("TRIAGE_IPC_AUTHKEY", "")
+IPC_FRAME_BYTES = _env_int("TRIAGE_IPC_FRAME_BYTES", 4 * 1024 * 1024)
+IPC_POOL_SIZE = _env_int("TRIAGE_IPC_POOL_SIZE", VISION_WORKERS + 2)
+IPC_TIMEOUT_S = _env_float("TRIAGE_IPC_TIMEOUT_S", 30.0)
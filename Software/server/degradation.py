@@ -0,0 +1,127 @@
+"""
+Degradasi analisis visual berbasis deadline.
+
+Setiap request membawa anggaran latensi. Sebelum frame masuk antrian
+vision, planner memilih tier termahal yang masih muat dalam sisa anggaran:
+
+- full    : model custom pada INFERENCE_IMGSZ
+- reduced : model yang sama pada REDUCED_IMGSZ (decode JPEG juga lebih kecil)
+- small   : model kecil/terkuantisasi (SMALL_MODEL_PATH)
+- sensor  : tanpa analisis visual
+
+Perkiraan = waktu tunggu antrian (dari vision_scheduler, memperhitungkan
+prioritas risiko) + EWMA latensi terukur tier tersebut. Tier yang belum
+pernah terukur dianggap muat (dicoba sekali untuk mendapat pengukuran).
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import config
+
+TIER_FULL = "full"
+TIER_REDUCED = "reduced"
+TIER_SMALL = "small"
+TIER_SENSOR = "sensor"
+
+# Tier vision urut dari yang paling akurat (dan paling mahal)
+VISION_TIERS = (TIER_FULL, TIER_REDUCED, TIER_SMALL)
+
+# Nilai healthData.analysis_method per tier
+ANALYSIS_METHODS = {
+    TIER_FULL: "sensor hardware + vision",
+    TIER_REDUCED: "sensor hardware + vision (reduced resolution)",
+    TIER_SMALL: "sensor hardware + vision (small model)",
+    TIER_SENSOR: "sensor hardware only (vision skipped: latency budget)",
+}
+
+
+class TierPlanner:
+    """Pilih tier vision dari sisa anggaran latensi dan latensi terukur per tier"""
+
+    def __init__(self, alpha: float = 0.2, stale_s: float = 30.0):
+        """
+        Args:
+            alpha: Bobot pengukuran baru pada EWMA latensi
+            stale_s: Estimasi yang tidak diperbarui selama ini dilupakan
+                (0 = tidak pernah), supaya tier yang lambat saat lonjakan
+                beban dicoba lagi
+        """
+        self.alpha = alpha
+        self.stale_s = stale_s
+        self._lock = threading.Lock()
+        # tier -> (EWMA detik, waktu pengukuran terakhir)
+        self._estimates: Dict[str, tuple] = {}
+        self._chosen: Dict[str, int] = {}
+
+    def estimate_s(self, tier: str) -> Optional[float]:
+        """EWMA latensi tier (None jika belum/tidak lagi terukur)"""
+        with self._lock:
+            return self._estimate(tier, time.monotonic())
+
+    def _estimate(self, tier: str, now: float) -> Optional[float]:
+        entry = self._estimates.get(tier)
+        if entry is None:
+            return None
+        if self.stale_s > 0 and now - entry[1] > self.stale_s:
+            del self._estimates[tier]
+            return None
+        return entry[0]
+
+    def observe(self, tier: str, seconds: float):
+        with self._lock:
+            now = time.monotonic()
+            previous = self._estimate(tier, now)
+            value = seconds if previous is None else previous + self.alpha * (seconds - previous)
+            self._estimates[tier] = (value, now)
+
+    def choose(self, remaining_s: float, queue_wait_s: float, available: Iterable[str]) -> str:
+        """
+        Tier pertama (urutan VISION_TIERS) yang tersedia dan diperkirakan
+        selesai dalam remaining_s; sensor saja jika tidak ada
+        """
+        available = set(available)
+        with self._lock:
+            now = time.monotonic()
+            chosen = TIER_SENSOR
+            if remaining_s > queue_wait_s:
+                for tier in VISION_TIERS:
+                    if tier not in available:
+                        continue
+                    estimate = self._estimate(tier, now)
+                    if estimate is None or queue_wait_s + estimate <= remaining_s:
+                        chosen = tier
+                        break
+            self._chosen[chosen] = self._chosen.get(chosen, 0) + 1
+            return chosen
+
+    def measure(self, tier: str, fn: Callable[..., Dict[str, Any]], *args) -> Dict[str, Any]:
+        """
+        Jalankan fn(*args, tier) dan catat latensinya (di thread vision).
+        Tier full adalah default fungsi analisis, jadi tidak dikirim.
+
+        Hasil cache/motion gate dan fallback (tier berbeda) tidak dicatat
+        karena tidak mencerminkan biaya inferensi tier tersebut.
+        """
+        start = time.perf_counter()
+        result = fn(*args) if tier == TIER_FULL else fn(*args, tier)
+        elapsed = time.perf_counter() - start
+        if result and result.get('tier') == tier and not (result.get('cache_hit') or result.get('motion_skipped')):
+            self.observe(tier, elapsed)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            estimates = {tier: self._estimate(tier, now) for tier in VISION_TIERS}
+            return {
+                "default_budget_ms": config.LATENCY_BUDGET_MS,
+                "estimate_ms": {tier: None if value is None else round(value * 1000.0, 3)
+                                for tier, value in estimates.items()},
+                "chosen": dict(self._chosen),
+            }
+
+
+# Global planner untuk /analyze, /analyze/image dan frame WebSocket
+tier_planner = TierPlanner(stale_s=config.TIER_STALE_S)
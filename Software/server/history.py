@@ -0,0 +1,387 @@
+"""
+Riwayat hasil triase di SQLite (mode WAL).
+
+- record() hanya memasukkan payload response ke queue terbatas (put_nowait);
+  jika queue penuh record dibuang dan dihitung, request tidak pernah menunggu
+  disk
+- Thread writer mengambil record dari queue dan menulisnya per batch dalam
+  satu transaksi (executemany), sampai batch_size record atau
+  flush_interval_s detik
+- Query berjalan di koneksi baca per thread; WAL membuat pembaca tidak
+  terblokir oleh writer. Index (station, ts), (patient, ts) dan (ts)
+- Paginasi keyset (cursor "ts:id", terbaru dulu) dan series yang
+  di-downsample per bucket waktu untuk grafik tren
+"""
+
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from triage_rules import get_rules
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS triage_history (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,
+        station TEXT,
+        patient TEXT,
+        endpoint TEXT,
+        status TEXT,
+        risk TEXT,
+        risk_rank INTEGER,
+        temperature REAL,
+        spo2 REAL,
+        heart_rate REAL,
+        confidence REAL,
+        payload TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_history_station_ts ON triage_history (station, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_history_patient_ts ON triage_history (patient, ts)",
+    "CREATE INDEX IF NOT EXISTS idx_history_ts ON triage_history (ts)",
+)
+
+_INSERT = """
+    INSERT INTO triage_history
+        (ts, station, patient, endpoint, status, risk, risk_rank, temperature, spo2, heart_rate, confidence, payload)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SUMMARY_COLUMNS = "id, ts, station, patient, endpoint, status, risk, temperature, spo2, heart_rate, confidence"
+
+
+def _row(payload: Dict[str, Any], station: Optional[str], patient: Optional[str], endpoint: str) -> tuple:
+    health = payload.get("healthData", {})
+    risk = health.get("riskLevel")
+    timestamp = payload.get("timestamp")
+    return (
+        int(timestamp if timestamp is not None else time.time() * 1000),
+        station,
+        patient,
+        endpoint,
+        health.get("status"),
+        risk,
+        get_rules().risk_rank.get(risk),
+        health.get("temperature"),
+        health.get("spo2"),
+        health.get("heartRate"),
+        payload.get("confidence"),
+        json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+    )
+
+
+def _filters(station: Optional[str], patient: Optional[str],
+             start: Optional[int], end: Optional[int]) -> Tuple[List[str], List[Any]]:
+    clauses, params = [], []
+    if station is not None:
+        clauses.append("station = ?")
+        params.append(station)
+    if patient is not None:
+        clauses.append("patient = ?")
+        params.append(patient)
+    if start is not None:
+        clauses.append("ts >= ?")
+        params.append(int(start))
+    if end is not None:
+        clauses.append("ts <= ?")
+        params.append(int(end))
+    return clauses, params
+
+
+class HistoryStore:
+    """Penyimpanan riwayat triase dengan penulisan batch di background thread"""
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int = 200,
+                 flush_interval_s: float = 1.0,
+                 queue_size: int = 10000):
+        """
+        Args:
+            path: File database SQLite (dibuat jika belum ada)
+            batch_size: Record maksimum per transaksi
+            flush_interval_s: Waktu tunggu maksimum sebelum batch ditulis
+            queue_size: Kapasitas queue; record dibuang jika penuh
+        """
+        self.path = Path(path)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval_s)
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self):
+        """Buat schema lalu jalankan thread writer (idempotent)"""
+        with self._lock:
+            if self.running:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = self._connect()
+            with conn:
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+            self._thread = threading.Thread(target=self._run, args=(conn,), name="history-writer", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Tulis sisa queue lalu hentikan writer dan tutup koneksi baca"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=10.0)
+        with self._lock:
+            readers, self._readers = self._readers, []
+        for conn in readers:
+            conn.close()
+        self._local = threading.local()
+
+    def record(self, payload: Dict[str, Any], station: Optional[str] = None,
+               patient: Optional[str] = None, endpoint: str = "analyze"):
+        """
+        Antrikan satu hasil triase (payload AnalyzeResponse dalam bentuk dict).
+
+        Tidak pernah memblokir: ekstraksi kolom dan serialisasi JSON dilakukan
+        di thread writer. No-op jika store belum dijalankan.
+        """
+        if self._thread is None:
+            return
+        try:
+            self._queue.put_nowait((payload, station, patient, endpoint))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Tunggu sampai semua record yang sudah diantrikan tertulis"""
+        if not self.running:
+            return False
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _collect(self, first) -> Tuple[list, list, bool]:
+        items, waiters = [], []
+        stopping = False
+        deadline = time.monotonic() + self.flush_interval
+        item = first
+        while True:
+            if item is None:
+                stopping = True
+                break
+            if isinstance(item, threading.Event):
+                # flush(): tulis yang sudah terkumpul sekarang
+                waiters.append(item)
+                break
+            items.append(item)
+            if len(items) >= self.batch_size:
+                break
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+        return items, waiters, stopping
+
+    def _run(self, conn: sqlite3.Connection):
+        stopping = False
+        while not stopping:
+            items, waiters, stopping = self._collect(self._queue.get())
+            if stopping:
+                # Kosongkan sisa queue sebelum berhenti
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, threading.Event):
+                        waiters.append(item)
+                    elif item is not None:
+                        items.append(item)
+            if items:
+                try:
+                    rows = [_row(*item) for item in items]
+                    with conn:
+                        conn.executemany(_INSERT, rows)
+                    self.written += len(rows)
+                    self.batches += 1
+                except Exception as e:
+                    self.errors += 1
+                    logger.warning("Gagal menulis %d record riwayat: %s", len(items), e)
+            for waiter in waiters:
+                waiter.set()
+        conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not self.running:
+                raise RuntimeError("History store tidak aktif")
+            conn = self._connect()
+            conn.execute("PRAGMA query_only=ON")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def query(self,
+              station: Optional[str] = None,
+              patient: Optional[str] = None,
+              start: Optional[int] = None,
+              end: Optional[int] = None,
+              limit: int = 100,
+              cursor: Optional[str] = None,
+              full: bool = False) -> Dict[str, Any]:
+        """
+        Riwayat terbaru dulu, dengan paginasi keyset
+
+        Args:
+            station, patient: Filter (opsional)
+            start, end: Rentang waktu epoch milidetik (inklusif)
+            limit: Jumlah item per halaman
+            cursor: nextCursor dari halaman sebelumnya
+            full: Sertakan payload response lengkap
+
+        Returns:
+            {"items": [...], "nextCursor": str | None}
+        """
+        clauses, params = _filters(station, patient, start, end)
+        if cursor:
+            try:
+                cursor_ts, cursor_id = (int(part) for part in cursor.split(":", 1))
+            except ValueError:
+                raise ValueError(f"Cursor tidak valid: {cursor}")
+            clauses.append("(ts < ? OR (ts = ? AND id < ?))")
+            params.extend((cursor_ts, cursor_ts, cursor_id))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        columns = _SUMMARY_COLUMNS + (", payload" if full else "")
+        rows = self._reader().execute(
+            f"SELECT {columns} FROM triage_history {where} ORDER BY ts DESC, id DESC LIMIT ?",
+            (*params, limit + 1)
+        ).fetchall()
+
+        items = []
+        for row in rows[:limit]:
+            item = {
+                "id": row["id"],
+                "timestamp": row["ts"],
+                "station": row["station"],
+                "patient": row["patient"],
+                "endpoint": row["endpoint"],
+                "status": row["status"],
+                "riskLevel": row["risk"],
+                "temperature": row["temperature"],
+                "spo2": row["spo2"],
+                "heartRate": row["heart_rate"],
+                "confidence": row["confidence"],
+            }
+            if full:
+                item["response"] = json.loads(row["payload"])
+            items.append(item)
+        next_cursor = f"{items[-1]['timestamp']}:{items[-1]['id']}" if len(rows) > limit else None
+        return {"items": items, "nextCursor": next_cursor}
+
+    def series(self,
+               station: Optional[str] = None,
+               patient: Optional[str] = None,
+               start: Optional[int] = None,
+               end: Optional[int] = None,
+               bucket_ms: Optional[int] = None,
+               max_points: int = 500) -> Dict[str, Any]:
+        """
+        Tren tanda vital yang di-downsample: rata-rata per bucket waktu dan
+        risk level tertinggi di bucket tersebut
+
+        Jika bucket_ms tidak diberikan, ukuran bucket dipilih supaya rentang
+        waktu menjadi paling banyak max_points titik.
+        """
+        clauses, params = _filters(station, patient, start, end)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        conn = self._reader()
+        # Bucket eksplisit sejajar kelipatan epoch (stabil antar query);
+        # bucket otomatis dimulai dari awal rentang
+        origin = 0
+        if not bucket_ms:
+            low, high = conn.execute(f"SELECT MIN(ts), MAX(ts) FROM triage_history {where}", params).fetchone()
+            origin = start if start is not None else low or 0
+            span = (end if end is not None else high or 0) - origin + 1
+            bucket_ms = max(1000, -(-span // max(1, max_points)))
+        bucket_ms = int(bucket_ms)
+
+        rows = conn.execute(
+            f"""
+            SELECT ? + ((ts - ?) / ?) * ? AS bucket, COUNT(*) AS n, AVG(temperature) AS temperature,
+                   AVG(spo2) AS spo2, AVG(heart_rate) AS heart_rate, MAX(risk_rank) AS risk_rank
+            FROM triage_history {where}
+            GROUP BY bucket ORDER BY bucket
+            """,
+            (origin, origin, bucket_ms, bucket_ms, *params)
+        ).fetchall()
+
+        def rounded(value, digits=2):
+            return None if value is None else round(value, digits)
+
+        # risk_rank tersimpan = index di risk_levels tabel aturan (triage_rules)
+        risk_levels = get_rules().risk_levels
+
+        def risk_level(rank):
+            return risk_levels[rank] if rank is not None and 0 <= rank < len(risk_levels) else None
+
+        return {
+            "bucketMs": bucket_ms,
+            "points": [{
+                "timestamp": row["bucket"],
+                "count": row["n"],
+                "temperature": rounded(row["temperature"]),
+                "spo2": rounded(row["spo2"]),
+                "heartRate": rounded(row["heart_rate"]),
+                "maxRiskLevel": risk_level(row["risk_rank"]),
+            } for row in rows]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "running": self.running,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "pending": self._queue.qsize(),
+        }
+
+
+# Global store (dijalankan di lifespan server jika TRIAGE_HISTORY_PATH diisi)
+history_store = HistoryStore(
+    config.HISTORY_PATH or "triage_history.db",
+    batch_size=config.HISTORY_BATCH_SIZE,
+    flush_interval_s=config.HISTORY_FLUSH_INTERVAL_S,
+    queue_size=config.HISTORY_QUEUE_SIZE
+)
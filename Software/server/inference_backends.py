@@ -0,0 +1,252 @@
+"""
+Backend inferensi YOLO (CPU) yang bisa dipilih lewat konfigurasi.
+
+- torch       : ultralytics YOLO (.pt) di PyTorch
+- onnxruntime : model hasil export ONNX (.onnx) di ONNX Runtime
+- openvino    : model ONNX / OpenVINO IR (.xml) di OpenVINO
+
+Semua backend menerima list gambar BGR uint8 (HWC) dan mengembalikan
+Detections per gambar dalam koordinat gambar asli, sehingga hasilnya bisa
+dibandingkan langsung antar backend. YOLOHealthAnalyzer mengirim frame yang
+sudah di-letterbox ke imgsz (preprocessing.py), sehingga letterbox di sini
+tidak mengubah apa-apa untuk frame tersebut.
+"""
+
+import importlib.util
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+
+import cv2
+import numpy as np
+
+from preprocessing import letterbox, scale_boxes
+
+
+class Detections(NamedTuple):
+    """Hasil deteksi satu gambar dalam bentuk kolom"""
+    boxes: np.ndarray    # (N, 4) float32, xyxy
+    scores: np.ndarray   # (N,) float32
+    classes: np.ndarray  # (N,) int32
+
+
+EMPTY_DETECTIONS = Detections(
+    np.zeros((0, 4), dtype=np.float32),
+    np.zeros(0, dtype=np.float32),
+    np.zeros(0, dtype=np.int32)
+)
+
+
+def decode_yolo_output(output: np.ndarray,
+                       conf: float,
+                       iou: float,
+                       max_det: int = 300) -> Detections:
+    """
+    Decode keluaran mentah YOLOv8/YOLO11 hasil export, (4 + nc, anchors),
+    menjadi Detections (koordinat input model) dengan NMS per kelas.
+    """
+    pred = output.T  # (anchors, 4 + nc)
+    class_scores = pred[:, 4:]
+    classes = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(pred)), classes]
+    keep = scores > conf
+    if not keep.any():
+        return EMPTY_DETECTIONS
+
+    pred, classes, scores = pred[keep], classes[keep], scores[keep]
+    cx, cy, w, h = pred[:, 0], pred[:, 1], pred[:, 2], pred[:, 3]
+    boxes = np.stack((cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2), axis=1)
+
+    # NMS per kelas: geser box tiap kelas supaya tidak saling overlap
+    offset = classes[:, None].astype(np.float32) * 7680.0
+    shifted = boxes + offset
+    nms_boxes = np.column_stack((shifted[:, :2], shifted[:, 2:] - shifted[:, :2]))
+    indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), scores.tolist(), conf, iou)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    # Urutkan berdasarkan skor seperti ultralytics
+    indices = indices[np.argsort(-scores[indices], kind='stable')][:max_det]
+
+    return Detections(
+        boxes[indices].astype(np.float32),
+        scores[indices].astype(np.float32),
+        classes[indices].astype(np.int32)
+    )
+
+
+class InferenceBackend(ABC):
+    """Interface backend inferensi (subclass wajib load() dan predict())"""
+
+    name = "base"
+    requires: Tuple[str, ...] = ()
+    # Bisa dijalankan dengan ukuran input selain imgsz (tier reduced)
+    dynamic_imgsz = True
+
+    def __init__(self, model_path: Path, conf: float = 0.3, iou: float = 0.5, imgsz: int = 640):
+        self.model_path = Path(model_path)
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+
+    @classmethod
+    def available(cls) -> bool:
+        """Library backend terinstall (dicek tanpa import)"""
+        return all(importlib.util.find_spec(module) is not None for module in cls.requires)
+
+    @abstractmethod
+    def load(self):
+        """Muat model dari model_path"""
+
+    @abstractmethod
+    def predict(self, images: List[np.ndarray], imgsz: Optional[int] = None) -> List[Detections]:
+        """
+        Deteksi untuk list gambar BGR uint8; koordinat box = gambar asli.
+        imgsz menimpa ukuran input model (hanya jika dynamic_imgsz)
+        """
+
+
+class TorchBackend(InferenceBackend):
+    """ultralytics YOLO di PyTorch (CPU)"""
+
+    name = "torch"
+    requires = ("ultralytics",)
+
+    def load(self):
+        from ultralytics import YOLO
+        self.model = YOLO(str(self.model_path))
+
+    def predict(self, images: List[np.ndarray], imgsz: Optional[int] = None) -> List[Detections]:
+        results = self.model(images, conf=self.conf, iou=self.iou, imgsz=imgsz or self.imgsz, device="cpu",
+                             verbose=False)
+        detections = []
+        for result in results:
+            boxes = result.boxes
+            if boxes is None or len(boxes) == 0:
+                detections.append(EMPTY_DETECTIONS)
+                continue
+            # Transfer tensor ke NumPy sekali per gambar, bukan per box
+            detections.append(Detections(
+                boxes.xyxy.cpu().numpy().astype(np.float32),
+                boxes.conf.cpu().numpy().astype(np.float32),
+                boxes.cls.cpu().numpy().astype(np.int32)
+            ))
+        return detections
+
+
+class _ExportedModelBackend(InferenceBackend):
+    """Dasar backend untuk model hasil export (preprocessing + NMS sendiri)"""
+
+    @abstractmethod
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        """Jalankan model: (B, 3, S, S) float32 -> (B, 4 + nc, anchors)"""
+
+    def _max_batch(self) -> Optional[int]:
+        """Ukuran batch tetap model (None = dinamis)"""
+        return None
+
+    def predict(self, images: List[np.ndarray], imgsz: Optional[int] = None) -> List[Detections]:
+        size = imgsz or self.imgsz
+        prepared = [letterbox(image, size) for image in images]
+        # Model berbatch tetap: potongan terakhir dipadding frame kosong
+        # sampai ukuran batch model, keluarannya dibuang
+        step = self._max_batch() or len(images)
+        padded = -(-len(images) // step) * step
+        batch = np.empty((padded, 3, size, size), dtype=np.float32)
+        batch[len(images):] = 0.0
+        for i, (boxed, _, _) in enumerate(prepared):
+            # BGR HWC uint8 -> RGB CHW float [0, 1]
+            np.multiply(boxed[:, :, ::-1].transpose(2, 0, 1), 1.0 / 255.0, out=batch[i], casting='unsafe')
+
+        outputs = np.concatenate([self._run(batch[i:i + step]) for i in range(0, padded, step)])[:len(images)]
+
+        detections = []
+        for output, image, (_, scale, pad) in zip(outputs, images, prepared):
+            det = decode_yolo_output(output, self.conf, self.iou)
+            detections.append(Detections(scale_boxes(det.boxes, scale, pad, image.shape[:2]), det.scores, det.classes))
+        return detections
+
+
+class OnnxRuntimeBackend(_ExportedModelBackend):
+    """Model ONNX di ONNX Runtime (CPUExecutionProvider)"""
+
+    name = "onnxruntime"
+    requires = ("onnxruntime",)
+
+    def load(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(self.model_path), sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.fixed_batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        if isinstance(model_input.shape[2], int):
+            # Model diexport dengan ukuran input tetap
+            self.imgsz = model_input.shape[2]
+            self.dynamic_imgsz = False
+
+    def _max_batch(self) -> Optional[int]:
+        return self.fixed_batch
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVINOBackend(_ExportedModelBackend):
+    """Model ONNX atau OpenVINO IR (.xml) di OpenVINO (device CPU)"""
+
+    name = "openvino"
+    requires = ("openvino",)
+
+    def load(self):
+        import openvino as ov
+        core = ov.Core()
+        model = core.read_model(str(self.model_path))
+        input_shape = model.input(0).get_partial_shape()
+        self.fixed_batch = input_shape[0].get_length() if input_shape[0].is_static else None
+        if input_shape[2].is_static:
+            # Model diexport dengan ukuran input tetap
+            self.imgsz = input_shape[2].get_length()
+            self.dynamic_imgsz = False
+        self.compiled = core.compile_model(model, "CPU")
+        self.output = self.compiled.output(0)
+
+    def _max_batch(self) -> Optional[int]:
+        return self.fixed_batch
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled(batch)[self.output]
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    TorchBackend.name: TorchBackend,
+    OnnxRuntimeBackend.name: OnnxRuntimeBackend,
+    OpenVINOBackend.name: OpenVINOBackend,
+}
+
+
+def get_backend_class(name: str) -> Type[InferenceBackend]:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Backend inferensi tidak dikenal: {name} (pilihan: {', '.join(BACKENDS)})")
+
+
+def match_detections(a: Detections, b: Detections, box_tol: float = 2.0, score_tol: float = 0.02) -> bool:
+    """
+    Bandingkan hasil dua backend: jumlah, kelas, posisi box (piksel) dan skor
+    harus sama dalam toleransi (urutan tidak harus sama)
+    """
+    if len(a.boxes) != len(b.boxes):
+        return False
+    used = np.zeros(len(b.boxes), dtype=bool)
+    for box, score, cls in zip(a.boxes, a.scores, a.classes):
+        candidates = np.flatnonzero(
+            ~used & (b.classes == cls)
+            & (np.abs(b.boxes - box).max(axis=1) <= box_tol)
+            & (np.abs(b.scores - score) <= score_tol)
+        )
+        if not len(candidates):
+            return False
+        used[candidates[0]] = True
+    return True
@@ -0,0 +1,560 @@
+"""
+Layanan inferensi dan sensor terpisah untuk deployment multi-worker.
+
+Dengan `uvicorn main:app --workers N` setiap worker mengimpor torch dan
+memuat model YOLO sendiri, dan semua worker berebut bus I2C. Di mode
+remote (TRIAGE_IPC_MODE=remote) satu proses `python ipc_service.py`
+memegang model (role inference) dan sampler sensor/station (role sensors);
+worker HTTP menjadi stateless dan memanggilnya lewat
+multiprocessing.connection (Unix socket atau TCP lokal).
+
+Byte frame tidak di-pickle: setiap koneksi client punya satu segmen
+multiprocessing.shared_memory, frame ditulis ke segmen itu dan yang dikirim
+hanya (nama segmen, panjang). Server membaca frame langsung dari segmen
+(memoryview, tanpa salinan) untuk hashing cache dan cv2.imdecode.
+
+    python ipc_service.py                   # inference + sensors
+    python ipc_service.py --role inference  # model saja
+    python ipc_service.py --role sensors    # sensor/station saja
+    TRIAGE_IPC_MODE=remote uvicorn main:app --workers 4 --port 5001
+"""
+
+import argparse
+import base64
+import functools
+import logging
+import os
+import queue
+import signal
+import socket
+import stat
+import threading
+import time
+from multiprocessing import AuthenticationError, resource_tracker, shared_memory
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+import config
+from degradation import TIER_FULL
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+# Exception handler yang diteruskan ke pemanggil dengan tipe yang sama;
+# selain ini menjadi RuntimeError
+FORWARDED_ERRORS = {"RuntimeError": RuntimeError, "KeyError": KeyError, "ValueError": ValueError}
+
+_attach_lock = threading.Lock()
+
+
+class Frame(NamedTuple):
+    """Referensi byte frame di segmen shared memory milik client"""
+    segment: str
+    size: int
+
+
+def parse_address(address: str) -> Union[str, Tuple[str, int]]:
+    """'host:port' -> alamat TCP, selain itu path Unix socket"""
+    host, sep, port = address.rpartition(":")
+    if sep and host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def _authkey(authkey: Optional[str]) -> Optional[bytes]:
+    return authkey.encode("utf-8") if authkey else None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Buka segmen milik client tanpa mendaftarkannya ke resource tracker
+    proses ini (setara track=False Python 3.13). Segmen dibuat, di-unlink
+    dan dibersihkan oleh client pemiliknya, bukan oleh server.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args, **kwargs: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _release(view: memoryview):
+    try:
+        view.release()
+    except BufferError:
+        # Masih dirujuk (mis. traceback exception); dilepas oleh GC
+        pass
+
+
+def _close_segment(segment: shared_memory.SharedMemory):
+    try:
+        segment.close()
+    except BufferError:
+        pass
+
+
+class IPCServer:
+    """Server RPC lokal: satu thread per koneksi worker HTTP"""
+
+    def __init__(self, address: str, authkey: Optional[str] = None):
+        self.address = parse_address(address)
+        self.authkey = _authkey(authkey)
+        self.handlers: Dict[str, Callable[..., Any]] = {}
+        self.calls = 0
+        self.errors = 0
+        self.connections = 0
+        self._listener: Optional[Listener] = None
+        self._conns: set = set()
+        self._lock = threading.Lock()
+
+    def register(self, method: str, handler: Callable[..., Any]):
+        self.handlers[method] = handler
+
+    def start(self):
+        if isinstance(self.address, str) and os.path.exists(self.address) \
+                and stat.S_ISSOCK(os.stat(self.address).st_mode):
+            # Socket sisa proses sebelumnya yang berhenti tidak bersih
+            os.unlink(self.address)
+        self._listener = Listener(self.address, authkey=self.authkey)
+        threading.Thread(target=self._accept_loop, name="ipc-accept", daemon=True).start()
+        logger.info("Layanan IPC mendengarkan di %s (%s)", self.address, ", ".join(self.handlers))
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            conns = list(self._conns)
+        for conn in conns:
+            # Shutdown membangunkan thread koneksi yang sedang recv() (EOF);
+            # thread itu sendiri yang menutup koneksinya
+            try:
+                with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+                    sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "connections": self.connections,
+                    "active": len(self._conns)}
+
+    def _accept_loop(self):
+        listener = self._listener
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError as e:
+                logger.warning("Koneksi IPC ditolak: %s", e)
+                continue
+            except OSError:
+                return  # listener ditutup
+            with self._lock:
+                self._conns.add(conn)
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), name="ipc-conn", daemon=True).start()
+
+    def _serve(self, conn: Connection):
+        segments: Dict[str, shared_memory.SharedMemory] = {}
+        try:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                except Exception:
+                    # Pesan tidak bisa di-unpickle/bentuknya salah (mis. versi
+                    # client berbeda): koneksi ini ditutup, server tetap jalan
+                    logger.exception("Pesan IPC tidak bisa dibaca, koneksi ditutup")
+                    with self._lock:
+                        self.errors += 1
+                    return
+                reply = self._dispatch(method, args, kwargs, segments)
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+                except Exception as e:
+                    # Hasil handler tidak bisa di-pickle
+                    conn.send((False, "RuntimeError", f"Hasil {method} tidak bisa dikirim: {e}"))
+        finally:
+            conn.close()
+            with self._lock:
+                self._conns.discard(conn)
+            for segment in segments.values():
+                _close_segment(segment)
+
+    def _dispatch(self, method: str, args: tuple, kwargs: Dict[str, Any],
+                  segments: Dict[str, shared_memory.SharedMemory]) -> tuple:
+        views: List[memoryview] = []
+        try:
+            handler = self.handlers.get(method)
+            if handler is None:
+                raise ValueError(f"Method IPC tidak dikenal: {method}")
+            args = [self._resolve(arg, segments, views) for arg in args]
+            return True, handler(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.errors += 1
+            name = type(e).__name__
+            if name not in FORWARDED_ERRORS:
+                logger.exception("Handler IPC %s gagal", method)
+            message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+            return False, name, message
+        finally:
+            with self._lock:
+                self.calls += 1
+            for view in views:
+                _release(view)
+
+    @staticmethod
+    def _resolve(arg: Any, segments: Dict[str, shared_memory.SharedMemory], views: List[memoryview]) -> Any:
+        """Ganti Frame dengan memoryview ke segmen shared memory client"""
+        if not isinstance(arg, Frame):
+            return arg
+        segment = segments.get(arg.segment)
+        if segment is None:
+            # Client mengganti segmen (frame lebih besar): lepas yang lama
+            for old in segments.values():
+                _close_segment(old)
+            segments.clear()
+            segment = segments[arg.segment] = _attach(arg.segment)
+        view = segment.buf[:arg.size]
+        views.append(view)
+        return view
+
+
+class _Channel:
+    """Satu koneksi ke server beserta segmen shared memory frame-nya"""
+
+    def __init__(self, address, authkey: Optional[bytes], frame_bytes: int):
+        self.conn = Client(address, authkey=authkey)
+        self.frame_bytes = frame_bytes
+        self.segment: Optional[shared_memory.SharedMemory] = None
+
+    def _frame(self, data) -> Frame:
+        size = len(data)
+        if self.segment is None or self.segment.size < size:
+            self._drop_segment()
+            capacity = max(self.frame_bytes, 1 << max(size - 1, 0).bit_length())
+            self.segment = shared_memory.SharedMemory(create=True, size=capacity)
+        self.segment.buf[:size] = data
+        return Frame(self.segment.name, size)
+
+    def request(self, method: str, args: tuple, kwargs: Dict[str, Any], timeout_s: float) -> tuple:
+        frames = [i for i, arg in enumerate(args) if isinstance(arg, (bytes, bytearray, memoryview))]
+        if len(frames) > 1:
+            raise ValueError("Maksimal satu argumen frame per panggilan IPC")
+        if frames:
+            args = tuple(self._frame(arg) if i == frames[0] else arg for i, arg in enumerate(args))
+        self.conn.send((method, args, kwargs))
+        if not self.conn.poll(timeout_s):
+            raise TimeoutError(f"Tidak ada balasan {method} dalam {timeout_s:g} detik")
+        return self.conn.recv()
+
+    def _drop_segment(self):
+        if self.segment is not None:
+            self.segment.close()
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
+            self.segment = None
+
+    def close(self):
+        try:
+            self.conn.close()
+        finally:
+            self._drop_segment()
+
+
+class IPCClient:
+    """
+    Client thread-safe dengan pool koneksi (paling banyak pool_size)
+
+    Argumen bytes/bytearray/memoryview dikirim lewat shared memory koneksi.
+    Koneksi yang putus (server restart) dibuka ulang sekali; server yang
+    tidak bisa dihubungi atau timeout menjadi RuntimeError.
+    """
+
+    def __init__(self, address: str, authkey: Optional[str] = None, pool_size: int = 4,
+                 frame_bytes: int = 4 * 1024 * 1024, timeout_s: float = 30.0):
+        self.address = parse_address(address)
+        self.authkey = _authkey(authkey)
+        self.frame_bytes = frame_bytes
+        self.timeout_s = timeout_s
+        self._slots = threading.BoundedSemaphore(max(1, pool_size))
+        self._idle: "queue.LifoQueue[_Channel]" = queue.LifoQueue()
+        self._closed = False
+
+    def _checkout(self) -> _Channel:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return _Channel(self.address, self.authkey, self.frame_bytes)
+        except (OSError, AuthenticationError) as e:
+            raise RuntimeError(f"Layanan IPC {self.address} tidak tersedia: {e}") from e
+
+    def _checkin(self, channel: _Channel):
+        if self._closed:
+            channel.close()
+        else:
+            self._idle.put(channel)
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        with self._slots:
+            for attempt in range(2):
+                channel = self._checkout()
+                try:
+                    reply = channel.request(method, args, kwargs, self.timeout_s)
+                except TimeoutError as e:
+                    # Balasan yang terlambat tidak boleh terbaca request lain
+                    channel.close()
+                    raise RuntimeError(f"Layanan IPC {self.address}: {e}") from e
+                except (EOFError, OSError) as e:
+                    channel.close()
+                    if attempt:
+                        raise RuntimeError(f"Koneksi ke layanan IPC {self.address} terputus: {e}") from e
+                    continue
+                except BaseException:
+                    channel.close()
+                    raise
+                self._checkin(channel)
+                break
+
+        ok, *rest = reply
+        if ok:
+            return rest[0]
+        name, message = rest
+        raise FORWARDED_ERRORS.get(name, RuntimeError)(message)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class RemoteAnalyzer:
+    """Pengganti analyze_health_image(_bytes) di worker HTTP mode remote"""
+
+    # Daftar tier model di layanan inferensi di-cache selama ini (detik)
+    TIERS_TTL_S = 5.0
+
+    def __init__(self, client: IPCClient):
+        self.client = client
+        self._tiers: Tuple[float, List[str]] = (0.0, [TIER_FULL])
+
+    def analyze_image(self, image_data: str, station_id: Optional[str] = None,
+                      tier: str = TIER_FULL) -> Dict[str, Any]:
+        # Base64 didecode di worker; hanya byte gambar yang lewat shared memory
+        encoded = image_data.split(',', 1)[1] if ',' in image_data else image_data
+        encoded += "=" * ((4 - len(encoded) % 4) % 4)
+        with time_stage("base64_decode"):
+            image_bytes = base64.b64decode(encoded)
+        return self.analyze_image_bytes(image_bytes, station_id, tier)
+
+    def analyze_image_bytes(self, image_bytes: bytes, station_id: Optional[str] = None,
+                            tier: str = TIER_FULL) -> Dict[str, Any]:
+        return self.client.call("analyze_image_bytes", image_bytes, station_id, tier)
+
+    def status(self) -> Dict[str, Any]:
+        return self.client.call("status")
+
+    def tiers(self) -> List[str]:
+        """Tier vision layanan inferensi (di-cache, dipakai setiap request ber-anggaran)"""
+        fetched, tiers = self._tiers
+        if time.monotonic() - fetched > self.TIERS_TTL_S:
+            try:
+                tiers = self.client.call("tiers")
+            except (RuntimeError, ValueError):
+                tiers = [TIER_FULL]
+            self._tiers = (time.monotonic(), tiers)
+        return tiers
+
+
+class RemoteSensors:
+    """Pembacaan sensor lewat proses pemilik bus I2C"""
+
+    def __init__(self, client: IPCClient):
+        self.client = client
+
+    def get_sensor_data(self) -> Dict[str, Any]:
+        return self.read(None)
+
+    def read(self, station_id: Optional[str]) -> Dict[str, Any]:
+        try:
+            return self.client.call("read_sensor", station_id)
+        except KeyError:
+            raise RuntimeError(f"Station '{station_id}' tidak terdaftar di layanan sensor")
+
+    def status(self) -> Dict[str, Any]:
+        return self.client.call("status")
+
+
+class RemoteStation(NamedTuple):
+    id: str
+    patient_id: Optional[str]
+    camera: Any
+    read_sensor: Callable[[], Dict[str, Any]]
+
+
+class RemoteStationRegistry:
+    """
+    Station yang dimuat layanan sensor, dengan antarmuka StationRegistry
+    yang dipakai main.py (get, sensor_reader, stats)
+    """
+
+    def __init__(self, sensors: RemoteSensors):
+        self.sensors = sensors
+        self._stations: Optional[Dict[str, Dict[str, Any]]] = None
+
+    def _list(self, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        if self._stations is None or refresh:
+            try:
+                self._stations = self.sensors.client.call("stations")
+            except RuntimeError as e:
+                logger.warning("Daftar station tidak bisa diambil: %s", e)
+                return self._stations or {}
+        return self._stations
+
+    def __len__(self) -> int:
+        return len(self._list())
+
+    def ids(self) -> Set[str]:
+        return set(self._list())
+
+    def get(self, station_id: Optional[str]) -> Optional[RemoteStation]:
+        if station_id is None:
+            return None
+        stations = self._list()
+        if station_id not in stations:
+            # Layanan sensor mungkin di-restart dengan konfigurasi baru
+            stations = self._list(refresh=True)
+        info = stations.get(station_id)
+        if info is None:
+            return None
+        return RemoteStation(station_id, info.get("patient_id"), info.get("camera"),
+                             functools.partial(self.sensors.read, station_id))
+
+    def sensor_reader(self, station_id: Optional[str], default: Callable[[], Dict[str, Any]]):
+        """Sama dengan StationRegistry.sensor_reader (KeyError jika tidak terdaftar)"""
+        if station_id is None:
+            return default
+        station = self.get(station_id)
+        if station is not None:
+            return station.read_sensor
+        if not self._list():
+            return default
+        raise KeyError(station_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._list(refresh=True)
+
+
+def _client(address: str) -> IPCClient:
+    return IPCClient(address, authkey=config.IPC_AUTHKEY, pool_size=config.IPC_POOL_SIZE,
+                     frame_bytes=config.IPC_FRAME_BYTES, timeout_s=config.IPC_TIMEOUT_S)
+
+
+# Client global worker HTTP mode remote (koneksi dibuka saat pertama dipakai)
+inference_client = RemoteAnalyzer(_client(config.IPC_INFERENCE_ADDRESS))
+sensor_client = RemoteSensors(_client(config.IPC_SENSOR_ADDRESS))
+
+
+def inference_server(address: str = config.IPC_INFERENCE_ADDRESS) -> IPCServer:
+    """Server role inference: satu model YOLO untuk semua worker"""
+    from yolo_inference import yolo_analyzer
+    server = IPCServer(address, authkey=config.IPC_AUTHKEY)
+    server.register("analyze_image_bytes", yolo_analyzer.analyze_image_bytes)
+    server.register("status", yolo_analyzer.status)
+    server.register("tiers", yolo_analyzer.tiers)
+    return server
+
+
+def sensor_server(address: str = config.IPC_SENSOR_ADDRESS) -> IPCServer:
+    """Server role sensors: satu-satunya proses yang membaca bus I2C"""
+    from sensor_service import get_sensor_data, sampler
+    from stations import station_registry
+
+    def read_sensor(station_id: Optional[str] = None) -> Dict[str, Any]:
+        return station_registry.sensor_reader(station_id, get_sensor_data)()
+
+    server = IPCServer(address, authkey=config.IPC_AUTHKEY)
+    server.register("read_sensor", read_sensor)
+    server.register("stations", station_registry.stats)
+    server.register("status", lambda: {"running": sampler.running, "source": sampler.source.name})
+    return server
+
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Layanan inferensi/sensor untuk worker HTTP mode remote")
+    parser.add_argument("--role", choices=("all", "inference", "sensors"), default="all")
+    parser.add_argument("--inference-address", default=config.IPC_INFERENCE_ADDRESS)
+    parser.add_argument("--sensor-address", default=config.IPC_SENSOR_ADDRESS)
+    args = parser.parse_args(argv)
+
+    from logging_setup import setup_logging, stop_logging
+    setup_logging()
+    servers: List[IPCServer] = []
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    if args.role in ("all", "inference"):
+        from triage_rules import rules_watcher
+        from yolo_inference import yolo_analyzer
+        yolo_analyzer.start_background_load()
+        rules_watcher.start()
+        servers.append(inference_server(args.inference_address))
+    if args.role in ("all", "sensors"):
+        from sensor_service import start_sampler
+        from stations import STATIONS_PATH, station_registry
+        start_sampler()
+        if STATIONS_PATH.exists():
+            try:
+                count = station_registry.load(STATIONS_PATH)
+                station_registry.start()
+                logger.info("%d station dimuat dari %s", count, STATIONS_PATH)
+            except (OSError, ValueError) as e:
+                logger.error("Konfigurasi station %s tidak valid: %s", STATIONS_PATH, e)
+        servers.append(sensor_server(args.sensor_address))
+
+    try:
+        for server in servers:
+            server.start()
+        while not stop.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.close()
+        if args.role in ("all", "sensors"):
+            from sensor_service import stop_sampler
+            from stations import station_registry
+            station_registry.stop()
+            stop_sampler()
+        if args.role in ("all", "inference"):
+            from triage_rules import rules_watcher
+            from yolo_inference import yolo_analyzer
+            rules_watcher.stop()
+            yolo_analyzer.batcher.close()
+            yolo_analyzer.small_batcher.close()
+        stop_logging()
+
+
+if __name__ == "__main__":
+    # Jalankan lewat modul `ipc_service` (bukan __main__) supaya Frame yang
+    # di-unpickle dari client adalah class yang sama dengan di handler
+    import ipc_service
+    ipc_service.main_cli()
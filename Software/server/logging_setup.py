@@ -0,0 +1,232 @@
+"""
+Logging terstruktur yang tidak memblokir request.
+
+- Record dimasukkan ke queue terbatas oleh QueueHandler (put_nowait); jika
+  queue penuh record dibuang dan dihitung, request tidak pernah menunggu I/O
+- QueueListener di background thread yang memformat (teks atau JSON) dan
+  menulis ke stdout
+- Setiap record membawa request_id (contextvar, diisi RequestIdMiddleware)
+- Rate limit per template pesan dan sampling pesan per-request supaya biaya
+  logging tetap terbatas saat beban tinggi
+"""
+
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import uuid
+import zlib
+from typing import Dict, Optional, Tuple
+
+import config
+
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Atribut bawaan LogRecord; sisanya (extra=...) ikut ditulis sebagai field
+_RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Tempelkan request_id dari context pemanggil ke record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Token bucket per (logger, level, template pesan) + sampling per request
+
+    Pesan DEBUG/INFO di dalam request di-sample berdasarkan request_id
+    (semua pesan satu request ikut atau tidak sama sekali). Record yang lolos
+    setelah ada yang ditahan membawa field `suppressed`.
+    """
+
+    def __init__(self, rate_per_s: float = 10.0, burst: Optional[float] = None, sample_rate: float = 1.0):
+        super().__init__()
+        self.rate = rate_per_s
+        self.burst = burst if burst is not None else max(rate_per_s, 1.0)
+        self.sample_rate = sample_rate
+        self._buckets: Dict[Tuple[str, int, str], list] = {}
+        self._lock = threading.Lock()
+        self.suppressed = 0
+        self.sampled_out = 0
+
+    def _sampled(self, request_id: str) -> bool:
+        if self.sample_rate >= 1.0 or request_id == "-":
+            return True
+        return (zlib.crc32(request_id.encode()) % 10000) < self.sample_rate * 10000
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not self._sampled(getattr(record, "request_id", "-")):
+            with self._lock:
+                self.sampled_out += 1
+            return False
+        if self.rate <= 0:
+            return True
+
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            tokens, last, held = bucket
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1.0:
+                bucket[0], bucket[1], bucket[2] = tokens, now, held + 1
+                self.suppressed += 1
+                return False
+            bucket[0], bucket[1], bucket[2] = tokens - 1.0, now, 0
+        if held:
+            record.suppressed = held
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler untuk queue terbatas: buang record (dan hitung) jika penuh"""
+
+    def __init__(self, log_queue: "queue.Queue"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Format pesan ditunda ke thread listener; hanya traceback yang harus
+        # dijadikan teks di sini (objek frame tidak boleh ikut antri)
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Satu objek JSON per baris"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Format teks satu baris, field extra ditulis sebagai key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        line = super().format(record)
+        extras = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_"))
+        return f"{line} {extras}" if extras else line
+
+
+class RequestIdMiddleware:
+    """
+    Middleware ASGI: ambil X-Request-ID dari client atau buat baru, simpan di
+    contextvar selama request, dan kembalikan di header response
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DroppingQueueHandler] = None
+_rate_filter: Optional[RateLimitFilter] = None
+
+
+def setup_logging(level: str = config.LOG_LEVEL,
+                  fmt: str = config.LOG_FORMAT,
+                  queue_size: int = config.LOG_QUEUE_SIZE,
+                  rate_per_s: float = config.LOG_RATE_LIMIT_PER_S,
+                  sample_rate: float = config.LOG_REQUEST_SAMPLE_RATE,
+                  levels: str = config.LOG_LEVELS):
+    """Pasang QueueHandler + listener di root logger (idempotent)"""
+    global _listener, _queue_handler, _rate_filter
+    if _listener is not None:
+        return
+
+    log_queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    _queue_handler = DroppingQueueHandler(log_queue)
+    _rate_filter = RateLimitFilter(rate_per_s=rate_per_s, sample_rate=sample_rate)
+    _queue_handler.addFilter(RequestContextFilter())
+    _queue_handler.addFilter(_rate_filter)
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt.lower() == "json" else TextFormatter())
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(_queue_handler)
+    # Level per logger, mis. "yolo_inference=DEBUG,capture=WARNING"
+    for item in filter(None, (part.strip() for part in levels.split(","))):
+        name, _, logger_level = item.partition("=")
+        logging.getLogger(name.strip()).setLevel(logger_level.strip().upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """Kosongkan queue lalu hentikan listener (dipanggil saat shutdown)"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+
+
+def logging_stats() -> Dict[str, int]:
+    return {
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "suppressed": _rate_filter.suppressed if _rate_filter else 0,
+        "sampled_out": _rate_filter.sampled_out if _rate_filter else 0,
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+    }
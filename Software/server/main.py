@@ -1,31 +1,106 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing import Optional, List, Literal, Dict, Any
 from enum import Enum
-from yolo_inference import analyze_health_image
-from sensor_service import get_sensor_data
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from logging_setup import RequestIdMiddleware, logging_stats, setup_logging, stop_logging
+# Logging dipasang sebelum modul lain diimport supaya pesan saat import juga
+# lewat queue handler
+setup_logging()
+from yolo_inference import (YOLO_AVAILABLE, analyze_health_image, analyze_health_image_bytes, format_vision,
+                            yolo_analyzer)
+from capture import capture_manager
+from preprocessing import read_image_size
+from history import history_store
+from ipc_service import RemoteStationRegistry, inference_client, sensor_client
+from serialization import FastJSONResponse, render
+from metrics import (REGISTRY, REQUEST_SECONDS, SENSOR_ERRORS, VISION_FALLBACKS, VISION_MODEL_USED, VISION_TIER,
+                     time_stage)
+from sensor_service import get_sensor_data, sampler, start_sampler, stop_sampler
+from stations import STATIONS_PATH, station_registry
+from vision_scheduler import QueueFullError, vision_scheduler
+from degradation import ANALYSIS_METHODS, TIER_FULL, TIER_SENSOR, tier_planner
+from triage_rules import evaluate_vitals, get_rules, rules_watcher, triage_batch
+import config
+import asyncio
 import base64
-import cv2
-import numpy as np
+import contextvars
+import functools
+import json
+import logging
+import sqlite3
 import time
 
-# Import YOLO analyzer
-try:
-    import cv2
-    import numpy as np
+logger = logging.getLogger(__name__)
+
+# Mode remote: worker HTTP stateless, model YOLO dan bus I2C dipegang satu
+# proses ipc_service (frame lewat shared memory). Worker tidak mengimpor
+# torch maupun memuat model, jadi RSS tidak bertambah per worker.
+REMOTE_SERVICES = config.IPC_MODE == "remote"
+if REMOTE_SERVICES:
+    # Library backend cukup ada di proses layanan inferensi, bukan di worker
     YOLO_AVAILABLE = True
-    print("✅ YOLO Health Analyzer loaded successfully")
-except ImportError as e:
-    YOLO_AVAILABLE = False
-    print(f"⚠️  YOLO inference tidak tersedia: {e}")
-    print("   Continuing with sensor-only analysis")
-except Exception as e:
-    YOLO_AVAILABLE = False
-    print(f"⚠️  Error initializing YOLO: {e}")
-    print("   Continuing with sensor-only analysis")
-
-app = FastAPI(title="Health AI Local Server")
+    analyze_health_image = inference_client.analyze_image
+    analyze_health_image_bytes = inference_client.analyze_image_bytes
+    get_sensor_data = sensor_client.get_sensor_data
+    station_registry = RemoteStationRegistry(sensor_client)
+
+# Executor terbatas untuk sensor supaya pembacaan tidak memblokir event loop.
+# Pekerjaan vision lewat antrian prioritas vision_scheduler (429 jika penuh).
+SENSOR_EXECUTOR = ThreadPoolExecutor(max_workers=config.SENSOR_WORKERS, thread_name_prefix="sensor")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if REMOTE_SERVICES:
+        logger.info("Mode remote: inferensi di %s, sensor di %s",
+                    config.IPC_INFERENCE_ADDRESS, config.IPC_SENSOR_ADDRESS)
+        if config.CAPTURE_SOURCES:
+            logger.warning("TRIAGE_CAPTURE_SOURCES diabaikan di mode remote")
+    else:
+        # Model dimuat di background: server langsung bisa menjawab /health/live,
+        # /health/ready baru 200 setelah model selesai warm-up
+        yolo_analyzer.start_background_load()
+        if start_sampler():
+            logger.info("Sensor sampler (%s) berjalan di background", sampler.source.name)
+        if STATIONS_PATH.exists():
+            try:
+                count = station_registry.load(STATIONS_PATH)
+                station_registry.start(capture_manager)
+                logger.info("%d station dimuat dari %s", count, STATIONS_PATH)
+            except (OSError, ValueError) as e:
+                logger.error("Konfigurasi station %s tidak valid: %s", STATIONS_PATH, e)
+        if config.CAPTURE_SOURCES:
+            count = capture_manager.start(config.CAPTURE_SOURCES)
+            logger.info("%d sumber capture kamera/video berjalan", count)
+    rules_watcher.start()
+    if config.HISTORY_PATH:
+        try:
+            history_store.start()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("History store %s tidak bisa dibuka: %s", config.HISTORY_PATH, e)
+    yield
+    history_store.close()
+    rules_watcher.stop()
+    if REMOTE_SERVICES:
+        inference_client.client.close()
+        sensor_client.client.close()
+    else:
+        capture_manager.stop()
+        station_registry.stop()
+        stop_sampler()
+        yolo_analyzer.batcher.close()
+        yolo_analyzer.small_batcher.close()
+    SENSOR_EXECUTOR.shutdown(wait=False, cancel_futures=True)
+    vision_scheduler.close(timeout=0)
+    stop_logging()
+
+
+# Response JSON default di-render dengan orjson (jika terpasang)
+app = FastAPI(title="Health AI Local Server", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Add CORS Middleware
 app.add_middleware(
@@ -35,6 +110,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request ID untuk setiap record log (header X-Request-ID)
+app.add_middleware(RequestIdMiddleware)
 
 
 class RiskLevel(str, Enum):
@@ -63,6 +140,13 @@ class AnalyzeRequest(BaseModel):
     bloodPressure: Optional[BloodPressure] = None
     respiratoryRate: Optional[int] = None
     imageData: Optional[str] = None
+    # ID station feed kamera kontinu (mengaktifkan motion gate)
+    stationId: Optional[str] = None
+    # ID pasien untuk riwayat triase (opsional)
+    patientId: Optional[str] = None
+    # Sertakan deteksi visual di response: "full" (dict per box) atau
+    # "compact" (kolom array + ringkasan per kondisi)
+    detections: Optional[Literal["full", "compact"]] = None
 
 
 class AnalyzeResponse(BaseModel):
@@ -77,83 +161,644 @@ def root():
     return {"message": "Health AI Local Server is running"}
 
 
+@app.get("/health/live")
+def health_live():
+    """Liveness: proses server berjalan"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+def health_ready():
+    """
+    Readiness: 200 setelah model YOLO selesai dimuat dan warm-up.
+
+    Jika model tidak tersedia/gagal dimuat, server tetap siap untuk analisis
+    sensor saja (degraded). Selama model masih dimuat, kembalikan 503.
+    """
+    try:
+        model = _inference_status()
+    except RuntimeError as e:
+        # Mode remote: layanan inferensi belum berjalan
+        model = {"state": "unreachable", "detail": str(e), "load_seconds": None}
+    try:
+        sensor = _sensor_status()
+    except RuntimeError:
+        sensor = {"running": False, "source": None}
+    body = {
+        "model_state": model["state"],
+        "model_detail": model["detail"],
+        "model_load_seconds": model["load_seconds"],
+        "sensor_sampler_running": sensor["running"],
+        "sensor_source": sensor["source"],
+    }
+    if model["state"] in (yolo_analyzer.STATE_PENDING, yolo_analyzer.STATE_LOADING):
+        return JSONResponse(status_code=503, content={"status": "loading", **body})
+    if model["state"] == "unreachable":
+        return JSONResponse(status_code=503, content={"status": "unavailable", **body})
+    if model["state"] == yolo_analyzer.STATE_READY:
+        return {"status": "ready", **body}
+    return {"status": "degraded", **body}
+
+
+def _inference_status() -> Dict[str, Any]:
+    """Status model lokal atau milik layanan inferensi (mode remote)"""
+    return inference_client.status() if REMOTE_SERVICES else yolo_analyzer.status()
+
+
+def _sensor_status() -> Dict[str, Any]:
+    if REMOTE_SERVICES:
+        return sensor_client.status()
+    return {"running": sampler.running, "source": sampler.source.name}
+
+
+@app.get("/inference/stats")
+def inference_stats():
+    """
+    Statistik antrian prioritas vision (kedalaman, waktu tunggu, 429),
+    micro-batching YOLO (ukuran batch, antrian), cache hasil dan motion gate
+    """
+    try:
+        status = _inference_status()
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"scheduler": vision_scheduler.stats(),
+            "degradation": {**tier_planner.stats(), "tiers": status.get("tiers", [TIER_FULL])},
+            **{key: status[key] for key in ("batching", "cache", "motion_gate")}}
+
+
+def _motion_gate_counts(gate: Dict[str, Any]) -> Dict[str, List[int]]:
+    """
+    [frames, skipped] motion gate per label station. ID station berasal dari
+    client, jadi hanya station terdaftar, sumber capture dan station default
+    WebSocket yang mendapat label sendiri; sisanya (termasuk station yang
+    sudah dibuang LRU gate) digabung sebagai "other" supaya jumlah seri
+    /metrics tetap terbatas.
+    """
+    known = {"default", *capture_manager.sources, *station_registry.ids()}
+    evicted = gate["evicted_station_counts"]
+    counts: Dict[str, List[int]] = {}
+    if evicted["frames"]:
+        counts["other"] = [evicted["frames"], evicted["skipped"]]
+    for station, entry in gate["stations"].items():
+        total = counts.setdefault(station if station in known else "other", [0, 0])
+        total[0] += entry["frames"]
+        total[1] += entry["skipped"]
+    return counts
+
+
+def _collect_runtime_metrics():
+    """Nilai statistik komponen yang dibaca saat /metrics di-scrape"""
+    try:
+        status = _inference_status()
+    except RuntimeError:
+        status = None
+    if status is not None:
+        yield ("triage_model_ready", "gauge", "Model YOLO sudah dimuat dan di-warm-up",
+               {"backend": status["backend"]}, int(status["state"] == yolo_analyzer.STATE_READY))
+        batching = status["batching"]
+        yield ("triage_batcher_frames_total", "counter", "Frame yang diproses micro-batcher", {}, batching["frames"])
+        yield ("triage_batcher_batches_total", "counter", "Forward pass micro-batcher", {}, batching["batches"])
+        yield ("triage_batcher_pending", "gauge", "Frame yang menunggu di antrian batcher", {}, batching["pending"])
+        cache = status["cache"]
+        for key in ("hits", "misses", "evictions", "expirations"):
+            yield (f"triage_result_cache_{key}_total", "counter", f"Result cache {key}", {}, cache[key])
+        for station, counts in _motion_gate_counts(status["motion_gate"]).items():
+            yield ("triage_motion_gate_frames_total", "counter", "Frame yang melewati motion gate",
+                   {"station": station}, counts[0])
+            yield ("triage_motion_gate_skipped_total", "counter", "Frame yang inferensinya dilewati motion gate",
+                   {"station": station}, counts[1])
+    scheduler = vision_scheduler.stats()
+    yield ("triage_vision_queue_depth", "gauge", "Pekerjaan vision yang menunggu di antrian prioritas", {},
+           scheduler["depth"])
+    for risk, depth in scheduler["depth_by_risk"].items():
+        yield ("triage_vision_queue_depth_by_risk", "gauge", "Pekerjaan vision yang menunggu per risk level",
+               {"risk": risk}, depth)
+    yield ("triage_vision_queue_capacity", "gauge", "Kapasitas antrian prioritas vision", {}, scheduler["capacity"])
+    yield ("triage_vision_active", "gauge", "Pekerjaan vision yang sedang berjalan", {}, scheduler["active"])
+    for tier, estimate_ms in tier_planner.stats()["estimate_ms"].items():
+        if estimate_ms is not None:
+            yield ("triage_vision_tier_estimate_seconds", "gauge", "EWMA latensi terukur per tier degradasi vision",
+                   {"tier": tier}, estimate_ms / 1000.0)
+    history_stats = history_store.stats()
+    yield ("triage_history_written_total", "counter", "Record riwayat yang tertulis ke SQLite", {},
+           history_stats["written"])
+    yield ("triage_history_dropped_total", "counter", "Record riwayat dibuang karena queue penuh", {},
+           history_stats["dropped"])
+    yield ("triage_history_pending", "gauge", "Record riwayat yang menunggu ditulis", {}, history_stats["pending"])
+    log = logging_stats()
+    yield ("triage_log_dropped_total", "counter", "Record log dibuang karena queue penuh", {}, log["dropped"])
+    yield ("triage_log_suppressed_total", "counter", "Record log ditahan rate limit", {}, log["suppressed"])
+    yield ("triage_log_sampled_out_total", "counter", "Record log request yang tidak ter-sample", {}, log["sampled_out"])
+
+
+REGISTRY.register_collector(_collect_runtime_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Metrik Prometheus: histogram latensi per tahap, counter fallback/error/model"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/analyze", response_model=AnalyzeResponse)
-def analyze(req: AnalyzeRequest):
+async def analyze(req: AnalyzeRequest, request: Request):
     """
     Analisis kesehatan REAL-TIME. 
     WAJIB HARDWARE: Jika sensor gagal, kembalikan error.
+
+    Snapshot sensor dibaca dulu, lalu analisis visual diantrikan dengan
+    prioritas risiko tanda vital dan hasilnya digabungkan.
+    Format response mengikuti header Accept (JSON, MessagePack atau CBOR).
+    Header `X-Latency-Budget-Ms` membatasi waktu analisis visual (degradasi
+    tier, lihat degradation.py).
+    """
+    context = {"endpoint": "analyze", "station_id": req.stationId, "patient_id": req.patientId,
+               "detections": req.detections, "accept": request.headers.get("accept"),
+               "budget_s": _latency_budget(request)}
+    if req.imageData and YOLO_AVAILABLE:
+        return await _run_analysis(analyze_health_image, req.imageData, req.stationId, **context)
+    return await _run_analysis(**context)
+
+
+@app.post("/analyze/image", response_model=AnalyzeResponse)
+async def analyze_image_upload(request: Request):
+    """
+    Varian /analyze dengan gambar biner (tanpa base64-in-JSON).
+
+    Body berupa `application/octet-stream` (isi file JPEG/PNG mentah) atau
+    `multipart/form-data` dengan field `image`; byte selain JPEG/PNG ditolak
+    (400). Gambar didecode langsung dari buffer body dengan cv2.imdecode.
+    Query `?station=<id>` mengaktifkan motion gate untuk feed kamera
+    kontinu; `?patient=<id>` untuk riwayat;
+    `?detections=full|compact` menyertakan deteksi visual di response.
+    Header `X-Latency-Budget-Ms` membatasi waktu analisis visual.
+    """
+    budget_s = _latency_budget(request)
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("image") or form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="Field 'image' tidak ditemukan di form")
+        image_bytes = await upload.read()
+    else:
+        image_bytes = await request.body()
+
+    if not image_bytes:
+        raise HTTPException(status_code=400, detail="Body gambar kosong")
+    # Cek header saja (tanpa decode): byte yang bukan JPEG/PNG tidak diantrikan
+    if read_image_size(image_bytes) is None:
+        raise HTTPException(status_code=400, detail="Format gambar tidak dikenali (harus JPEG/PNG)")
+
+    station_id = request.query_params.get("station")
+    detections = request.query_params.get("detections")
+    if detections not in (None, "full", "compact"):
+        raise HTTPException(status_code=422, detail="detections harus 'full' atau 'compact'")
+    context = {"endpoint": "analyze_image", "station_id": station_id,
+               "patient_id": request.query_params.get("patient"), "detections": detections,
+               "accept": request.headers.get("accept"), "budget_s": budget_s}
+    if YOLO_AVAILABLE:
+        return await _run_analysis(analyze_health_image_bytes, image_bytes, station_id, **context)
+    return await _run_analysis(**context)
+
+
+BATCH_RECORDS = TypeAdapter(List[AnalyzeRequest])
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(request: Request):
     """
-    start_time = time.time()
+    Skor ulang banyak record tanda vital sekaligus (tanpa baca sensor).
 
+    Body berupa JSON array record berbentuk AnalyzeRequest, atau NDJSON
+    (`application/x-ndjson`, satu record per baris). Semua aturan dievaluasi
+    sebagai operasi array NumPy; hasilnya identik dengan jalur /analyze.
+    """
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    ndjson = "ndjson" in content_type or "jsonlines" in content_type
+    # Parse JSON, validasi pydantic, triase dan render response semuanya di
+    # thread executor: untuk 100000 record parse + validasi saja makan
+    # ratusan milidetik
+    return await _in_executor(None, _triage_batch_body, body, ndjson)
+
+
+def _triage_batch_body(body: bytes, ndjson: bool) -> Response:
+    """Parse, validasi, triase dan render body /analyze/batch (dijalankan di executor)"""
     try:
-        # === AMBIL DATA DARI SENSOR HARDWARE (WAJIB) ===
-        print("📡 Reading real-time sensor data from GPIO...")
-        sensor_reading = get_sensor_data()
+        if ndjson:
+            records = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            records = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Body tidak valid: {e}")
+
+    if not isinstance(records, list):
+        raise HTTPException(status_code=400, detail="Body harus berupa JSON array atau NDJSON")
+    if len(records) > config.BATCH_TRIAGE_MAX_RECORDS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Maksimal {config.BATCH_TRIAGE_MAX_RECORDS} record per request"
+        )
+
+    try:
+        parsed = BATCH_RECORDS.validate_python(records)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    results = triage_batch(parsed)
+    # Response dirender di sini juga (bukan jsonable_encoder FastAPI di event loop)
+    return FastJSONResponse({"count": len(results), "results": results})
+
+
+def _in_executor(executor, fn, *args) -> "asyncio.Future":
+    """run_in_executor yang membawa context (request_id log) ke thread executor"""
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, fn, *args))
+
+
+def _sensor_reader(station_id: Optional[str]):
+    """Pembaca sensor station (404 jika station tidak terdaftar)"""
+    try:
+        return station_registry.sensor_reader(station_id, get_sensor_data)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Station '{station_id}' tidak terdaftar")
+
+
+def _sensor_risk(sensor_reading: Dict[str, Any]) -> str:
+    """Risk level dari tanda vital saja (prioritas antrian vision)"""
+    return evaluate_vitals(sensor_reading['temperature'], sensor_reading['spo2'],
+                           sensor_reading['heartRate'], sensor_reading['bloodPressure'])[1]
+
+
+def _latency_budget(request: Request) -> Optional[float]:
+    """Anggaran latensi (detik) dari header X-Latency-Budget-Ms atau default config; None = tanpa batas"""
+    value = request.headers.get("x-latency-budget-ms")
+    if value is None:
+        budget_ms = config.LATENCY_BUDGET_MS
+    else:
+        try:
+            budget_ms = float(value)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="X-Latency-Budget-Ms harus berupa angka (milidetik)")
+    return budget_ms / 1000.0 if budget_ms > 0 else None
+
+
+def _vision_tiers() -> List[str]:
+    """Tier vision yang tersedia di model lokal atau layanan inferensi"""
+    return inference_client.tiers() if REMOTE_SERVICES else yolo_analyzer.tiers()
+
+
+def _choose_tier(risk: str, remaining_s: Optional[float]) -> str:
+    """Tier vision yang muat dalam sisa anggaran (full jika tanpa anggaran)"""
+    if remaining_s is None:
+        return TIER_FULL
+    queue_wait = vision_scheduler.expected_wait_s(get_rules().risk_rank.get(risk, 0))
+    return tier_planner.choose(remaining_s, queue_wait, _vision_tiers())
+
+
+def _submit_vision(risk: str, vision_fn, *args, tier: str = TIER_FULL) -> "asyncio.Future":
+    """Antrikan pekerjaan vision (raise QueueFullError jika antrian penuh)"""
+    future = vision_scheduler.submit(tier_planner.measure, tier, vision_fn, *args,
+                                     priority=get_rules().risk_rank.get(risk, 0), label=risk)
+    return asyncio.wrap_future(future)
+
+
+def _read_sensor_timed(read_sensor) -> Dict[str, Any]:
+    with time_stage("sensor_read"):
+        return read_sensor()
+
+
+async def _run_analysis(vision_fn=None, *vision_args, endpoint: str = "analyze",
+                        station_id: Optional[str] = None, patient_id: Optional[str] = None,
+                        detections: Optional[str] = None, accept: Optional[str] = None,
+                        budget_s: Optional[float] = None) -> Response:
+    """
+    Baca sensor, antrikan analisis visual dengan prioritas risiko sensor,
+    lalu antrikan hasilnya ke riwayat triase (tanpa menunggu disk).
+    Antrian vision penuh: 429 dengan Retry-After.
+
+    Dengan anggaran latensi (budget_s), tier vision dipilih dari sisa
+    anggaran; jika hasil vision belum ada saat anggaran habis (atau antrian
+    penuh) response dikirim dengan data sensor saja.
+    """
+    request_start = time.perf_counter()
+    read_sensor = _sensor_reader(station_id)
+    station = station_registry.get(station_id)
+    if patient_id is None and station is not None:
+        patient_id = station.patient_id
+
+    # === AMBIL DATA DARI SENSOR HARDWARE (WAJIB) ===
+    logger.debug("Reading real-time sensor data from GPIO...")
+    try:
+        sensor_reading = await _in_executor(SENSOR_EXECUTOR, _read_sensor_timed, read_sensor)
     except RuntimeError as e:
         # Jika sensor mati, hentikan proses dan lapor ke user
-        print(f"❌ HARDWARE ERROR: {str(e)}")
-        from fastapi import HTTPException
+        logger.error("HARDWARE ERROR: %s", e)
+        SENSOR_ERRORS.inc(endpoint=endpoint)
         raise HTTPException(status_code=503, detail=f"Hardware Sensor Error: {str(e)}")
 
+    # === ANALISIS VISUAL DENGAN YOLO (prioritas: risiko dari tanda vital) ===
+    # Snapshot sensor dibaca dari sampler (cepat), jadi risikonya sudah ada
+    # sebelum frame masuk antrian: pasien CRITICAL dianalisis lebih dulu.
+    vision_analysis = None
+    vision_tier = None
+    if vision_fn is not None:
+        risk = _sensor_risk(sensor_reading)
+        remaining = None if budget_s is None else budget_s - (time.perf_counter() - request_start)
+        vision_tier = _choose_tier(risk, remaining)
+        try:
+            if vision_tier != TIER_SENSOR:
+                vision_analysis = await asyncio.wait_for(
+                    _submit_vision(risk, vision_fn, *vision_args, tier=vision_tier), remaining)
+        except QueueFullError as e:
+            if remaining is None:
+                raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+            vision_tier = TIER_SENSOR
+        except asyncio.TimeoutError:
+            # Anggaran habis: pekerjaan yang belum jalan dibatalkan dari antrian
+            VISION_FALLBACKS.inc(reason="deadline")
+            vision_tier = TIER_SENSOR
+        except Exception as e:
+            logger.warning("YOLO analysis failed: %s", e)
+            vision_tier = None
+        if vision_analysis:
+            vision_tier = vision_analysis.get("tier", TIER_FULL)
+        if vision_tier is not None:
+            VISION_TIER.inc(tier=vision_tier)
+
+    with time_stage("rule_evaluation"):
+        payload = _build_payload(sensor_reading, vision_analysis, vision_tier)
+    if vision_analysis is not None:
+        VISION_MODEL_USED.inc(model=vision_analysis.get("model_used", "unknown"),
+                              backend=vision_analysis.get("model_backend", "none"))
+
+    # Serialisasi dilakukan di sini (bukan oleh FastAPI) supaya bisa diukur.
+    # Tanpa validasi (mode produksi) dict payload langsung di-encode.
+    with time_stage("response_serialization"):
+        if config.VALIDATE_RESPONSES:
+            payload = AnalyzeResponse.model_validate(payload).model_dump(mode="json")
+        if detections is not None and vision_analysis is not None:
+            payload["vision"] = format_vision(vision_analysis, detections)
+        result = render(payload, accept)
+    if vision_tier is not None:
+        result.headers["X-Vision-Tier"] = vision_tier
+    history_store.record(payload, station=station_id, patient=patient_id, endpoint=endpoint)
+    elapsed = time.perf_counter() - request_start
+    REQUEST_SECONDS.observe(elapsed, endpoint=endpoint)
+    logger.info("Analysis complete", extra={"endpoint": endpoint, "duration_ms": round(elapsed * 1000.0, 1),
+                                            "risk": payload["healthData"]["riskLevel"]})
+    return result
+
+
+@app.get("/capture")
+def capture_sources():
+    """Daftar sumber capture lokal beserta statistik frame (dibaca, dianalisis, dibuang)"""
+    return {"sources": {name: source.stats() for name, source in capture_manager.sources.items()}}
+
+
+@app.get("/capture/{name}")
+async def capture_latest(name: str, request: Request):
+    """
+    Hasil triase terbaru untuk satu sumber capture lokal.
+
+    Analisis visual berasal dari frame terbaru yang sudah dianalisis consumer
+    sumber tersebut; tanda vital dibaca dari snapshot sensor saat ini.
+    """
+    source = capture_manager.get(name)
+    if source is None:
+        raise HTTPException(status_code=404, detail=f"Sumber capture '{name}' tidak ada")
+    vision_analysis, captured_at, analyzed_at = source.latest()
+    if vision_analysis is None:
+        raise HTTPException(status_code=503, detail=f"Belum ada hasil analisis untuk '{name}'")
+
+    # Sumber capture milik station membaca sensor station itu sendiri
+    station = station_registry.get(name)
+    read_sensor = station.read_sensor if station is not None else get_sensor_data
+    loop = asyncio.get_running_loop()
+    try:
+        sensor_reading = await loop.run_in_executor(SENSOR_EXECUTOR, read_sensor)
+    except RuntimeError as e:
+        SENSOR_ERRORS.inc(endpoint="capture")
+        raise HTTPException(status_code=503, detail=f"Hardware Sensor Error: {str(e)}")
+
+    return render({
+        "source": name,
+        "capturedAt": int(captured_at * 1000),
+        "analyzedAt": int(analyzed_at * 1000),
+        "stats": source.stats(),
+        "triage": _build_response(sensor_reading, vision_analysis).model_dump(mode="json")
+    }, request.headers.get("accept"))
+
+
+@app.get("/stations")
+def stations():
+    """Station yang dikonfigurasi beserta status sampler sensor dan kamera"""
+    return {"stations": station_registry.stats()}
+
+
+@app.get("/history")
+def history(request: Request, station: Optional[str] = None, patient: Optional[str] = None,
+            start: Optional[int] = None, end: Optional[int] = None,
+            limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None, full: bool = False):
+    """
+    Riwayat triase terbaru dulu. Filter station/pasien dan rentang waktu
+    (epoch milidetik); halaman berikutnya lewat `cursor=<nextCursor>`.
+    `full=true` menyertakan response lengkap.
+    """
+    try:
+        page = history_store.query(station=station, patient=patient, start=start, end=end,
+                                   limit=limit, cursor=cursor, full=full)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return render(page, request.headers.get("accept"))
+
+
+@app.get("/history/series")
+def history_series(request: Request, station: Optional[str] = None, patient: Optional[str] = None,
+                   start: Optional[int] = None, end: Optional[int] = None,
+                   bucket_ms: Optional[int] = Query(None, ge=1000),
+                   max_points: int = Query(500, ge=1, le=10000)):
+    """Tren tanda vital untuk grafik: rata-rata per bucket waktu dan risk level tertinggi"""
+    try:
+        series = history_store.series(station=station, patient=patient, start=start, end=end,
+                                      bucket_ms=bucket_ms, max_points=max_points)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return render(series, request.headers.get("accept"))
+
+
+@app.websocket("/ws/triage")
+async def triage_socket(websocket: WebSocket):
+    """
+    Channel push untuk tanda vital dan status triase.
+
+    Server mengirim:
+    - {"type": "vitals", ...} setiap ada sampel sensor baru
+    - {"type": "triage", ...} hanya jika status, risk level atau gejala berubah
+    - {"type": "error", "detail": ...} jika status error sensor berubah
+
+    Client boleh mengirim frame kamera: pesan biner (JPEG/PNG mentah) atau
+    JSON {"imageData": "<base64>"}. Frame yang datang saat analisis visual
+    sebelumnya masih berjalan dibuang (hanya frame terbaru yang dipakai).
+    Dengan TRIAGE_LATENCY_BUDGET_MS, frame dianalisis pada tier degradasi
+    yang muat dalam anggaran (atau dibuang jika tidak ada yang muat).
+    Hasil visual berlaku TRIAGE_WS_VISION_MAX_AGE_S detik; tanpa frame baru
+    triase kembali memakai sensor saja. Frame melewati motion gate station `?station=<id>` (default "default"):
+    scene yang tidak berubah memakai hasil deteksi sebelumnya. Setiap pesan
+    triage dicatat ke riwayat station (dan pasien `?patient=<id>`). Jika
+    station terdaftar di stations.json, tanda vital dibaca dari sensor
+    station tersebut.
+    """
+    station_param = websocket.query_params.get("station")
+    try:
+        read_sensor = station_registry.sensor_reader(station_param, get_sensor_data)
+    except KeyError:
+        await websocket.close(code=4404, reason=f"Station '{station_param}' tidak terdaftar")
+        return
+    await websocket.accept()
+    station_id = station_param or "default"
+    station = station_registry.get(station_param)
+    patient_id = websocket.query_params.get("patient") or (station.patient_id if station else None)
+    loop = asyncio.get_running_loop()
+    state: Dict[str, Any] = {"vision": None, "vision_at": 0.0, "vision_task": None, "risk": "LOW"}
+    ws_budget = config.LATENCY_BUDGET_MS / 1000.0 if config.LATENCY_BUDGET_MS > 0 else None
+    changed = asyncio.Event()
+
+    def vision_done(task: "asyncio.Future"):
+        state["vision_task"] = None
+        if not task.cancelled() and task.exception() is None:
+            state["vision"] = task.result()
+            state["vision_at"] = time.monotonic()
+            changed.set()
+
+    async def receive_frames():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if not YOLO_AVAILABLE or state["vision_task"] is not None:
+                continue
+
+            if message.get("bytes"):
+                job = (analyze_health_image_bytes, message["bytes"], station_id)
+            elif message.get("text"):
+                try:
+                    image_data = json.loads(message["text"]).get("imageData")
+                except (ValueError, AttributeError):
+                    continue
+                if not image_data:
+                    continue
+                job = (analyze_health_image, image_data, station_id)
+            else:
+                continue
+            # Tier dari anggaran default (frame dibuang jika hanya sensor yang muat)
+            tier = _choose_tier(state["risk"], ws_budget)
+            if tier == TIER_SENSOR:
+                continue
+            try:
+                # Prioritas dari risiko tanda vital terakhir station ini
+                task = _submit_vision(state["risk"], *job, tier=tier)
+            except QueueFullError:
+                continue  # antrian penuh: frame dibuang
+            state["vision_task"] = task
+            task.add_done_callback(vision_done)
+
+    async def push_updates():
+        last_sample = None
+        last_triage = None
+        last_error = None
+        while True:
+            # Clear sebelum membaca state: hasil vision yang selesai selama
+            # await di bawah membangunkan iterasi berikutnya, tidak hilang
+            changed.clear()
+            try:
+                sensor_reading = await loop.run_in_executor(SENSOR_EXECUTOR, read_sensor)
+                error = None
+            except RuntimeError as e:
+                sensor_reading = None
+                error = str(e)
+
+            if error != last_error:
+                last_error = error
+                if error:
+                    await websocket.send_json({"type": "error", "detail": f"Hardware Sensor Error: {error}"})
+                    last_triage = None
+
+            if sensor_reading is not None:
+                sample_key = (sensor_reading.get('sampled_at'), sensor_reading['heartRate'], sensor_reading['spo2'])
+                if sample_key != last_sample:
+                    last_sample = sample_key
+                    await websocket.send_json({"type": "vitals", **sensor_reading})
+
+                state["risk"] = _sensor_risk(sensor_reading)
+                if (state["vision"] is not None and config.WS_VISION_MAX_AGE_S > 0
+                        and time.monotonic() - state["vision_at"] > config.WS_VISION_MAX_AGE_S):
+                    state["vision"] = None
+                response = _build_response(sensor_reading, state["vision"])
+                health_data = response.healthData
+                triage_key = (health_data["status"], health_data["riskLevel"], frozenset(health_data["symptoms"]))
+                if triage_key != last_triage:
+                    last_triage = triage_key
+                    payload = response.model_dump(mode="json")
+                    history_store.record(payload, station=station_id, patient=patient_id, endpoint="ws")
+                    await websocket.send_json({"type": "triage", **payload})
+
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=config.WS_PUSH_INTERVAL_S)
+            except asyncio.TimeoutError:
+                pass
+
+    tasks = [asyncio.create_task(receive_frames()), asyncio.create_task(push_updates())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                logger.warning("WebSocket error: %s", task.exception())
+    finally:
+        for task in tasks:
+            task.cancel()
+        if state["vision_task"] is not None:
+            state["vision_task"].cancel()
+
+
+def _build_response(sensor_reading: Dict[str, Any], vision_analysis: Optional[Dict[str, Any]]) -> AnalyzeResponse:
+    """Gabungkan hasil sensor dan analisis visual menjadi AnalyzeResponse"""
+    return AnalyzeResponse(**_build_payload(sensor_reading, vision_analysis))
+
+
+def _analysis_method(vision_analysis: Optional[Dict[str, Any]], vision_tier: Optional[str]) -> str:
+    if vision_analysis:
+        return ANALYSIS_METHODS.get(vision_analysis.get("tier", TIER_FULL), ANALYSIS_METHODS[TIER_FULL])
+    if vision_tier == TIER_SENSOR:
+        return ANALYSIS_METHODS[TIER_SENSOR]
+    return "sensor hardware only"
+
+
+def _build_payload(sensor_reading: Dict[str, Any], vision_analysis: Optional[Dict[str, Any]],
+                   vision_tier: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Payload AnalyzeResponse sebagai dict biasa (tanpa validasi pydantic).
+    analysis_method menyebut tier degradasi vision yang dipakai.
+    """
     current_temp = sensor_reading['temperature']
     current_spo2 = sensor_reading['spo2']
     current_heart_rate = sensor_reading['heartRate']
     current_bp = sensor_reading['bloodPressure']
     current_rr = sensor_reading['respiratoryRate']
 
+    # Satu snapshot tabel aturan untuk seluruh response (aman saat hot-reload)
+    rules = get_rules()
+
     # === ANALISIS SENSOR DATA ===
-    sensor_symptoms: List[str] = []
-    sensor_risk = RiskLevel.LOW
-
-    # Logika analisis tetap sama, tapi menggunakan data REAL
-    if current_temp >= 38.0:
-        sensor_symptoms.append("Demam Tinggi")
-        sensor_risk = RiskLevel.HIGH
-    elif current_temp >= 37.5:
-        sensor_symptoms.append("Demam")
-        sensor_risk = RiskLevel.MEDIUM
-
-    if current_spo2 < 90:
-        sensor_symptoms.append("Hipoksemia Berat")
-        sensor_risk = RiskLevel.CRITICAL
-    elif current_spo2 < 95:
-        sensor_symptoms.append("Hipoksemia")
-        sensor_risk = RiskLevel.HIGH
-
-    # Heart Rate analysis
-    if current_heart_rate:
-        if current_heart_rate > 120:
-            sensor_symptoms.append("Takikardia")
-            if sensor_risk == RiskLevel.LOW:
-                sensor_risk = RiskLevel.MEDIUM
-        elif current_heart_rate < 50:
-            sensor_symptoms.append("Bradikardia")
-            if sensor_risk == RiskLevel.LOW:
-                sensor_risk = RiskLevel.MEDIUM
-
-    # Blood Pressure analysis
-    if current_bp:
-        systolic = current_bp.get('systolic', 120)
-        diastolic = current_bp.get('diastolic', 80)
-        if systolic >= 180 or diastolic >= 120:
-            sensor_symptoms.append("Hipertensi Kritis")
-            sensor_risk = RiskLevel.CRITICAL
-        elif systolic >= 140 or diastolic >= 90:
-            sensor_symptoms.append("Hipertensi")
-            if sensor_risk == RiskLevel.LOW:
-                sensor_risk = RiskLevel.MEDIUM
-
-    # === ANALISIS VISUAL DENGAN YOLO ===
-    vision_analysis = None
-    if req.imageData and YOLO_AVAILABLE:
-        try:
-            vision_analysis = analyze_health_image(req.imageData)
-        except Exception as e:
-            print(f"⚠️  YOLO analysis failed: {e}")
+    sensor_symptoms, sensor_risk_level = evaluate_vitals(current_temp, current_spo2, current_heart_rate, current_bp,
+                                                         rules)
 
     # === GABUNGKAN ANALISIS SENSOR + VISUAL ===
     combined_symptoms = sensor_symptoms.copy()
-    combined_risk = sensor_risk
+    combined_risk = sensor_risk_level
     vision_insights = []
 
     if vision_analysis and vision_analysis['overall_analysis']:
@@ -161,54 +806,28 @@ def analyze(req: AnalyzeRequest):
         vision_symptoms = vision_data.get('symptoms', [])
         combined_symptoms.extend(vision_symptoms)
 
-        vision_risk_level = vision_data.get('risk_level', 'LOW')
-        risk_hierarchy = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3, 'CRITICAL': 4}
-        current_risk_value = risk_hierarchy.get(combined_risk.value, 1)
-        vision_risk_value = risk_hierarchy.get(vision_risk_level, 1)
-
-        if vision_risk_value > current_risk_value:
-            combined_risk = RiskLevel(vision_risk_level)
+        # Urutan risiko dari tabel aturan terkompilasi; level tak dikenal = terendah
+        vision_rank = rules.risk_rank.get(vision_data.get('risk_level'), 0)
+        if vision_rank > rules.risk_rank[combined_risk]:
+            combined_risk = rules.risk_levels[vision_rank]
 
         detected_conditions = vision_data.get('detected_conditions', [])
         if detected_conditions:
             vision_insights.append(f"Visual analysis mendeteksi: {', '.join(detected_conditions)}")
 
-    combined_symptoms = list(set(combined_symptoms))
+    # Hapus duplikat dengan urutan tetap (sama dengan /analyze/batch)
+    combined_symptoms = list(dict.fromkeys(combined_symptoms))
 
     # === TENTUKAN STATUS AKHIR ===
-    status = TriageStatus.NORMAL
-    message = "Kondisi Dalam Batas Normal"
-    recommendations: List[str] = ["Jaga pola hidup sehat", "Lakukan pemeriksaan rutin"]
-
-    if combined_risk == RiskLevel.CRITICAL:
-        status = TriageStatus.DARURAT
-        message = "Perlu Penanganan Darurat Segera"
-        recommendations = [
-            "Segera hubungi tim medis",
-            "Monitor tanda vital terus menerus",
-            "Siapkan alat resusitasi jika diperlukan"
-        ]
-    elif combined_risk == RiskLevel.HIGH:
-        status = TriageStatus.KRITIS
-        message = "Perlu Perhatian Medis Segera"
-        recommendations = [
-            "Kunjungi unit gawat darurat",
-            "Pantau kondisi secara berkala",
-            "Siapkan riwayat kesehatan"
-        ]
-    elif combined_risk == RiskLevel.MEDIUM:
-        status = TriageStatus.WASPADA
-        message = "Perlu Pemantauan Kesehatan"
-        recommendations = [
-            "Konsultasi dengan dokter",
-            "Istirahat yang cukup",
-            "Monitor gejala"
-        ]
+    outcome = rules.outcomes[combined_risk]
+    status = TriageStatus(outcome.status)
+    message = outcome.message
+    recommendations: List[str] = list(outcome.recommendations)
 
     if vision_analysis and vision_analysis['overall_analysis']:
         vision_recs = vision_analysis['overall_analysis'].get('recommendations', [])
         recommendations.extend(vision_recs)
-        recommendations = list(set(recommendations))
+        recommendations = list(dict.fromkeys(recommendations))
 
     # === BUAT RESPONSE ===
     health_data = {
@@ -220,22 +839,20 @@ def analyze(req: AnalyzeRequest):
         "symptoms": combined_symptoms,
         "status": status.value,
         "message": message,
-        "riskLevel": combined_risk.value,
+        "riskLevel": combined_risk,
         "recommendations": recommendations,
         "vision_insights": vision_insights,
         "is_simulated": sensor_reading.get('is_simulated', False),
-        "analysis_method": "sensor hardware + vision" if vision_analysis else "sensor hardware only"
+        "analysis_method": _analysis_method(vision_analysis, vision_tier)
     }
 
     confidence = 0.8  # Base confidence lebih tinggi karena pakai hardware real
     if vision_analysis:
         confidence += 0.1
-    
-    print(f"✅ Analysis complete , {time.time() - start_time:.2f}s")
-
-    return AnalyzeResponse(
-        healthData=health_data,
-        confidence=min(confidence, 0.95),
-        detectedConditions=combined_symptoms,
-        timestamp=int(time.time() * 1000)
-    )
\ No newline at end of file
+
+    return {
+        "healthData": health_data,
+        "confidence": min(confidence, 0.95),
+        "detectedConditions": combined_symptoms,
+        "timestamp": int(time.time() * 1000)
+    }
\ No newline at end of file
@@ -0,0 +1,178 @@
+"""
+Motion gate untuk feed kamera kontinu (bedside monitoring).
+
+Sebelum YOLO dijalankan, setiap frame diperkecil menjadi thumbnail grayscale
+(JPEG didecode langsung pada skala 1/8) lalu dibandingkan dengan thumbnail
+frame terakhir yang benar-benar diinferensi di station yang sama. Jika
+bagian yang berubah di bawah ambang, hasil deteksi sebelumnya dipakai ulang.
+Hasil lama dipaksa diperbarui setelah max_age_s.
+
+ID station berasal dari client (stationId, ?station=), jadi state per
+station dibatasi max_stations dengan LRU: station yang paling lama tidak
+mengirim frame dibuang lebih dulu.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from preprocessing import read_image_size
+
+
+class _StationState(NamedTuple):
+    thumbnail: np.ndarray
+    result: Dict[str, Any]
+    namespace: Any
+    updated_at: float
+
+
+class MotionGate:
+    """Detektor perubahan scene per station (thread-safe)"""
+
+    def __init__(self,
+                 threshold: float = 0.02,
+                 pixel_delta: int = 12,
+                 max_age_s: float = 10.0,
+                 thumb_size: int = 64,
+                 max_stations: int = 64):
+        """
+        Args:
+            threshold: Fraksi piksel thumbnail yang berubah agar frame dianggap
+                berbeda (0 = gate mati, selalu inferensi)
+            pixel_delta: Selisih level abu-abu minimum agar piksel dihitung berubah
+            max_age_s: Umur maksimum hasil yang dipakai ulang
+            thumb_size: Sisi terpanjang thumbnail pembanding
+            max_stations: Jumlah station maksimum yang state dan statistiknya
+                disimpan (LRU)
+        """
+        self.threshold = threshold
+        self.pixel_delta = pixel_delta
+        self.max_age = max_age_s
+        self.thumb_size = thumb_size
+        self.max_stations = max(1, max_stations)
+        self._stations: "OrderedDict[str, _StationState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.refreshed_by_age = 0
+        self.evicted_stations = 0
+        self._station_frames: "OrderedDict[str, list]" = OrderedDict()
+        # [frames, skipped] station yang statistiknya sudah dibuang LRU
+        self._evicted_frames = [0, 0]
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def thumbnail(self, image_bytes) -> Optional[np.ndarray]:
+        """Thumbnail grayscale kecil dari byte gambar terenkode"""
+        header = read_image_size(image_bytes)
+        flag = cv2.IMREAD_REDUCED_GRAYSCALE_8 if header is not None and header[0] == 'jpeg' else cv2.IMREAD_GRAYSCALE
+        gray = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flag)
+        if gray is None:
+            return None
+        return self._shrink(gray)
+
+    def thumbnail_from_image(self, image: np.ndarray) -> np.ndarray:
+        """Thumbnail grayscale kecil dari frame BGR yang sudah didecode"""
+        # Perkecil dulu baru konversi warna (jauh lebih sedikit piksel)
+        small = self._shrink(image)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def _shrink(self, image: np.ndarray) -> np.ndarray:
+        h, w = image.shape[:2]
+        r = self.thumb_size / max(h, w)
+        size = (max(1, int(round(w * r))), max(1, int(round(h * r))))
+        # INTER_AREA merata-ratakan blok piksel sehingga noise sensor ikut teredam
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def change_score(self, previous: np.ndarray, current: np.ndarray) -> float:
+        """Fraksi piksel thumbnail yang berubah lebih dari pixel_delta"""
+        if previous.shape != current.shape:
+            return 1.0
+        diff = cv2.absdiff(previous, current)
+        return np.count_nonzero(diff > self.pixel_delta) / diff.size
+
+    def lookup(self, station_id: str, thumbnail: np.ndarray, namespace: Any = None) -> Optional[Dict[str, Any]]:
+        """
+        Hasil sebelumnya jika scene station ini tidak berubah, None jika
+        frame harus diinferensi
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.frames += 1
+            counts = self._station_frames.get(station_id)
+            if counts is None:
+                counts = self._station_frames[station_id] = [0, 0]
+                evicted = self._evict(self._station_frames)
+                if evicted is not None:
+                    self._evicted_frames[0] += evicted[0]
+                    self._evicted_frames[1] += evicted[1]
+            else:
+                self._station_frames.move_to_end(station_id)
+            counts[0] += 1
+
+            state = self._stations.get(station_id)
+            if state is None or state.namespace != namespace:
+                return None
+            if now - state.updated_at > self.max_age:
+                self.refreshed_by_age += 1
+                return None
+            if self.change_score(state.thumbnail, thumbnail) >= self.threshold:
+                return None
+
+            self.skipped += 1
+            counts[1] += 1
+            return state.result
+
+    def update(self, station_id: str, thumbnail: np.ndarray, result: Dict[str, Any], namespace: Any = None):
+        """Simpan thumbnail + hasil inferensi terbaru sebagai pembanding"""
+        with self._lock:
+            self._stations[station_id] = _StationState(thumbnail, result, namespace, time.monotonic())
+            self._stations.move_to_end(station_id)
+            if self._evict(self._stations) is not None:
+                self.evicted_stations += 1
+
+    def _evict(self, entries: "OrderedDict") -> Any:
+        """Buang station yang paling lama tidak dipakai jika melebihi max_stations"""
+        if len(entries) <= self.max_stations:
+            return None
+        return entries.popitem(last=False)[1]
+
+    def reset(self, station_id: Optional[str] = None):
+        with self._lock:
+            if station_id is None:
+                self._stations.clear()
+            else:
+                self._stations.pop(station_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'threshold': self.threshold,
+                'pixel_delta': self.pixel_delta,
+                'max_age_s': self.max_age,
+                'frames': self.frames,
+                'skipped': self.skipped,
+                'skip_ratio': (self.skipped / self.frames) if self.frames else 0.0,
+                'refreshed_by_age': self.refreshed_by_age,
+                'evicted_stations': self.evicted_stations,
+                'stations': {
+                    station: {
+                        'frames': frames,
+                        'skipped': skipped,
+                        'skip_ratio': (skipped / frames) if frames else 0.0
+                    }
+                    for station, (frames, skipped) in self._station_frames.items()
+                },
+                # Total station yang sudah dibuang LRU (counter tetap monoton)
+                'evicted_station_counts': {
+                    'frames': self._evicted_frames[0],
+                    'skipped': self._evicted_frames[1]
+                }
+            }
@@ -0,0 +1,200 @@
+"""
+Preprocessing gambar sebelum inferensi YOLO.
+
+- Ukuran gambar dibaca dari header JPEG (SOF) / PNG (IHDR) tanpa decode
+- JPEG didecode langsung pada skala 1/2, 1/4 atau 1/8 (DCT scaling libjpeg)
+  selama sisi terpanjang hasilnya masih >= ukuran input model
+- Letterbox ke ukuran input model, bisa ditulis ke buffer yang sudah
+  dialokasikan (dipakai ulang antar request)
+- Box hasil deteksi dikembalikan ke koordinat gambar asli
+"""
+
+import struct
+from typing import NamedTuple, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+PAD_COLOR = 114
+
+# Marker Start Of Frame JPEG (baseline, progressive, lossless, dst.)
+_JPEG_SOF_MARKERS = frozenset((0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                               0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF))
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+
+class PreparedFrame(NamedTuple):
+    """Frame siap inferensi beserta transformasi ke koordinat gambar asli"""
+    image: np.ndarray            # (size, size, 3) uint8 BGR
+    scale: Tuple[float, float]   # (sx, sy) gambar asli -> input model
+    pad: Tuple[float, float]     # (pad_x, pad_y) di input model
+    shape: Tuple[int, int]       # (height, width) gambar asli
+    reduction: int               # faktor DCT scaling saat decode (1 = penuh)
+
+
+def read_image_size(data) -> Optional[Tuple[str, int, int]]:
+    """
+    Baca format dan ukuran gambar dari header tanpa decode
+
+    Returns:
+        (format 'jpeg'/'png', width, height) atau None jika tidak dikenali
+    """
+    view = memoryview(data).cast('B') if not isinstance(data, (bytes, bytearray)) else data
+    n = len(view)
+
+    if n >= 24 and bytes(view[:8]) == _PNG_SIGNATURE and bytes(view[12:16]) == b'IHDR':
+        width, height = struct.unpack('>II', bytes(view[16:24]))
+        return 'png', width, height
+
+    if n < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+
+    # Telusuri segmen JPEG sampai ketemu SOF
+    i = 2
+    while i + 9 < n:
+        if view[i] != 0xFF:
+            return None
+        marker = view[i + 1]
+        if marker == 0xFF:  # padding byte
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # marker tanpa panjang
+            i += 2
+            continue
+        if marker == 0xDA:  # Start Of Scan sebelum SOF: header tidak valid
+            return None
+        length = (view[i + 2] << 8) | view[i + 3]
+        if marker in _JPEG_SOF_MARKERS:
+            height = (view[i + 5] << 8) | view[i + 6]
+            width = (view[i + 7] << 8) | view[i + 8]
+            return 'jpeg', width, height
+        i += 2 + length
+    return None
+
+
+def choose_reduction(width: int, height: int, target: int) -> int:
+    """Faktor DCT scaling terbesar yang sisi terpanjangnya masih >= target"""
+    longest = max(width, height)
+    for factor in (8, 4, 2):
+        if -(-longest // factor) >= target:
+            return factor
+    return 1
+
+
+def decode_image(data, target: Optional[int] = None) -> Optional[Tuple[np.ndarray, Tuple[int, int], int]]:
+    """
+    Decode JPEG/PNG ke BGR, untuk JPEG langsung pada resolusi tereduksi
+
+    Args:
+        data: Byte gambar terenkode (bytes, bytearray atau memoryview)
+        target: Ukuran input model; None = decode resolusi penuh
+
+    Returns:
+        (gambar BGR, (height, width) gambar asli, faktor reduksi) atau None
+        jika format tidak dikenali
+    """
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    header = read_image_size(data)
+    factor = 1
+    if target and header is not None and header[0] == 'jpeg':
+        factor = choose_reduction(header[1], header[2], target)
+
+    image = cv2.imdecode(buffer, _REDUCED_FLAGS[factor])
+    if image is None:
+        return None
+
+    if factor == 1:
+        return image, image.shape[:2], 1
+
+    width, height = header[1], header[2]
+    h, w = image.shape[:2]
+    # Orientasi EXIF sudah diterapkan decoder: tukar ukuran header jika diputar
+    if (h > w) != (height > width) and h != w:
+        width, height = height, width
+    return image, (height, width), factor
+
+
+def letterbox(image: np.ndarray,
+              size: int,
+              color: int = PAD_COLOR,
+              out: Optional[np.ndarray] = None) -> Tuple[np.ndarray, float, Tuple[float, float]]:
+    """
+    Resize dengan menjaga aspect ratio lalu padding ke size x size
+    (sama seperti preprocessing ultralytics)
+
+    Args:
+        out: Buffer (size, size, 3) uint8 tujuan; None = alokasi baru
+
+    Returns:
+        (gambar letterbox, skala, (pad_x, pad_y))
+    """
+    h, w = image.shape[:2]
+    if (h, w) == (size, size) and out is None:
+        return image, 1.0, (0.0, 0.0)
+
+    r = min(size / h, size / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    pad_x, pad_y = (size - new_w) / 2, (size - new_h) / 2
+    left, top = int(round(pad_x - 0.1)), int(round(pad_y - 0.1))
+
+    if out is None:
+        out = np.full((size, size, 3), color, dtype=np.uint8)
+    else:
+        # Isi ulang hanya area padding, area gambar langsung ditimpa resize
+        out[:top] = color
+        out[top + new_h:] = color
+        out[top:top + new_h, :left] = color
+        out[top:top + new_h, left + new_w:] = color
+
+    target = out[top:top + new_h, left:left + new_w]
+    if (new_w, new_h) != (w, h):
+        cv2.resize(image, (new_w, new_h), dst=target, interpolation=cv2.INTER_LINEAR)
+    else:
+        target[...] = image
+    return out, r, (left, top)
+
+
+def prepare_frame(image: np.ndarray,
+                  size: int,
+                  shape: Optional[Tuple[int, int]] = None,
+                  reduction: int = 1,
+                  out: Optional[np.ndarray] = None) -> PreparedFrame:
+    """
+    Letterbox frame hasil decode (mungkin tereduksi) ke ukuran input model
+
+    Args:
+        image: Gambar BGR hasil decode
+        size: Ukuran input model (imgsz)
+        shape: (height, width) gambar asli; None = ukuran image
+        reduction: Faktor reduksi saat decode
+        out: Buffer tujuan yang dipakai ulang
+    """
+    h, w = image.shape[:2]
+    shape = tuple(shape) if shape is not None else (h, w)
+    boxed, r, pad = letterbox(image, size, out=out)
+    # Skala per sumbu: ukuran hasil decode tereduksi dibulatkan ke atas
+    scale = (w * r / shape[1], h * r / shape[0])
+    return PreparedFrame(boxed, scale, pad, shape, reduction)
+
+
+def scale_boxes(boxes: np.ndarray,
+                scale: Union[float, Tuple[float, float]],
+                pad: Tuple[float, float],
+                shape: Tuple[int, int]) -> np.ndarray:
+    """Kembalikan box dari koordinat letterbox ke koordinat gambar asli"""
+    if not len(boxes):
+        return boxes
+    sx, sy = (scale, scale) if np.isscalar(scale) else scale
+    boxes = (boxes - np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)) \
+        / np.array([sx, sy, sx, sy], dtype=np.float32)
+    h, w = shape
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h)
+    return boxes
@@ -0,0 +1,97 @@
+"""
+Cache hasil inferensi berbasis isi gambar (content-addressed).
+
+Client sering mengirim ulang frame yang sama (retry, polling). Kunci cache
+adalah hash BLAKE2b dari byte gambar terenkode (atau teks base64-nya),
+sehingga hit tidak perlu decode maupun inferensi. Cache dibatasi jumlah
+entri (LRU) dan umur entri (TTL).
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+def content_digest(data) -> bytes:
+    """Hash 128-bit dari byte gambar (bytes, bytearray, memoryview atau str base64)"""
+    if isinstance(data, str):
+        data = data.encode('ascii', 'ignore')
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class ResultCache:
+    """LRU cache dengan TTL dan counter hit/miss/eviction (thread-safe)"""
+
+    def __init__(self, max_entries: int = 256, ttl_s: float = 30.0):
+        """
+        Args:
+            max_entries: Jumlah entri maksimum (0 = cache mati)
+            ttl_s: Umur maksimum entri dalam detik (0 = tanpa batas umur)
+        """
+        self.max_entries = max(0, max_entries)
+        self.ttl = max(0.0, ttl_s)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl and now - stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Kosongkan cache (mis. model diganti)"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_s': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -1,5 +1,17 @@
 import time
+import logging
 import platform
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import config
+from sensor_trace import ReplaySource, SensorSample, TraceRecorder
+from signal_processing import PPGEstimate, PPGProcessor
+
+logger = logging.getLogger(__name__)
 
 # Library untuk Raspberry Pi
 try:
@@ -19,32 +31,342 @@ try:
 except Exception:
     MAX_AVAILABLE = False
 
-def get_sensor_data():
-    """Membaca data REAL dari hardware. Raise error jika sensor mati."""
-    
-    if not MLX_AVAILABLE:
-        raise RuntimeError("Sensor Suhu (MLX90614) tidak terdeteksi di I2C bus!")
-    
-    if not MAX_AVAILABLE:
-        raise RuntimeError("Sensor Jantung (MAX30102) tidak terdeteksi di I2C bus!")
 
-    try:
-        # Membaca suhu tubuh asli
-        temp = round(mlx.object_temperature, 1)
-        
-        # Membaca HR dan SpO2 asli
-        # Catatan: MAX30102 butuh jari menempel. 
-        # Jika tidak ada jari, biasanya return 0 atau error.
-        red, ir = max30102.read_sequential()
-        
-        # Skenario Serius: Anda perlu algoritma konversi dari 'red' & 'ir' ke HR/SpO2
-        # Untuk sementara kita asumsikan library mengembalikan nilai olah, 
-        # jika raw, Anda butuh fungsi pemroses sinyal disini.
-        hr = 75  # TODO: Implementasi algoritma sinyal HR asli
-        spo2 = 98 # TODO: Implementasi algoritma sinyal SpO2 asli
+class RingBuffer:
+    """
+    Ring buffer NumPy dengan kapasitas tetap untuk sampel bertimestamp.
+
+    Memori dialokasikan sekali di awal. Kolom 0 selalu timestamp (detik,
+    time.time()), kolom berikutnya sesuai `columns`.
+    """
+
+    def __init__(self, capacity: int, columns: Tuple[str, ...]):
+        self.capacity = max(1, int(capacity))
+        self.columns = columns
+        self._data = np.zeros((self.capacity, 1 + len(columns)), dtype=np.float64)
+        self._count = 0  # total sampel yang pernah ditulis
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    def append(self, timestamp: float, *values: float):
+        """Tulis satu sampel, menimpa sampel tertua jika penuh"""
+        with self._lock:
+            row = self._data[self._count % self.capacity]
+            row[0] = timestamp
+            row[1:] = values
+            self._count += 1
+
+    def latest(self) -> Optional[np.ndarray]:
+        """Sampel terakhir [timestamp, *values] dalam O(1), atau None jika kosong"""
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._data[(self._count - 1) % self.capacity].copy()
+
+    def window(self, seconds: Optional[float] = None, count: Optional[int] = None) -> np.ndarray:
+        """
+        Ambil sampel terbaru secara kronologis
+
+        Args:
+            seconds: Hanya sampel dalam N detik terakhir
+            count: Hanya N sampel terakhir
+
+        Returns:
+            Array (n, 1 + len(columns)), baris tertua lebih dulu
+        """
+        with self._lock:
+            n = min(self._count, self.capacity)
+            if count is not None:
+                n = min(n, max(0, int(count)))
+            end = self._count % self.capacity
+            idx = (np.arange(end - n, end)) % self.capacity
+            rows = self._data[idx]
+
+        if seconds is not None and len(rows):
+            rows = rows[rows[:, 0] >= rows[-1, 0] - seconds]
+        return rows
+
+
+# Bus I2C header GPIO Raspberry Pi (SCL/SDA), dipakai driver global di atas
+DEFAULT_I2C_BUS = 1
+# Register suhu objek MLX90614 (RAM 0x07), satuan 0.02 K
+MLX_OBJECT_TEMP_REGISTER = 0x07
+
+_bus_locks: Dict[int, threading.Lock] = {}
+_bus_locks_guard = threading.Lock()
+
+
+def bus_lock(bus: int) -> threading.Lock:
+    """
+    Lock per bus I2C. Semua sumber di bus yang sama (termasuk kanal mux
+    berbeda) membaca bergiliran; bus berbeda berjalan paralel.
+    """
+    with _bus_locks_guard:
+        lock = _bus_locks.get(bus)
+        if lock is None:
+            lock = _bus_locks[bus] = threading.Lock()
+        return lock
+
+
+class HardwareSource:
+    """
+    Sensor fisik di bus I2C: MAX30102 tiap tick, MLX90614 tiap temp_interval_s
+
+    Tanpa `bus`, driver global (bus GPIO default) yang dipakai. Dengan `bus`,
+    sensor dibuka di bus tersebut (smbus2 + max30102), opsional di belakang
+    multiplexer TCA9548A (mux_address + mux_channel) untuk beberapa set
+    sensor dengan alamat sama. Setiap pembacaan memegang lock bus.
+    """
+
+    name = "hardware"
+    simulated = False
+    # Laju mengikuti konfigurasi sampler
+    sample_rate_hz: Optional[float] = None
+    tick_rate_hz: Optional[float] = None
+
+    def __init__(self,
+                 temp_interval_s: float = 1.0,
+                 bus: Optional[int] = None,
+                 mlx_address: int = 0x5A,
+                 max_address: int = 0x57,
+                 mux_address: Optional[int] = None,
+                 mux_channel: Optional[int] = None):
+        self.temp_interval = temp_interval_s
+        self.bus = bus
+        self.mlx_address = mlx_address
+        self.max_address = max_address
+        self.mux_address = mux_address
+        self.mux_channel = mux_channel
+        self.lock = bus_lock(bus if bus is not None else DEFAULT_I2C_BUS)
+        self._smbus = None
+        self._max = None
+        self._next_temp = 0.0
+
+    def check(self):
+        if self.bus is None:
+            _check_hardware()
+            return
+        if self._max is not None:
+            return
+        try:
+            from smbus2 import SMBus
+            from max30102 import MAX30102
+            with self.lock:
+                self._smbus = SMBus(self.bus)
+                self._select()
+                self._max = MAX30102(channel=self.bus, address=self.max_address)
+        except Exception as e:
+            self._smbus = None
+            raise RuntimeError(f"Sensor di I2C bus {self.bus} tidak terdeteksi: {e}") from e
+
+    def _select(self):
+        # Kanal mux harus dipilih ulang tiap baca: kanal lain di bus yang
+        # sama mungkin dipilih station lain sejak pembacaan terakhir
+        if self.mux_address is not None:
+            self._smbus.write_byte(self.mux_address, 1 << self.mux_channel)
+
+    def _read_temperature(self) -> float:
+        if self.bus is None:
+            return mlx.object_temperature
+        raw = self._smbus.read_word_data(self.mlx_address, MLX_OBJECT_TEMP_REGISTER)
+        return raw * 0.02 - 273.15
+
+    def read(self) -> SensorSample:
+        # MLX90614: suhu berubah lambat, cukup dibaca tiap temp_interval
+        now = time.monotonic()
+        read_temperature = now >= self._next_temp
+        with self.lock:
+            self._select()
+            # MAX30102: satu sampel red/IR dari FIFO per tick
+            red, ir = (max30102 if self.bus is None else self._max).read_fifo()
+            temperature = self._read_temperature() if read_temperature else None
+        if read_temperature:
+            self._next_temp = now + self.temp_interval
+        return SensorSample(red, ir, temperature)
+
+
+def create_source(backend: str = config.SENSOR_BACKEND):
+    """Sumber sensor sesuai TRIAGE_SENSOR_BACKEND (hardware atau replay)"""
+    if backend == "hardware":
+        return HardwareSource(temp_interval_s=config.SENSOR_TEMP_INTERVAL_S)
+    if backend == "replay":
+        # Path relatif terhadap folder server (sama seperti stations.json dan
+        # triage_rules.json), bukan working directory proses
+        path = Path(config.SENSOR_REPLAY_PATH)
+        if not path.is_absolute():
+            path = Path(__file__).resolve().parent / path
+        return ReplaySource(path, speed=config.SENSOR_REPLAY_SPEED, loop=config.SENSOR_REPLAY_LOOP)
+    raise ValueError(f"Backend sensor tidak dikenal: {backend} (pilihan: hardware, replay)")
+
+
+class SensorSampler:
+    """
+    Thread sampler yang menjadi satu-satunya pemilik bus I2C.
+
+    Sensor dibaca dengan laju tetap ke ring buffer; request HTTP cukup membaca
+    snapshot terakhir tanpa menyentuh bus. Sumber sampel bisa hardware atau
+    replay trace (sensor_trace.py), dan sampel bisa direkam ke trace.
+    """
+
+    def __init__(self,
+                 source=None,
+                 ppg_rate_hz: float = 50.0,
+                 temp_interval_s: float = 1.0,
+                 buffer_seconds: float = 30.0,
+                 ppg_chunk: int = 10,
+                 recorder: Optional[TraceRecorder] = None):
+        self.source = source if source is not None else HardwareSource(temp_interval_s)
+        self.recorder = recorder
+        self.ppg_rate_hz = ppg_rate_hz
+        self.temp_interval_s = temp_interval_s
+        self.buffer_seconds = buffer_seconds
+        self.ppg_chunk = max(1, ppg_chunk)
+        self._configure(ppg_rate_hz)
+        self._tick = self.ppg_period
+
+        self.last_error: Optional[str] = None
+        self.error_count = 0
+
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._first_sample = threading.Event()
+        self._lock = threading.Lock()
+
+    def _configure(self, sample_rate_hz: float):
+        """Alokasi ring buffer dan estimator untuk sample rate sumber"""
+        self.ppg_period = 1.0 / max(sample_rate_hz, 1.0)
+        self.temp_interval = max(self.temp_interval_s, self.ppg_period)
+
+        self.temperature = RingBuffer(self.buffer_seconds / self.temp_interval + 1, ('temperature',))
+        self.ppg = RingBuffer(self.buffer_seconds / self.ppg_period + 1, ('red', 'ir'))
+
+        # HR/SpO2 diproses inkremental per chunk sampel PPG
+        self.processor = PPGProcessor(fs=1.0 / self.ppg_period)
+        self.vitals = PPGEstimate(None, None, None, False)
+        self._pending = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        Mulai thread sampler (idempotent). Raise RuntimeError jika sumber
+        sensor tidak tersedia (alasannya disimpan di last_error)
+        """
+        if self.running:
+            return
+        with self._lock:
+            if self.running:
+                return
+            try:
+                self.source.check()
+            except RuntimeError as e:
+                self.last_error = str(e)
+                raise
+            # Trace replay membawa sample rate sendiri (fs estimator PPG)
+            rate = self.source.sample_rate_hz
+            if rate and abs(1.0 / rate - self.ppg_period) > 1e-9:
+                self._configure(rate)
+            tick_rate = self.source.tick_rate_hz or 1.0 / self.ppg_period
+            self._tick = 1.0 / tick_rate
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sensor-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=2.0)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def _ingest(self, timestamp: float, sample: SensorSample):
+        if sample.red is not None and sample.ir is not None:
+            self.ppg.append(timestamp, sample.red, sample.ir)
+            self._pending += 1
+            if self._pending >= self.ppg_chunk:
+                chunk = self.ppg.window(count=self._pending)
+                self.vitals = self.processor.update(chunk[:, 1], chunk[:, 2])
+                self._pending = 0
+        elif sample.heart_rate is not None and sample.spo2 is not None:
+            # Trace tanda vital saja: HR/SpO2 sudah jadi
+            self.vitals = PPGEstimate(sample.heart_rate, sample.spo2, None, True)
+
+        if sample.temperature is not None:
+            self.temperature.append(timestamp, sample.temperature)
+            self._first_sample.set()
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                sample = self.source.read()
+                now = time.time()
+                self._ingest(now, sample)
+                if self.recorder is not None:
+                    self.recorder.append(now, sample)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                self.error_count += 1
+                if getattr(self.source, "finished", False):
+                    # Replay tanpa loop sudah habis: snapshot terakhir tetap
+                    # ada sampai basi (SENSOR_STALE_S), lalu 503
+                    break
+                # Sampel PPG terputus: mulai ulang estimasi dari awal
+                self.processor.reset()
+                self.vitals = PPGEstimate(None, None, None, False)
+                self._pending = 0
+
+            if self._tick == 0.0:
+                continue
+            next_tick += self._tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Tertinggal (bus lambat): jangan kejar backlog tick
+                next_tick = time.monotonic()
+
+    def snapshot(self, wait_s: float = 0.0) -> Dict[str, Any]:
+        """
+        Data sensor terbaru dari ring buffer dalam O(1).
+
+        Raise RuntimeError jika belum ada data atau data sudah basi.
+        """
+        # Sampler yang tidak berjalan tidak akan pernah mengisi buffer
+        if wait_s > 0 and self.running:
+            self._first_sample.wait(wait_s)
+
+        temp_row = self.temperature.latest()
+        if temp_row is None:
+            detail = f": {self.last_error}" if self.last_error else ""
+            raise RuntimeError(f"Belum ada data dari sensor{detail}")
+
+        age = time.time() - temp_row[0]
+        if age > config.SENSOR_STALE_S:
+            raise RuntimeError(
+                f"Gagal membaca data dari sensor: {self.last_error} (data terakhir {age:.1f}s lalu)"
+            )
+
+        # Catatan: MAX30102 butuh jari menempel.
+        # HR/SpO2 dihitung dari sinyal red/IR oleh PPGProcessor.
+        vitals = self.vitals
+        if not vitals.finger_detected:
+            raise RuntimeError("Sensor Jantung (MAX30102): jari tidak terdeteksi atau sinyal belum stabil")
+        if vitals.heart_rate is None or vitals.spo2 is None:
+            raise RuntimeError("Sensor Jantung (MAX30102): sinyal PPG belum cukup untuk menghitung HR/SpO2")
+        hr = int(round(vitals.heart_rate))
+        spo2 = int(round(vitals.spo2))
 
         return {
-            "temperature": temp,
+            "temperature": round(float(temp_row[1]), 1),
             "spo2": spo2,
             "heartRate": hr,
             "bloodPressure": {
@@ -52,7 +374,61 @@ def get_sensor_data():
                 "diastolic": 0
             },
             "respiratoryRate": 0, # Belum ada sensor fisik
-            "is_simulated": False
+            "is_simulated": self.source.simulated,
+            "sampled_at": int(temp_row[0] * 1000)
         }
-    except Exception as e:
-        raise RuntimeError(f"Gagal membaca data dari sensor: {str(e)}")
\ No newline at end of file
+
+
+# Global sampler
+sampler = SensorSampler(
+    source=create_source(),
+    recorder=TraceRecorder(config.SENSOR_RECORD_PATH) if config.SENSOR_RECORD_PATH else None,
+    ppg_rate_hz=config.SENSOR_PPG_RATE_HZ,
+    temp_interval_s=config.SENSOR_TEMP_INTERVAL_S,
+    buffer_seconds=config.SENSOR_BUFFER_SECONDS,
+    ppg_chunk=config.SENSOR_PPG_CHUNK
+)
+
+
+def _check_hardware():
+    if not MLX_AVAILABLE:
+        raise RuntimeError("Sensor Suhu (MLX90614) tidak terdeteksi di I2C bus!")
+
+    if not MAX_AVAILABLE:
+        raise RuntimeError("Sensor Jantung (MAX30102) tidak terdeteksi di I2C bus!")
+
+
+def start_sampler() -> bool:
+    """Mulai sampler jika sumber sensor tersedia. Return True jika berjalan."""
+    try:
+        sampler.start()
+    except RuntimeError as e:
+        logger.info("Sensor sampler (%s) tidak berjalan: %s", sampler.source.name, e)
+        return False
+    return True
+
+
+def stop_sampler():
+    sampler.stop()
+
+
+def get_sensor_data():
+    """Membaca data sensor (snapshot sampler). Raise error jika sensor mati."""
+    # Sampler dimulai saat startup server (start_sampler di lifespan/layanan
+    # sensor); script di luar server memanggil start_sampler() sendiri.
+    # Jika sensor tidak terdeteksi saat start, snapshot membawa alasannya.
+    return sampler.snapshot(wait_s=config.SENSOR_STARTUP_WAIT_S)
+
+
+def get_sensor_window(seconds: float) -> Dict[str, np.ndarray]:
+    """Ambil window sampel mentah (timestamp, suhu, red/IR) N detik terakhir"""
+    sampler.source.check()
+    temperature = sampler.temperature.window(seconds=seconds)
+    ppg = sampler.ppg.window(seconds=seconds)
+    return {
+        "temperature_t": temperature[:, 0],
+        "temperature": temperature[:, 1],
+        "ppg_t": ppg[:, 0],
+        "red": ppg[:, 1],
+        "ir": ppg[:, 2]
+    }
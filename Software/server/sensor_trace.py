@@ -0,0 +1,287 @@
+"""
+Rekaman (trace) data sensor untuk replay tanpa hardware.
+
+Format trace: array NumPy terstruktur dengan kolom float64
+    t            detik sejak awal rekaman
+    red, ir      sampel PPG mentah MAX30102 (NaN jika tidak ada)
+    temperature  suhu MLX90614 (NaN jika tidak dibaca pada sampel ini)
+    heart_rate   HR/SpO2 jadi (trace tanda vital saja, tanpa red/IR)
+    spo2
+
+disimpan sebagai .npy (dibaca dengan memory map, trace panjang tidak dimuat
+ke RAM) atau .csv dengan header nama kolom. Kolom yang tidak ada dianggap NaN.
+
+    python sensor_trace.py record rekaman.npy --seconds 120
+    python sensor_trace.py synth pasien-demam.npy --hr 118 --spo2 93 --temperature 38.6
+    python sensor_trace.py info rekaman.npy
+"""
+
+import argparse
+import os
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+TRACE_FIELDS = ("t", "red", "ir", "temperature", "heart_rate", "spo2")
+TRACE_DTYPE = np.dtype([(name, np.float64) for name in TRACE_FIELDS])
+
+
+class SensorSample(NamedTuple):
+    """Satu tick sensor; None untuk nilai yang tidak dibaca pada tick ini"""
+    red: Optional[float] = None
+    ir: Optional[float] = None
+    temperature: Optional[float] = None
+    heart_rate: Optional[float] = None
+    spo2: Optional[float] = None
+
+
+def _value(x: float) -> Optional[float]:
+    return None if np.isnan(x) else float(x)
+
+
+def load_trace(path: Union[str, Path]) -> np.ndarray:
+    """
+    Muat trace .npy (memory map) atau .csv menjadi array TRACE_DTYPE
+
+    Raise ValueError jika format/kolom tidak valid
+    """
+    path = Path(path)
+    if path.suffix == ".npy":
+        data = np.load(path, mmap_mode="r")
+    elif path.suffix == ".csv":
+        data = np.genfromtxt(path, delimiter=",", names=True, dtype=np.float64, ndmin=1)
+    else:
+        raise ValueError(f"Format trace tidak dikenal: {path.suffix} (pakai .npy atau .csv)")
+
+    names = data.dtype.names or ()
+    if "t" not in names:
+        raise ValueError(f"Trace {path} tidak punya kolom 't'")
+    if not ({"red", "ir"} <= set(names) or {"heart_rate", "spo2"} <= set(names)):
+        raise ValueError(f"Trace {path} butuh kolom red+ir atau heart_rate+spo2")
+    if len(data) < 2:
+        raise ValueError(f"Trace {path} terlalu pendek ({len(data)} sampel)")
+
+    if data.dtype == TRACE_DTYPE:
+        return data
+    # CSV/trace lama dengan subset kolom: lengkapi dengan NaN
+    trace = np.full(len(data), np.nan, dtype=TRACE_DTYPE)
+    for name in names:
+        if name in TRACE_FIELDS:
+            trace[name] = data[name]
+    return trace
+
+
+def save_trace(path: Union[str, Path], trace: np.ndarray):
+    """Tulis trace ke .npy atau .csv secara atomik (file sementara + rename)"""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    if path.suffix == ".npy":
+        with open(tmp, "wb") as f:
+            np.save(f, np.asarray(trace, dtype=TRACE_DTYPE))
+    elif path.suffix == ".csv":
+        columns = np.column_stack([trace[name] for name in TRACE_FIELDS])
+        np.savetxt(tmp, columns, delimiter=",", header=",".join(TRACE_FIELDS), comments="", fmt="%.6g")
+    else:
+        raise ValueError(f"Format trace tidak dikenal: {path.suffix} (pakai .npy atau .csv)")
+    os.replace(tmp, path)
+
+
+def trace_sample_rate(trace: np.ndarray) -> float:
+    """Sample rate trace (Hz) dari median selisih timestamp"""
+    dt = float(np.median(np.diff(trace["t"])))
+    if not dt > 0:
+        raise ValueError("Timestamp trace harus naik")
+    return 1.0 / dt
+
+
+def synthetic_trace(hr_bpm: float = 75.0, spo2: float = 97.0, temperature: float = 36.8,
+                    seconds: float = 60.0, fs: float = 50.0, temp_interval_s: float = 1.0,
+                    noise: float = 0.002, seed: int = 0) -> np.ndarray:
+    """
+    Trace red/IR sintetis mirip keluaran MAX30102 (denyut + harmonik,
+    baseline wander pernapasan, noise). Amplitudo AC red diatur supaya
+    ratio-of-ratios sesuai SpO2 target (SpO2 = 110 - 25R).
+    """
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    t = np.arange(n) / fs
+    phase = 2 * np.pi * hr_bpm / 60.0 * t
+    pulse = np.sin(phase) + 0.4 * np.sin(2 * phase + 0.8)
+    wander = 0.3 * np.sin(2 * np.pi * 0.25 * t)
+
+    perf_ir = 0.02
+    perf_red = (110.0 - spo2) / 25.0 * perf_ir
+    trace = np.full(n, np.nan, dtype=TRACE_DTYPE)
+    trace["t"] = t
+    trace["ir"] = 80000.0 * (1 + perf_ir * (pulse + wander * 0.2) + noise * rng.standard_normal(n))
+    trace["red"] = 60000.0 * (1 + perf_red * (pulse + wander * 0.2) + noise * rng.standard_normal(n))
+    step = max(1, int(round(temp_interval_s * fs)))
+    trace["temperature"][::step] = temperature + rng.normal(0, 0.05, len(trace[::step]))
+    return trace
+
+
+class ReplaySource:
+    """
+    Sumber sensor yang memutar ulang trace, satu baris per tick sampler
+
+    Sampler berjalan dengan sample rate trace x speed (speed 0 = secepat
+    mungkin) sehingga pipeline bisa diprofil jauh di atas real time.
+    """
+
+    name = "replay"
+    simulated = True
+
+    def __init__(self, path: Union[str, Path], speed: float = 1.0, loop: bool = True):
+        self.path = Path(path)
+        self.speed = max(0.0, speed)
+        self.loop = loop
+        self.trace: Optional[np.ndarray] = None
+        self.sample_rate_hz: Optional[float] = None
+        self.position = 0
+        self.loops = 0
+        self.finished = False
+
+    @property
+    def tick_rate_hz(self) -> Optional[float]:
+        if self.sample_rate_hz is None:
+            return None
+        return self.sample_rate_hz * self.speed if self.speed > 0 else float("inf")
+
+    def check(self):
+        """Muat trace (sekali); raise RuntimeError jika tidak bisa dipakai"""
+        if self.trace is not None:
+            return
+        try:
+            trace = load_trace(self.path)
+            self.sample_rate_hz = trace_sample_rate(trace)
+        except (OSError, ValueError) as e:
+            raise RuntimeError(f"Trace sensor {self.path} tidak bisa dimuat: {e}") from e
+        self.trace = trace
+
+    def read(self) -> SensorSample:
+        if self.position >= len(self.trace):
+            if not self.loop:
+                self.finished = True
+                raise RuntimeError(f"Replay trace {self.path.name} selesai")
+            self.position = 0
+            self.loops += 1
+        row = self.trace[self.position]
+        self.position += 1
+        return SensorSample(*(_value(row[name]) for name in TRACE_FIELDS[1:]))
+
+    def stats(self):
+        return {
+            "path": str(self.path),
+            "speed": self.speed,
+            "loop": self.loop,
+            "sample_rate_hz": self.sample_rate_hz,
+            "samples": len(self.trace) if self.trace is not None else 0,
+            "position": self.position,
+            "loops": self.loops,
+            "finished": self.finished,
+        }
+
+
+class TraceRecorder:
+    """
+    Rekam sampel sensor live ke file trace
+
+    Baris ditampung di array yang tumbuh dua kali lipat (amortized O(1) per
+    sampel) dan ditulis ke disk tiap flush_interval_s detik dan saat close().
+    """
+
+    def __init__(self, path: Union[str, Path], flush_interval_s: float = 30.0, capacity: int = 4096):
+        self.path = Path(path)
+        self.flush_interval = flush_interval_s
+        self._rows = np.full(capacity, np.nan, dtype=TRACE_DTYPE)
+        self._count = 0
+        self._t0: Optional[float] = None
+        self._next_flush = time.monotonic() + flush_interval_s
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, timestamp: float, sample: SensorSample):
+        with self._lock:
+            if self._t0 is None:
+                self._t0 = timestamp
+            if self._count == len(self._rows):
+                grown = np.full(2 * len(self._rows), np.nan, dtype=TRACE_DTYPE)
+                grown[:self._count] = self._rows
+                self._rows = grown
+            self._rows[self._count] = (timestamp - self._t0,) + tuple(
+                np.nan if value is None else value for value in sample)
+            self._count += 1
+        if self.flush_interval > 0 and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows = self._rows[:self._count].copy()
+            self._next_flush = time.monotonic() + self.flush_interval
+        if len(rows):
+            save_trace(self.path, rows)
+
+    def close(self):
+        self.flush()
+
+
+def _cmd_record(args):
+    from sensor_service import SensorSampler, create_source
+
+    source = create_source("hardware")
+    sampler = SensorSampler(source=source, recorder=TraceRecorder(args.output))
+    sampler.start()
+    print(f"Merekam {args.seconds:.0f} detik dari sensor ke {args.output} ...")
+    try:
+        time.sleep(args.seconds)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+    print(f"{len(sampler.recorder)} sampel tersimpan")
+
+
+def _cmd_synth(args):
+    trace = synthetic_trace(hr_bpm=args.hr, spo2=args.spo2, temperature=args.temperature,
+                            seconds=args.seconds, fs=args.fs, seed=args.seed)
+    save_trace(args.output, trace)
+    print(f"{len(trace)} sampel sintetis ({args.fs:g} Hz) tersimpan ke {args.output}")
+
+
+def _cmd_info(args):
+    trace = load_trace(args.trace)
+    fields = [name for name in TRACE_FIELDS[1:] if not np.isnan(trace[name]).all()]
+    print(f"{args.trace}: {len(trace)} sampel, {trace_sample_rate(trace):.1f} Hz, "
+          f"{float(trace['t'][-1] - trace['t'][0]):.1f} detik, kolom: {', '.join(fields)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rekam, buat dan periksa trace sensor")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="rekam sensor hardware ke trace")
+    record.add_argument("output")
+    record.add_argument("--seconds", type=float, default=60.0)
+    record.set_defaults(fn=_cmd_record)
+
+    synth = commands.add_parser("synth", help="buat trace red/IR sintetis")
+    synth.add_argument("output")
+    synth.add_argument("--hr", type=float, default=75.0)
+    synth.add_argument("--spo2", type=float, default=97.0)
+    synth.add_argument("--temperature", type=float, default=36.8)
+    synth.add_argument("--seconds", type=float, default=60.0)
+    synth.add_argument("--fs", type=float, default=50.0)
+    synth.add_argument("--seed", type=int, default=0)
+    synth.set_defaults(fn=_cmd_synth)
+
+    info = commands.add_parser("info", help="ringkasan trace")
+    info.add_argument("trace")
+    info.set_defaults(fn=_cmd_info)
+
+    args = parser.parse_args()
+    args.fn(args)
@@ -0,0 +1,136 @@
+"""
+Serialisasi response cepat dan negosiasi format lewat header Accept.
+
+- JSON (default): orjson jika terpasang, fallback ke json stdlib
+- MessagePack (`application/msgpack`): butuh paket `msgpack`
+- CBOR (`application/cbor`): butuh paket `cbor2`
+
+Format biner hanya ditawarkan jika paketnya terpasang; Accept yang tidak
+bisa dipenuhi tetap dijawab JSON. Isi ketiga format sama persis (dict
+AnalyzeResponse yang sama), hanya encoding-nya yang berbeda.
+"""
+
+import json
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+# Nama lain yang dipakai klien msgpack
+_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+
+
+def _default(value: Any) -> Any:
+    """Tipe non-JSON yang bisa muncul di payload (skalar/array NumPy, Enum)"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Tipe {type(value).__name__} tidak bisa diserialisasi")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps_json(obj: Any) -> bytes:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+
+    loads_json = orjson.loads
+else:
+    def dumps_json(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+                          default=_default).encode("utf-8")
+
+    loads_json = json.loads
+
+
+def _codecs() -> Dict[str, Tuple[Callable[[Any], bytes], Callable[[bytes], Any]]]:
+    codecs = {JSON: (dumps_json, loads_json)}
+    if msgpack is not None:
+        codecs[MSGPACK] = (lambda obj: msgpack.packb(obj, default=_default, use_bin_type=True),
+                           lambda data: msgpack.unpackb(data, raw=False))
+    if cbor2 is not None:
+        codecs[CBOR] = (lambda obj: cbor2.dumps(obj, default=lambda encoder, value: encoder.encode(_default(value))),
+                        cbor2.loads)
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def available_formats() -> List[str]:
+    """Media type yang bisa dihasilkan di instalasi ini (JSON selalu ada)"""
+    return list(CODECS)
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Pilih media type response dari header Accept
+
+    Nilai q dihormati (q=0 berarti ditolak); jika q sama, urutan di header
+    yang menang. Wildcard dan tipe yang tidak tersedia jatuh ke JSON.
+    """
+    if not accept:
+        return JSON
+    best, best_q = JSON, 0.0
+    for part in accept.split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        media_type = _ALIASES.get(media_type.lower(), media_type.lower())
+        q = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in CODECS and q > best_q:
+            best, best_q = media_type, q
+    return best
+
+
+def encode(obj: Any, media_type: str = JSON) -> bytes:
+    return CODECS[media_type][0](obj)
+
+
+def decode(data: bytes, media_type: str = JSON) -> Any:
+    return CODECS[media_type][1](data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse yang di-render dengan orjson (jika ada)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
+def render(payload: Any, accept: Optional[str] = None, status_code: int = 200) -> Response:
+    """Response dalam format yang diminta header Accept"""
+    media_type = negotiate(accept)
+    return Response(content=encode(payload, media_type), status_code=status_code,
+                    media_type=media_type, headers={"Vary": "Accept"})
@@ -0,0 +1,226 @@
+"""
+Pemrosesan sinyal PPG (MAX30102) menjadi Heart Rate dan SpO2.
+
+Semua operasi berupa NumPy tervektorisasi dan inkremental: setiap chunk
+sampel baru hanya memproses chunk tersebut (O(chunk)), bukan seluruh
+riwayat, sehingga bisa berjalan terus di Raspberry Pi berdampingan dengan
+YOLO.
+
+Alur:
+1. Band-pass FIR (high-pass moving-average + low-pass windowed-sinc),
+   difilter streaming dengan menyimpan ekor sampel chunk sebelumnya.
+2. Deteksi puncak pada sinyal IR terfilter -> interval antar denyut -> HR.
+3. Rasio AC/DC red dan IR (ratio-of-ratios) -> SpO2.
+"""
+
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+class PPGEstimate(NamedTuple):
+    """Hasil estimasi tanda vital dari sinyal PPG"""
+    heart_rate: Optional[float]
+    spo2: Optional[float]
+    ratio: Optional[float]
+    finger_detected: bool
+
+
+def design_bandpass(fs: float, low_hz: float = 0.6, high_hz: float = 4.0) -> np.ndarray:
+    """
+    Kernel FIR band-pass untuk sinyal PPG
+
+    High-pass dibuat dari (delta - moving average) untuk membuang DC dan
+    baseline wander, low-pass dari windowed-sinc (Hamming) untuk membuang
+    noise frekuensi tinggi. Keduanya digabung menjadi satu kernel.
+
+    Args:
+        fs: Sample rate (Hz)
+        low_hz: Perkiraan batas bawah pass-band
+        high_hz: Batas atas pass-band
+
+    Returns:
+        Kernel FIR (panjang ganjil)
+    """
+    # High-pass: x - moving_average(x)
+    n_hp = max(3, int(round(fs / low_hz)) | 1)
+    hp = -np.full(n_hp, 1.0 / n_hp)
+    hp[n_hp // 2] += 1.0
+
+    # Low-pass windowed-sinc
+    n_lp = max(3, int(round(fs * 0.5)) | 1)
+    m = np.arange(n_lp) - (n_lp - 1) / 2
+    cutoff = min(high_hz / fs, 0.49)
+    lp = 2 * cutoff * np.sinc(2 * cutoff * m) * np.hamming(n_lp)
+    lp /= lp.sum()
+
+    return np.convolve(hp, lp)
+
+
+class PPGProcessor:
+    """
+    Estimator HR/SpO2 streaming dengan sliding window.
+
+    Panggil update() dengan chunk sampel red/IR baru; estimasi terbaru
+    tersedia lewat estimate().
+    """
+
+    def __init__(self,
+                 fs: float = 50.0,
+                 window_s: float = 8.0,
+                 min_bpm: float = 40.0,
+                 max_bpm: float = 200.0,
+                 finger_threshold: float = 5000.0,
+                 peak_threshold: float = 0.5):
+        """
+        Args:
+            fs: Sample rate sinyal (Hz)
+            window_s: Panjang sliding window untuk estimasi
+            min_bpm: HR minimum yang dianggap valid
+            max_bpm: HR maksimum (juga menentukan jarak minimum antar puncak)
+            finger_threshold: DC IR minimum untuk menganggap jari menempel
+            peak_threshold: Puncak harus > peak_threshold * RMS sinyal terfilter
+        """
+        self.fs = float(fs)
+        self.window = max(int(window_s * fs), 2)
+        self.min_bpm = min_bpm
+        self.max_bpm = max_bpm
+        self.finger_threshold = finger_threshold
+        self.peak_threshold = peak_threshold
+        self.min_peak_distance = int(fs * 60.0 / max_bpm)
+
+        self.kernel = design_bandpass(self.fs)
+        self.reset()
+
+    def reset(self):
+        """Kosongkan state (misal setelah jari dilepas atau sampel terputus)"""
+        taps = len(self.kernel)
+        self._tail: Optional[np.ndarray] = None  # (2, taps - 1) sampel mentah terakhir
+        self._taps = taps
+
+        # Ring window: baris 0/1 = red/IR mentah, 2/3 = kuadrat red/IR terfilter
+        self._ring = np.zeros((4, self.window), dtype=np.float64)
+        self._sums = np.zeros(4, dtype=np.float64)
+        self._n = 0           # total sampel yang sudah diproses
+        self._since_resum = 0
+
+        self._prev_ir = np.zeros(2, dtype=np.float64)  # 2 sampel IR terfilter terakhir
+        self._peaks: deque = deque()                     # (posisi sampel, tinggi) puncak
+
+    def update(self, red: np.ndarray, ir: np.ndarray) -> PPGEstimate:
+        """
+        Proses chunk sampel baru
+
+        Args:
+            red: Sampel red mentah
+            ir: Sampel IR mentah (panjang sama dengan red)
+
+        Returns:
+            Estimasi terbaru
+        """
+        raw = np.vstack((np.asarray(red, dtype=np.float64), np.asarray(ir, dtype=np.float64)))
+        k = raw.shape[1]
+        if k == 0:
+            return self.estimate()
+
+        filtered = self._filter(raw)
+        self._push_window(raw, filtered)
+        self._detect_peaks(filtered[1])
+        self._n += k
+        return self.estimate()
+
+    def _filter(self, raw: np.ndarray) -> np.ndarray:
+        if self._tail is None:
+            # Isi ekor awal dengan sampel pertama supaya tidak ada lonjakan
+            self._tail = np.repeat(raw[:, :1], self._taps - 1, axis=1)
+        extended = np.hstack((self._tail, raw))
+        self._tail = extended[:, -(self._taps - 1):]
+        return np.vstack((
+            np.convolve(extended[0], self.kernel, mode='valid'),
+            np.convolve(extended[1], self.kernel, mode='valid')
+        ))
+
+    def _push_window(self, raw: np.ndarray, filtered: np.ndarray):
+        k = raw.shape[1]
+        if k > self.window:
+            raw = raw[:, -self.window:]
+            filtered = filtered[:, -self.window:]
+            start = self._n + k - self.window
+            k = self.window
+        else:
+            start = self._n
+
+        values = np.vstack((raw, filtered * filtered))
+        idx = np.arange(start, start + k) % self.window
+        self._sums += values.sum(axis=1) - self._ring[:, idx].sum(axis=1)
+        self._ring[:, idx] = values
+
+        # Hitung ulang jumlah sesekali untuk mencegah drift floating point
+        self._since_resum += k
+        if self._since_resum >= self.window:
+            self._sums = self._ring.sum(axis=1)
+            self._since_resum = 0
+
+    def _detect_peaks(self, ir_filtered: np.ndarray):
+        count = min(self._n, self.window)
+        rms = np.sqrt(self._sums[3] / count) if count else 0.0
+
+        x = np.concatenate((self._prev_ir, ir_filtered))
+        # Kandidat puncak: maksimum lokal di atas ambang (x[1:-1] tervektorisasi)
+        mid = x[1:-1]
+        mask = (mid > x[:-2]) & (mid >= x[2:]) & (mid > self.peak_threshold * rms)
+        j = np.flatnonzero(mask) + 1
+        heights = x[j]
+
+        # Interpolasi parabola untuk posisi puncak sub-sampel
+        left, right = x[j - 1], x[j + 1]
+        denom = left - 2 * heights + right
+        offset = np.divide(0.5 * (left - right), denom, out=np.zeros_like(denom), where=denom != 0)
+
+        # Index absolut: x[j] adalah sampel ke (self._n - 2 + j)
+        candidates = j + offset + self._n - 2
+
+        # Jarak minimum antar puncak: kandidat per chunk hanya beberapa
+        for pos, height in zip(candidates.tolist(), heights.tolist()):
+            if self._peaks and pos - self._peaks[-1][0] < self.min_peak_distance:
+                if height > self._peaks[-1][1]:
+                    self._peaks[-1] = (pos, height)
+                continue
+            self._peaks.append((pos, height))
+
+        oldest = self._n + len(ir_filtered) - self.window
+        while self._peaks and self._peaks[0][0] < oldest:
+            self._peaks.popleft()
+
+        self._prev_ir = x[-2:].copy()
+
+    def estimate(self) -> PPGEstimate:
+        """Estimasi HR/SpO2 dari window saat ini"""
+        count = min(self._n, self.window)
+        if count < self.window // 2:
+            return PPGEstimate(None, None, None, False)
+
+        dc_red, dc_ir = self._sums[0] / count, self._sums[1] / count
+        finger = dc_ir >= self.finger_threshold and dc_red > 0
+        if not finger:
+            return PPGEstimate(None, None, None, False)
+
+        # Heart rate dari median interval antar puncak
+        heart_rate = None
+        if len(self._peaks) >= 3:
+            positions = np.fromiter((p for p, _ in self._peaks), dtype=np.float64, count=len(self._peaks))
+            bpm = 60.0 * self.fs / np.median(np.diff(positions))
+            if self.min_bpm <= bpm <= self.max_bpm:
+                heart_rate = float(bpm)
+
+        # SpO2 dari ratio-of-ratios (AC = RMS terfilter, DC = rata-rata mentah)
+        ac_red = np.sqrt(self._sums[2] / count)
+        ac_ir = np.sqrt(self._sums[3] / count)
+        spo2 = ratio = None
+        if ac_ir > 0:
+            ratio = float((ac_red / dc_red) / (ac_ir / dc_ir))
+            # Kurva kalibrasi empiris umum untuk MAX3010x
+            spo2 = float(np.clip(110.0 - 25.0 * ratio, 0.0, 100.0))
+
+        return PPGEstimate(heart_rate, spo2, ratio, True)
@@ -0,0 +1,191 @@
+"""
+Registry station (bed) untuk beberapa pasien per Raspberry Pi.
+
+Setiap station punya set sensor sendiri (bus I2C / kanal mux / trace
+replay), sampler sendiri, kamera opsional dan ID pasien default. Sampler
+station di bus yang sama berbagi lock bus (sensor_service.bus_lock) sehingga
+pembacaan tidak saling merusak, sementara station di bus berbeda berjalan
+paralel. Request tetap hanya membaca snapshot sampler station tersebut.
+
+Format file (TRIAGE_STATIONS_PATH, lihat stations.example.json):
+
+    {
+      "stations": [
+        {"id": "bed-1", "patient_id": "P-001", "camera": 0,
+         "sensor": {"backend": "hardware", "bus": 1, "mux_address": "0x70", "mux_channel": 0}},
+        {"id": "demo", "sensor": {"backend": "replay", "path": "traces/demo.npy", "speed": 1.0}}
+      ]
+    }
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Union
+
+import config
+from sensor_service import HardwareSource, SensorSampler
+from sensor_trace import ReplaySource
+
+logger = logging.getLogger(__name__)
+
+
+def _address(value: Union[int, str, None]) -> Optional[int]:
+    if value is None:
+        return None
+    return int(value, 0) if isinstance(value, str) else int(value)
+
+
+def make_source(spec: Dict[str, Any], base_dir: Path = Path(".")):
+    """Sumber sensor dari konfigurasi `sensor` satu station"""
+    backend = spec.get("backend", "hardware")
+    if backend == "hardware":
+        mux_address = _address(spec.get("mux_address"))
+        mux_channel = spec.get("mux_channel")
+        if (mux_address is None) != (mux_channel is None):
+            raise ValueError("mux_address dan mux_channel harus diisi bersama")
+        if mux_channel is not None and not 0 <= int(mux_channel) <= 7:
+            raise ValueError(f"mux_channel harus 0-7, didapat {mux_channel}")
+        return HardwareSource(
+            temp_interval_s=config.SENSOR_TEMP_INTERVAL_S,
+            bus=int(spec.get("bus", 1)),
+            mlx_address=_address(spec.get("mlx_address", 0x5A)),
+            max_address=_address(spec.get("max_address", 0x57)),
+            mux_address=mux_address,
+            mux_channel=None if mux_channel is None else int(mux_channel),
+        )
+    if backend == "replay":
+        path = Path(spec["path"])
+        return ReplaySource(path if path.is_absolute() else base_dir / path,
+                            speed=float(spec.get("speed", 1.0)), loop=bool(spec.get("loop", True)))
+    raise ValueError(f"Backend sensor tidak dikenal: {backend} (pilihan: hardware, replay)")
+
+
+class Station:
+    """Satu bed: sampler sensor sendiri, kamera opsional, pasien default"""
+
+    def __init__(self, station_id: str, sampler: SensorSampler,
+                 camera: Union[int, str, None] = None, patient_id: Optional[str] = None):
+        self.id = station_id
+        self.sampler = sampler
+        self.camera = camera
+        self.patient_id = patient_id
+
+    def read_sensor(self) -> Dict[str, Any]:
+        """Snapshot sensor station (raise RuntimeError jika sensor gagal)"""
+        # Sampler dimulai oleh StationRegistry.start() saat startup
+        return self.sampler.snapshot(wait_s=config.SENSOR_STARTUP_WAIT_S)
+
+    def stats(self) -> Dict[str, Any]:
+        source = self.sampler.source
+        return {
+            "patient_id": self.patient_id,
+            "camera": self.camera,
+            "sensor": {
+                "backend": source.name,
+                "bus": getattr(source, "bus", None),
+                "mux_channel": getattr(source, "mux_channel", None),
+                "running": self.sampler.running,
+                "error_count": self.sampler.error_count,
+                "last_error": self.sampler.last_error,
+            },
+        }
+
+
+def parse_stations(spec: Dict[str, Any], base_dir: Path = Path(".")) -> List[Station]:
+    """Bangun daftar Station dari isi file konfigurasi (raise ValueError jika tidak valid)"""
+    stations: List[Station] = []
+    seen = set()
+    try:
+        for item in spec["stations"]:
+            station_id = str(item["id"])
+            if station_id in seen:
+                raise ValueError(f"ID station '{station_id}' duplikat")
+            seen.add(station_id)
+            sampler = SensorSampler(
+                source=make_source(item.get("sensor", {}), base_dir),
+                ppg_rate_hz=config.SENSOR_PPG_RATE_HZ,
+                temp_interval_s=config.SENSOR_TEMP_INTERVAL_S,
+                buffer_seconds=config.SENSOR_BUFFER_SECONDS,
+                ppg_chunk=config.SENSOR_PPG_CHUNK
+            )
+            stations.append(Station(station_id, sampler, camera=item.get("camera"),
+                                    patient_id=item.get("patient_id")))
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Konfigurasi station tidak valid: {e!r}")
+
+    # Dua station tidak boleh membaca sensor fisik yang sama
+    devices = {}
+    for station in stations:
+        source = station.sampler.source
+        if isinstance(source, HardwareSource):
+            key = (source.bus, source.mux_address, source.mux_channel, source.max_address)
+            if key in devices:
+                raise ValueError(f"Station '{station.id}' dan '{devices[key]}' memakai sensor yang sama")
+            devices[key] = station.id
+    return stations
+
+
+class StationRegistry:
+    """Semua station yang dikonfigurasi; kosong berarti mode satu station"""
+
+    def __init__(self):
+        self.stations: Dict[str, Station] = {}
+
+    def __len__(self) -> int:
+        return len(self.stations)
+
+    def load(self, path: Union[str, Path]) -> int:
+        """Muat file konfigurasi station, return jumlah station"""
+        path = Path(path)
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+        self.stations = {station.id: station for station in parse_stations(spec, base_dir=path.parent)}
+        return len(self.stations)
+
+    def start(self, capture_manager=None):
+        """Mulai sampler tiap station dan kamera (lewat capture_manager)"""
+        for station in self.stations.values():
+            try:
+                station.sampler.start()
+            except RuntimeError as e:
+                logger.warning("Sensor station %s tidak berjalan: %s", station.id, e)
+            if station.camera is not None and capture_manager is not None:
+                capture_manager.add(station.id, station.camera)
+
+    def stop(self):
+        for station in self.stations.values():
+            station.sampler.stop()
+
+    def ids(self) -> Set[str]:
+        return set(self.stations)
+
+    def get(self, station_id: Optional[str]) -> Optional[Station]:
+        return self.stations.get(station_id) if station_id is not None else None
+
+    def sensor_reader(self, station_id: Optional[str], default: Callable[[], Dict[str, Any]]):
+        """
+        Fungsi pembaca sensor untuk station_id
+
+        Tanpa station terkonfigurasi semua request memakai sensor default.
+        Jika ada station, station_id harus terdaftar (KeyError jika tidak)
+        supaya data satu bed tidak pernah tertukar dengan bed lain; request
+        tanpa station_id tetap memakai sensor default.
+        """
+        if not self.stations or station_id is None:
+            return default
+        station = self.stations.get(station_id)
+        if station is None:
+            raise KeyError(station_id)
+        return station.read_sensor
+
+    def stats(self) -> Dict[str, Any]:
+        return {station_id: station.stats() for station_id, station in self.stations.items()}
+
+
+# Global registry, dimuat dari TRIAGE_STATIONS_PATH saat startup server
+station_registry = StationRegistry()
+
+STATIONS_PATH = Path(config.STATIONS_PATH)
+if not STATIONS_PATH.is_absolute():
+    STATIONS_PATH = Path(__file__).resolve().parent / STATIONS_PATH
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test micro-batching InferenceBatcher: penggabungan frame, flush setelah
+max_wait, satu forward pass per ukuran input dan error ke semua pemanggil
+"""
+import threading
+import time
+from concurrent.futures import wait
+
+import numpy as np
+import pytest
+
+from yolo_inference import InferenceBatcher
+
+
+class StubModel:
+    """Model palsu: menghitung forward pass, hasil = (index frame, shape)"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.passes = []
+        self.lock = threading.Lock()
+
+    def __call__(self, images):
+        with self.lock:
+            self.passes.append([image.shape for image in images])
+        if self.error is not None:
+            raise self.error
+        return [(int(image[0, 0, 0]), image.shape) for image in images]
+
+
+def frame(index: int, size: int = 32) -> np.ndarray:
+    return np.full((size, size, 3), index, np.uint8)
+
+
+def test_full_batch_is_one_forward_pass():
+    model = StubModel()
+    batcher = InferenceBatcher(model, max_batch_size=4, max_wait_ms=2000)
+    try:
+        start = time.perf_counter()
+        futures = [batcher.submit(frame(i)) for i in range(4)]
+        wait(futures, timeout=5)
+        # Batch penuh langsung dijalankan, tanpa menunggu max_wait
+        assert time.perf_counter() - start < 1.0
+        assert [future.result() for future in futures] == [((i, (32, 32, 3)), 4) for i in range(4)]
+        assert len(model.passes) == 1
+        stats = batcher.stats()
+        assert (stats["batches"], stats["frames"], stats["max_batch_seen"]) == (1, 4, 4)
+    finally:
+        batcher.close()
+
+
+def test_partial_batch_flushes_after_max_wait():
+    model = StubModel()
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait_ms=100)
+    try:
+        start = time.perf_counter()
+        futures = [batcher.submit(frame(i)) for i in range(3)]
+        wait(futures, timeout=5)
+        elapsed = time.perf_counter() - start
+        assert 0.09 <= elapsed < 1.0
+        assert [batch_size for _, batch_size in (future.result() for future in futures)] == [3, 3, 3]
+        assert len(model.passes) == 1
+
+        # Frame berikutnya membentuk batch baru
+        assert batcher.submit(frame(7)).result(5) == ((7, (32, 32, 3)), 1)
+        assert len(model.passes) == 2
+    finally:
+        batcher.close()
+
+
+def test_one_forward_pass_per_input_shape():
+    model = StubModel()
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait_ms=200)
+    try:
+        sizes = (32, 16, 32, 16, 32, 24)
+        futures = [batcher.submit(frame(i, size)) for i, size in enumerate(sizes)]
+        wait(futures, timeout=5)
+        # Urutan hasil tetap mengikuti frame masing-masing pemanggil
+        results = [future.result() for future in futures]
+        assert [result[0] for result, _ in results] == list(range(len(sizes)))
+        assert [batch_size for _, batch_size in results] == [3, 2, 3, 2, 3, 1]
+        assert sorted(len(shapes) for shapes in model.passes) == [1, 2, 3]
+        assert all(len(set(shapes)) == 1 for shapes in model.passes)
+    finally:
+        batcher.close()
+
+
+def test_model_error_reaches_every_waiter():
+    model = StubModel(error=RuntimeError("GPU out of memory"))
+    batcher = InferenceBatcher(model, max_batch_size=4, max_wait_ms=100)
+    try:
+        futures = [batcher.submit(frame(i)) for i in range(3)]
+        wait(futures, timeout=5)
+        for future in futures:
+            with pytest.raises(RuntimeError, match="GPU out of memory"):
+                future.result()
+        assert len(model.passes) == 1
+
+        # Worker tetap hidup setelah error
+        model.error = None
+        assert batcher.submit(frame(5)).result(5) == ((5, (32, 32, 3)), 1)
+    finally:
+        batcher.close()
+
+
+def test_cancelled_frames_are_skipped_and_close_drains_queue():
+    model = StubModel()
+    batcher = InferenceBatcher(model, max_batch_size=8, max_wait_ms=200)
+    futures = [batcher.submit(frame(i)) for i in range(3)]
+    assert futures[1].cancel()
+    batcher.close()
+    assert futures[0].result(1)[0][0] == 0 and futures[2].result(1)[0][0] == 2
+    assert model.passes == [[(32, 32, 3)] * 2]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test benchmark.py: run kecil in-process menghasilkan JSON yang bisa dibandingkan
+"""
+import json
+
+import main
+import benchmark
+from yolo_inference import yolo_analyzer
+
+
+def test_small_run_writes_comparable_json(tmp_path):
+    output = tmp_path / "run.json"
+    argv = ["--concurrency", "1,4", "--requests", "8", "--warmup", "1", "--image-size", "320x240",
+            "--image-pool", "2", "--fake-base-ms", "1", "--micro-repeat", "3", "--batch-records", "50",
+            "--output", str(output)]
+    sensor_before, model_before = main.get_sensor_data, yolo_analyzer.model
+    results = benchmark.main_cli(argv)
+
+    saved = json.loads(output.read_text(encoding="utf-8"))
+    assert saved == json.loads(json.dumps(results))
+    assert saved["settings"]["backend"] == "fake"
+    assert {(r["mode"], r["concurrency"]) for r in saved["load"]} == \
+        {(mode, c) for mode in benchmark.MODES for c in (1, 4)}
+    for result in saved["load"]:
+        assert result["status"] == {"200": 8}
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"] <= result["max_ms"]
+    assert saved["batching"]["frames"] >= 32
+    assert {"base64_decode", "decode_reduced", "evaluate_vitals", "triage_batch_50"} <= \
+        {m["name"] for m in saved["micro"]}
+
+    # State app dikembalikan setelah benchmark
+    assert main.get_sensor_data is sensor_before
+    assert yolo_analyzer.model is model_before
+
+    # Run kedua (subset mode) bisa dibandingkan dengan run pertama
+    benchmark.main_cli(argv[:-2] + ["--modes", "sensor", "--no-micro", "--output", str(tmp_path / "b.json"),
+                                    "--compare", str(output)])
+
+
+def test_synthetic_frames_differ():
+    first, second = benchmark.synthetic_jpeg(160, 120, 0), benchmark.synthetic_jpeg(160, 120, 1)
+    assert first[:2] == b"\xff\xd8" and first != second
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as tmp:
+        test_small_run_writes_comparable_json(Path(tmp))
+    print("✅ test_small_run_writes_comparable_json")
+    test_synthetic_frames_differ()
+    print("✅ test_synthetic_frames_differ")
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test capture lokal: parsing sumber, frame dropping, pipeline file video -> analyzer
+lewat antrian vision dengan prioritas di bawah request
+"""
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from fastapi.testclient import TestClient
+
+import main
+from capture import CaptureManager, LatestFrame, parse_sources
+from test_result_cache import make_analyzer
+from vision_scheduler import VisionScheduler
+
+
+def write_video(path: Path, frames: int = 30, fps: float = 30.0) -> Path:
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), fps, (320, 240))
+    assert writer.isOpened()
+    for i in range(frames):
+        frame = np.full((240, 320, 3), 60, dtype=np.uint8)
+        cv2.rectangle(frame, (10 + 5 * i, 60), (90 + 5 * i, 200), (230, 230, 230), -1)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def wait_until(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_parse_sources():
+    assert parse_sources("bed-1=0, demo=videos/a.mp4") == {"bed-1": 0, "demo": "videos/a.mp4"}
+    assert parse_sources("1,rtsp://kamera/stream") == {"cam0": 1, "cam1": "rtsp://kamera/stream"}
+    assert parse_sources("") == {}
+
+
+def test_latest_frame_keeps_only_newest():
+    slot = LatestFrame()
+    for i in range(5):
+        slot.put(np.full((2, 2), i, np.uint8), float(i))
+    seq, frame, captured_at = slot.get(after_seq=0, timeout=0)
+    assert (seq, int(frame[0, 0]), captured_at) == (5, 4, 4.0)
+    assert slot.dropped == 4
+    assert slot.get(after_seq=seq, timeout=0.01) is None
+
+
+def test_video_file_is_analyzed_without_backlog(tmp_path):
+    analyzer, backend = make_analyzer(tmp_path)
+    video = write_video(tmp_path / "pasien.avi")
+
+    # Backend lambat: producer harus membuang frame, bukan menumpuknya
+    predict = backend.predict
+    backend.predict = lambda images: (time.sleep(0.1), predict(images))[1]
+
+    manager = CaptureManager(analyzer, loop_video=True)
+    try:
+        source = manager.add("bed-1", str(video))
+        assert wait_until(lambda: source.frames_analyzed >= 2 and source.slot.dropped > 0)
+        result, captured_at, analyzed_at = source.latest()
+        assert result['detections'][0]['class'] == 'distress_signs'
+        assert analyzed_at >= captured_at
+        stats = source.stats()
+        assert stats['opened'] and stats['frame_shape'] == [240, 320, 3]
+        assert stats['frames_read'] >= stats['frames_analyzed'] + stats['frames_dropped'] - 1
+    finally:
+        manager.stop()
+        analyzer.batcher.close()
+
+
+def test_capture_frames_yield_to_requests(tmp_path):
+    analyzer, _ = make_analyzer(tmp_path)
+    scheduler = VisionScheduler(workers=1, capacity=1)
+    release = threading.Event()
+    # Satu-satunya worker sibuk dengan request
+    busy = scheduler.submit(release.wait, 5, priority=0, label="LOW")
+    manager = CaptureManager(analyzer, scheduler=scheduler)
+    try:
+        source = manager.add("bed-1", str(write_video(tmp_path / "pasien.avi")))
+        assert wait_until(lambda: scheduler.stats()["depth_by_risk"].get("CAPTURE") == 1)
+
+        # Request LOW baru menggusur frame capture yang antri, bukan sebaliknya
+        request = scheduler.submit(lambda: "request", priority=0, label="LOW")
+        assert wait_until(lambda: source.frames_rejected >= 1)
+        assert scheduler.stats()["depth_by_risk"] == {"LOW": 1}
+        release.set()
+        assert busy.result(5) and request.result(5) == "request"
+
+        # Antrian kosong lagi: frame capture dianalisis
+        assert wait_until(lambda: source.frames_analyzed > 0)
+        assert source.stats()["frames_rejected"] >= 1
+    finally:
+        release.set()
+        manager.stop()
+        scheduler.close()
+        analyzer.batcher.close()
+
+
+def test_capture_endpoints(tmp_path, monkeypatch):
+    analyzer, _ = make_analyzer(tmp_path)
+    manager = CaptureManager(analyzer)
+    monkeypatch.setattr(main, "capture_manager", manager)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: {
+        "temperature": 36.8, "spo2": 98, "heartRate": 75,
+        "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+    })
+    client = TestClient(main.app)
+    try:
+        assert client.get("/capture/tidak-ada").status_code == 404
+
+        source = manager.add("bed-1", str(write_video(tmp_path / "pasien.avi")))
+        assert wait_until(lambda: source.frames_analyzed > 0)
+        body = client.get("/capture/bed-1").json()
+        assert body["source"] == "bed-1"
+        assert body["triage"]["healthData"]["analysis_method"] == "sensor hardware + vision"
+        assert "bed-1" in client.get("/capture").json()["sources"]
+    finally:
+        manager.stop()
+        analyzer.batcher.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import pytest
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name == "test_capture_endpoints":
+                    fn(Path(tmp), mp)
+                elif name in ("test_video_file_is_analyzed_without_backlog", "test_capture_frames_yield_to_requests"):
+                    fn(Path(tmp))
+                else:
+                    fn()
+            print(f"✅ {name}")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Test degradasi vision berbasis deadline: pemilihan tier, model per tier,
+batch per ukuran input dan anggaran latensi di endpoint
+"""
+import threading
+import time
+from concurrent.futures import wait
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from degradation import TIER_FULL, TIER_REDUCED, TIER_SENSOR, TIER_SMALL, TierPlanner
+from metrics import VISION_FALLBACKS, VISION_TIER
+from test_result_cache import CountingBackend, jpeg_bytes, make_analyzer
+from vision_scheduler import VisionScheduler
+from yolo_inference import InferenceBatcher
+
+ALL_TIERS = [TIER_FULL, TIER_REDUCED, TIER_SMALL]
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+
+
+def test_planner_picks_most_accurate_tier_that_fits():
+    planner = TierPlanner(stale_s=0)
+    # Belum terukur: tier full dicoba
+    assert planner.choose(0.1, 0.0, ALL_TIERS) == TIER_FULL
+    planner.observe(TIER_FULL, 0.30)
+    planner.observe(TIER_REDUCED, 0.08)
+    planner.observe(TIER_SMALL, 0.03)
+    assert planner.choose(0.5, 0.0, ALL_TIERS) == TIER_FULL
+    assert planner.choose(0.1, 0.0, ALL_TIERS) == TIER_REDUCED
+    # Waktu antri ikut dihitung
+    assert planner.choose(0.1, 0.05, ALL_TIERS) == TIER_SMALL
+    assert planner.choose(0.1, 0.05, [TIER_FULL, TIER_REDUCED]) == TIER_SENSOR
+    assert planner.choose(0.02, 0.0, ALL_TIERS) == TIER_SENSOR
+    assert planner.stats()["chosen"] == {TIER_FULL: 2, TIER_REDUCED: 1, TIER_SMALL: 1, TIER_SENSOR: 2}
+
+    # EWMA: satu pengukuran cepat tidak langsung menghapus riwayat lambat
+    planner.observe(TIER_FULL, 0.10)
+    assert planner.estimate_s(TIER_FULL) == pytest.approx(0.26)
+
+
+def test_stale_estimate_is_forgotten(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("degradation.time.monotonic", lambda: now[0])
+    planner = TierPlanner(stale_s=30)
+    planner.observe(TIER_FULL, 2.0)
+    assert planner.choose(0.5, 0.0, ALL_TIERS) == TIER_REDUCED
+    now[0] += 31
+    assert planner.estimate_s(TIER_FULL) is None
+    assert planner.choose(0.5, 0.0, ALL_TIERS) == TIER_FULL
+
+
+def test_measure_skips_cache_hits_and_fallbacks():
+    planner = TierPlanner()
+    planner.measure(TIER_REDUCED, lambda image, station, tier: {"tier": tier}, b"x", None)
+    assert planner.estimate_s(TIER_REDUCED) is not None
+    planner.measure(TIER_SMALL, lambda image, station, tier: {"tier": tier, "cache_hit": True}, b"x", None)
+    planner.measure(TIER_SMALL, lambda image, station, tier: {"tier": TIER_FULL}, b"x", None)
+    assert planner.estimate_s(TIER_SMALL) is None
+    # Tier full: fungsi dipanggil tanpa argumen tier
+    assert planner.measure(TIER_FULL, lambda image, station=None: {"tier": TIER_FULL}, b"x") == {"tier": TIER_FULL}
+
+
+def test_analyzer_runs_each_tier_on_its_model(tmp_path, monkeypatch):
+    monkeypatch.setattr("config.REDUCED_IMGSZ", 160)
+    analyzer, backend = make_analyzer(tmp_path)
+    small = CountingBackend(tmp_path / "small.onnx", imgsz=256)
+    try:
+        assert analyzer.tiers() == [TIER_FULL, TIER_REDUCED]
+        data = jpeg_bytes()
+        reduced = analyzer.analyze_image_bytes(data, None, TIER_REDUCED)
+        assert reduced["tier"] == TIER_REDUCED and backend.sizes == [160]
+        # Cache per tier: hasil full bukan hasil reduced
+        assert not analyzer.analyze_image_bytes(data)["cache_hit"]
+        assert backend.sizes == [160, 320]
+        assert analyzer.analyze_image_bytes(data, None, TIER_REDUCED)["cache_hit"]
+
+        # Model kecil belum dimuat: tier small dilayani tier full
+        assert analyzer.analyze_image_bytes(jpeg_bytes(1), None, TIER_SMALL)["tier"] == TIER_FULL
+        analyzer.small_model, analyzer.small_fingerprint = small, "small"
+        assert analyzer.tiers() == ALL_TIERS
+        assert analyzer.analyze_image_bytes(jpeg_bytes(2), None, TIER_SMALL)["tier"] == TIER_SMALL
+        assert small.frames == 1 and backend.frames == 3
+
+        # Model berinput tetap tidak punya tier reduced
+        backend.dynamic_imgsz = False
+        assert analyzer.tiers() == [TIER_FULL, TIER_SMALL]
+        assert analyzer.analyze_image_bytes(jpeg_bytes(3), None, TIER_REDUCED)["tier"] == TIER_FULL
+    finally:
+        analyzer.batcher.close()
+        analyzer.small_batcher.close()
+
+
+def test_batcher_groups_frames_by_input_size():
+    shapes = []
+    batcher = InferenceBatcher(lambda images: [shapes.append({image.shape for image in images}) or image.shape
+                                               for image in images], max_batch_size=8, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(np.zeros((size, size, 3), np.uint8)) for size in (320, 160, 320, 160, 320)]
+        wait(futures, timeout=5)
+        results = [future.result() for future in futures]
+        assert [result[0][0] for result in results] == [320, 160, 320, 160, 320]
+        assert [batch_size for _, batch_size in results] == [3, 2, 3, 2, 3]
+        assert all(len(group) == 1 for group in shapes)
+        assert batcher.stats()["batches"] == 2
+    finally:
+        batcher.close()
+
+
+def test_latency_budget_selects_tier_and_bounds_wait(monkeypatch):
+    planner = TierPlanner(stale_s=0)
+    scheduler = VisionScheduler(workers=2, capacity=8)
+    monkeypatch.setattr(main, "tier_planner", planner)
+    monkeypatch.setattr(main, "vision_scheduler", scheduler)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "_vision_tiers", lambda: ALL_TIERS)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    calls = []
+    release = threading.Event()
+
+    def fake_vision(image, station_id, tier=TIER_FULL):
+        calls.append(tier)
+        if tier == TIER_FULL:
+            release.wait(5)
+        return {"overall_analysis": None, "tier": tier}
+
+    monkeypatch.setattr(main, "analyze_health_image_bytes", fake_vision)
+    client = TestClient(main.app)
+
+    def post(budget_ms=None):
+        headers = {"content-type": "application/octet-stream"}
+        if budget_ms is not None:
+            headers["x-latency-budget-ms"] = str(budget_ms)
+        return client.post("/analyze/image", content=jpeg_bytes(), headers=headers)
+
+    try:
+        # Full belum terukur: dicoba, tapi anggaran habis -> sensor saja
+        deadline_before = VISION_FALLBACKS.value(reason="deadline")
+        start = time.perf_counter()
+        response = post(150)
+        assert time.perf_counter() - start < 2
+        method = response.json()["healthData"]["analysis_method"]
+        assert method == "sensor hardware only (vision skipped: latency budget)"
+        assert response.headers["x-vision-tier"] == TIER_SENSOR
+        assert VISION_FALLBACKS.value(reason="deadline") == deadline_before + 1
+        release.set()
+
+        # Full terukur lambat: reduced dipakai
+        planner.observe(TIER_FULL, 1.0)
+        planner.observe(TIER_REDUCED, 0.01)
+        reduced_before = VISION_TIER.value(tier=TIER_REDUCED)
+        response = post(200)
+        assert response.json()["healthData"]["analysis_method"] == "sensor hardware + vision (reduced resolution)"
+        assert response.headers["x-vision-tier"] == TIER_REDUCED
+        assert VISION_TIER.value(tier=TIER_REDUCED) == reduced_before + 1
+
+        # Tidak ada tier yang muat: YOLO tidak dijalankan sama sekali
+        planner.observe(TIER_SMALL, 0.5)
+        calls.clear()
+        assert post(5).headers["x-vision-tier"] == TIER_SENSOR
+        assert calls == []
+
+        # Tanpa anggaran: tier full seperti biasa
+        response = post()
+        assert response.json()["healthData"]["analysis_method"] == "sensor hardware + vision"
+        assert calls == [TIER_FULL]
+
+        assert post("cepat").status_code == 422
+        stats = client.get("/inference/stats").json()["degradation"]
+        assert stats["estimate_ms"][TIER_REDUCED] is not None and stats["chosen"][TIER_SENSOR] == 1
+    finally:
+        release.set()
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name == "test_analyzer_runs_each_tier_on_its_model":
+                    fn(Path(tmp), mp)
+                elif name in ("test_stale_estimate_is_forgotten", "test_latency_budget_selects_tier_and_bounds_wait"):
+                    fn(mp)
+                else:
+                    fn()
+            print(f"✅ {name}")
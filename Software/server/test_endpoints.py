@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Test endpoint analisis: /analyze paralel (event loop tidak terblokir) dan
+/analyze/image dengan body mentah, multipart dan byte yang bukan gambar,
+serta /health/ready sebelum dan sesudah model selesai dimuat
+"""
+import asyncio
+import threading
+import time
+
+import cv2
+import httpx
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from test_result_cache import CountingBackend
+from vision_scheduler import VisionScheduler
+from yolo_inference import YOLOHealthAnalyzer
+
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+VISION_SECONDS = 0.3
+
+
+def test_concurrent_analyze_requests_overlap(monkeypatch):
+    scheduler = VisionScheduler(workers=4, capacity=8)
+    monkeypatch.setattr(main, "vision_scheduler", scheduler)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    threads = set()
+
+    def slow_vision(image_data, station_id=None):
+        threads.add(threading.get_ident())
+        time.sleep(VISION_SECONDS)
+        return {"overall_analysis": None}
+
+    monkeypatch.setattr(main, "analyze_health_image", slow_vision)
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            start = time.perf_counter()
+            body = {"imageData": "data:image/jpeg;base64,AAAA"}
+            requests = [asyncio.create_task(client.post("/analyze", json=body)) for _ in range(4)]
+            # Selama YOLO berjalan di thread vision, endpoint lain tetap dilayani
+            await asyncio.sleep(VISION_SECONDS / 3)
+            root = await client.get("/")
+            root_elapsed = time.perf_counter() - start
+            responses = await asyncio.gather(*requests)
+            return responses, root, root_elapsed, time.perf_counter() - start
+
+    try:
+        responses, root, root_elapsed, elapsed = asyncio.run(run())
+    finally:
+        scheduler.close()
+
+    assert all(response.status_code == 200 for response in responses)
+    assert all(response.json()["healthData"]["analysis_method"] == "sensor hardware + vision"
+               for response in responses)
+    assert root.status_code == 200 and root_elapsed < VISION_SECONDS
+    # Empat request selesai jauh lebih cepat dari 4x waktu vision berurutan
+    assert elapsed < 3 * VISION_SECONDS
+    assert len(threads) == 4
+
+
+def test_analyze_image_accepts_raw_and_multipart_bodies(monkeypatch):
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    frames = []
+    monkeypatch.setattr(main, "analyze_health_image_bytes",
+                        lambda image, station_id: frames.append((bytes(image), station_id)) or {"overall_analysis": None})
+    client = TestClient(main.app)
+    jpeg = cv2.imencode('.jpg', np.full((64, 64, 3), 90, np.uint8))[1].tobytes()
+    png = cv2.imencode('.png', np.full((64, 64, 3), 90, np.uint8))[1].tobytes()
+
+    response = client.post("/analyze/image?station=bed-1", content=jpeg,
+                           headers={"content-type": "application/octet-stream"})
+    assert response.status_code == 200
+    assert response.json()["healthData"]["analysis_method"] == "sensor hardware + vision"
+    response = client.post("/analyze/image", files={"image": ("frame.png", png, "image/png")})
+    assert response.status_code == 200
+    assert frames == [(jpeg, "bed-1"), (png, None)]
+
+
+def test_analyze_image_rejects_bad_bytes(monkeypatch):
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    frames = []
+    monkeypatch.setattr(main, "analyze_health_image_bytes",
+                        lambda image, station_id: frames.append(image) or {"overall_analysis": None})
+    client = TestClient(main.app)
+    headers = {"content-type": "application/octet-stream"}
+
+    response = client.post("/analyze/image", content=b"bukan gambar", headers=headers)
+    assert response.status_code == 400 and "JPEG/PNG" in response.json()["detail"]
+    assert client.post("/analyze/image", content=b"\xff\xd8\xff", headers=headers).status_code == 400
+    assert client.post("/analyze/image", content=b"", headers=headers).status_code == 400
+    assert client.post("/analyze/image", files={"file": ("x.bin", b"\x00" * 32)}).status_code == 400
+    assert client.post("/analyze/image", files={"other": ("x.jpg", b"\x00")}).status_code == 400
+    # Byte yang ditolak tidak pernah masuk antrian vision
+    assert frames == []
+
+
+class GatedBackend(CountingBackend):
+    """Backend palsu yang load()-nya ditahan sampai gate.set()"""
+
+    requires = ()
+    gate = threading.Event()
+
+    def __init__(self, model_path, conf=0.3, iou=0.5, imgsz=320):
+        super().__init__(model_path, imgsz)
+
+    @classmethod
+    def available(cls):
+        return True
+
+    def load(self):
+        assert self.gate.wait(5)
+
+
+def test_readiness_follows_model_load(tmp_path, monkeypatch):
+    (tmp_path / "model.onnx").write_bytes(b"v1")
+    analyzer = YOLOHealthAnalyzer(str(tmp_path / "model.pt"), backend="onnxruntime")
+    monkeypatch.setattr(main, "yolo_analyzer", analyzer)
+    monkeypatch.setattr("config.EXPORTED_MODEL_PATH", "")
+    monkeypatch.setattr("config.SMALL_MODEL_PATH", "")
+    monkeypatch.setattr("yolo_inference.get_backend_class", lambda name: GatedBackend)
+    GatedBackend.gate.clear()
+    client = TestClient(main.app)
+    try:
+        # Sebelum load dimulai dan selama model dimuat: belum siap
+        response = client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json()["status"] == "loading" and response.json()["model_state"] == "pending"
+        analyzer.start_background_load()
+        response = client.get("/health/ready")
+        assert response.status_code == 503 and response.json()["status"] == "loading"
+        assert client.get("/health/live").status_code == 200
+
+        GatedBackend.gate.set()
+        assert analyzer.wait_loaded(5)
+        response = client.get("/health/ready")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "ready" and body["model_state"] == "ready"
+        assert body["model_load_seconds"] is not None
+    finally:
+        GatedBackend.gate.set()
+        analyzer.batcher.close()
+        analyzer.small_batcher.close()
+
+
+def test_readiness_degraded_without_model(tmp_path, monkeypatch):
+    analyzer = YOLOHealthAnalyzer(str(tmp_path / "model.pt"), backend="onnxruntime")
+    monkeypatch.setattr(main, "yolo_analyzer", analyzer)
+    monkeypatch.setattr("config.EXPORTED_MODEL_PATH", "")
+    monkeypatch.setattr("yolo_inference.get_backend_class", lambda name: GatedBackend)
+    client = TestClient(main.app)
+    # Model export tidak ada: server tetap siap untuk analisis sensor saja
+    analyzer.load()
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "degraded" and body["model_state"] == "unavailable"
+    assert "tidak ditemukan" in body["model_detail"]
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name.startswith("test_readiness"):
+                    fn(Path(tmp), mp)
+                else:
+                    fn(mp)
+            print(f"✅ {name}")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Test riwayat triase SQLite: penulisan batch, paginasi, series dan endpoint
+"""
+import json
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import triage_rules
+from history import HistoryStore
+
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+
+
+def payload(ts, risk="LOW", temperature=36.8, heart_rate=75):
+    return {
+        "healthData": {"status": "normal", "riskLevel": risk, "temperature": temperature,
+                       "spo2": 98, "heartRate": heart_rate, "symptoms": []},
+        "confidence": 0.8,
+        "detectedConditions": [],
+        "timestamp": ts,
+    }
+
+
+def make_store(tmp_path, **kwargs):
+    store = HistoryStore(str(tmp_path / "history.db"), **kwargs)
+    store.start()
+    return store
+
+
+def test_batched_writes_and_keyset_pagination(tmp_path):
+    store = make_store(tmp_path, batch_size=100, flush_interval_s=5.0)
+    try:
+        for i in range(250):
+            store.record(payload(1_000_000 + i * 1000), station=f"bed-{i % 2}",
+                         patient="P1" if i < 100 else "P2")
+        assert store.flush()
+        assert store.written == 250
+        assert store.batches <= 4
+
+        seen, cursor = [], None
+        while True:
+            page = store.query(station="bed-0", limit=40, cursor=cursor)
+            seen.extend(item["timestamp"] for item in page["items"])
+            cursor = page["nextCursor"]
+            if cursor is None:
+                break
+        assert len(seen) == 125 and len(set(seen)) == 125
+        assert seen == sorted(seen, reverse=True)
+
+        page = store.query(patient="P1", start=1_000_000 + 10_000, end=1_000_000 + 19_000, full=True)
+        assert [item["timestamp"] for item in page["items"]] == [1_000_000 + i * 1000 for i in range(19, 9, -1)]
+        assert page["items"][0]["response"]["healthData"]["riskLevel"] == "LOW"
+        with pytest.raises(ValueError):
+            store.query(cursor="bukan-cursor")
+
+        conn = sqlite3.connect(tmp_path / "history.db")
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        plan = " ".join(str(row) for row in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM triage_history WHERE station = 'x' AND ts >= 0 ORDER BY ts DESC"))
+        assert "idx_history_station_ts" in plan
+        conn.close()
+    finally:
+        store.close()
+
+
+def test_series_downsamples_per_bucket(tmp_path):
+    store = make_store(tmp_path)
+    try:
+        for i in range(120):
+            risk = "HIGH" if i == 70 else "LOW"
+            store.record(payload(i * 1000, risk=risk, temperature=36.0 + (i // 60), heart_rate=60 + i),
+                         station="bed-1")
+        store.record(payload(5000, temperature=40.0), station="bed-2")
+        store.flush()
+
+        series = store.series(station="bed-1", bucket_ms=60_000)
+        assert series["bucketMs"] == 60_000
+        first, second = series["points"]
+        assert (first["timestamp"], first["count"], first["temperature"]) == (0, 60, 36.0)
+        assert second["temperature"] == 37.0 and second["heartRate"] == pytest.approx(149.5)
+        assert (first["maxRiskLevel"], second["maxRiskLevel"]) == ("LOW", "HIGH")
+
+        # Tanpa bucket: rentang dibagi menjadi paling banyak max_points titik
+        assert len(store.series(station="bed-1", max_points=10)["points"]) <= 10
+    finally:
+        store.close()
+
+
+def test_series_uses_rules_risk_levels(tmp_path, monkeypatch):
+    spec = json.loads(triage_rules.RULES_PATH.read_text(encoding="utf-8"))
+    # Level tambahan dari triage_rules.json ikut disimpan dan dibaca kembali
+    spec["risk_levels"] = ["LOW", "MEDIUM", "HIGH", "SEVERE", "CRITICAL"]
+    spec["outcomes"]["SEVERE"] = spec["outcomes"]["HIGH"]
+    spec["vision_outcomes"]["SEVERE"] = spec["vision_outcomes"]["HIGH"]
+    monkeypatch.setattr(triage_rules, "_active_rules", triage_rules.compile_rules(spec))
+    store = make_store(tmp_path)
+    try:
+        for i, risk in enumerate(("LOW", "SEVERE", "HIGH", "CRITICAL")):
+            store.record(payload(i * 1000, risk=risk), station="bed-1")
+        store.flush()
+        points = store.series(station="bed-1", bucket_ms=2000)["points"]
+        assert [point["maxRiskLevel"] for point in points] == ["SEVERE", "CRITICAL"]
+    finally:
+        store.close()
+
+
+def test_full_queue_drops_and_close_drains(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"), queue_size=5)
+    store.record(payload(1))  # belum dijalankan: no-op
+    assert store.dropped == 0
+    with pytest.raises(RuntimeError):
+        store.query()
+
+    store.start()
+    # Writer ditahan oleh lock transaksi lain supaya queue penuh
+    blocker = sqlite3.connect(tmp_path / "history.db")
+    blocker.execute("BEGIN IMMEDIATE")
+    for i in range(50):
+        store.record(payload(i))
+    assert store.dropped > 0
+    blocker.rollback()
+    blocker.close()
+    store.close()
+
+    conn = sqlite3.connect(tmp_path / "history.db")
+    assert conn.execute("SELECT COUNT(*) FROM triage_history").fetchone()[0] == 50 - store.dropped
+    conn.close()
+
+
+def test_analyze_is_recorded_and_served(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    monkeypatch.setattr(main, "history_store", store)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    client = TestClient(main.app)
+    try:
+        for _ in range(3):
+            assert client.post("/analyze", json={"patientId": "P-7", "stationId": "bed-3"}).status_code == 200
+        assert client.post("/analyze/image?patient=P-8", content=b"",
+                           headers={"content-type": "application/octet-stream"}).status_code == 400
+        store.flush()
+
+        body = client.get("/history", params={"patient": "P-7", "limit": 2}).json()
+        assert len(body["items"]) == 2 and body["nextCursor"]
+        assert body["items"][0]["station"] == "bed-3"
+        assert body["items"][0]["riskLevel"] == "LOW"
+        rest = client.get("/history", params={"patient": "P-7", "cursor": body["nextCursor"]}).json()
+        assert len(rest["items"]) == 1 and rest["nextCursor"] is None
+
+        series = client.get("/history/series", params={"station": "bed-3"}).json()
+        assert sum(point["count"] for point in series["points"]) == 3
+        assert client.get("/history", params={"cursor": "x"}).status_code == 400
+    finally:
+        store.close()
+    assert client.get("/history").status_code == 503
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name in ("test_analyze_is_recorded_and_served", "test_series_uses_rules_risk_levels"):
+                    fn(Path(tmp), mp)
+                else:
+                    fn(Path(tmp))
+            print(f"✅ {name}")
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Test layanan IPC: frame lewat shared memory antar proses, error handler,
+reconnect dan worker HTTP mode remote
+"""
+import hashlib
+import multiprocessing
+import pickle
+import time
+from multiprocessing.connection import Client
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from ipc_service import (IPCClient, IPCServer, RemoteAnalyzer, RemoteSensors, RemoteStationRegistry)
+from test_result_cache import make_analyzer
+
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+
+
+def frame_digest(frame, station_id=None):
+    return type(frame).__name__, len(frame), hashlib.blake2b(frame, digest_size=16).hexdigest(), station_id
+
+
+def fail(kind):
+    raise {"key": KeyError, "runtime": RuntimeError, "other": ZeroDivisionError}[kind]("gagal")
+
+
+def serve_digest(address, ready):
+    """Proses server terpisah: hanya menghitung digest frame dari shared memory"""
+    server = IPCServer(address, authkey="rahasia")
+    server.register("digest", frame_digest)
+    server.register("fail", fail)
+    server.start()
+    ready.set()
+    time.sleep(60)
+
+
+def wait_for(client, method, *args, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return client.call(method, *args)
+        except RuntimeError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def test_frames_cross_process_through_shared_memory(tmp_path):
+    address = str(tmp_path / "ipc.sock")
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    process = context.Process(target=serve_digest, args=(address, ready), daemon=True)
+    process.start()
+    client = IPCClient(address, authkey="rahasia", pool_size=2, frame_bytes=4096)
+    try:
+        assert ready.wait(30)
+        small = np.random.default_rng(0).bytes(1000)
+        expected = hashlib.blake2b(small, digest_size=16).hexdigest()
+        # Server membaca langsung dari segmen (memoryview), bukan salinan pickle
+        assert wait_for(client, "digest", small) == ("memoryview", 1000, expected, None)
+        channel = client._idle.queue[0]
+        segment = channel.segment.name
+        assert client.call("digest", small[:10], "bed-1")[1:] == \
+            (10, hashlib.blake2b(small[:10], digest_size=16).hexdigest(), "bed-1")
+        assert channel.segment.name == segment  # segmen dipakai ulang
+
+        # Frame lebih besar dari segmen: segmen baru yang cukup besar
+        large = np.random.default_rng(1).bytes(100_000)
+        assert client.call("digest", large)[2] == hashlib.blake2b(large, digest_size=16).hexdigest()
+        assert channel.segment.name != segment and channel.segment.size >= 100_000
+
+        with pytest.raises(KeyError):
+            client.call("fail", "key")
+        with pytest.raises(RuntimeError):
+            client.call("fail", "runtime")
+        with pytest.raises(RuntimeError):
+            client.call("fail", "other")
+        with pytest.raises(ValueError):
+            client.call("tidak_ada")
+        # Authkey salah ditolak
+        with pytest.raises(RuntimeError):
+            IPCClient(address, authkey="salah").call("digest", small)
+    finally:
+        client.close()
+        process.terminate()
+        process.join(10)
+    with pytest.raises(RuntimeError):
+        client.call("digest", b"x")
+
+
+def test_client_reconnects_after_server_restart(tmp_path):
+    address = str(tmp_path / "ipc.sock")
+    server = IPCServer(address)
+    server.register("digest", frame_digest)
+    server.start()
+    client = IPCClient(address, pool_size=1)
+    try:
+        assert client.call("digest", b"abc")[1] == 3
+        server.close()
+        server = IPCServer(address)
+        server.register("digest", frame_digest)
+        server.start()
+        # Koneksi lama putus: dibuka ulang sekali secara otomatis
+        assert wait_for(client, "digest", b"abcd")[1] == 4
+        assert server.stats()["connections"] == 1
+    finally:
+        client.close()
+        server.close()
+
+
+def test_unreadable_message_closes_only_that_connection(tmp_path):
+    address = str(tmp_path / "ipc.sock")
+    server = IPCServer(address)
+    server.register("digest", frame_digest)
+    server.start()
+    client = IPCClient(address, pool_size=1)
+    try:
+        for message in (b"bukan pickle", pickle.dumps(("digest",))):
+            raw = Client(address)
+            raw.send_bytes(message)
+            with pytest.raises(EOFError):
+                raw.recv()
+            raw.close()
+        # Server tetap melayani koneksi lain
+        assert client.call("digest", b"abc")[1] == 3
+        assert (server.stats()["errors"], server.stats()["calls"]) == (2, 1)
+        # Thread koneksi rusak menutup koneksinya sendiri
+        deadline = time.monotonic() + 5
+        while server.stats()["active"] > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert server.stats()["active"] == 1
+    finally:
+        client.close()
+        server.close()
+
+
+def test_remote_mode_worker(tmp_path, monkeypatch):
+    analyzer, backend = make_analyzer(tmp_path)
+    inference = IPCServer(str(tmp_path / "inference.sock"))
+    inference.register("analyze_image_bytes", analyzer.analyze_image_bytes)
+    inference.register("status", analyzer.status)
+    inference.start()
+    sensors = IPCServer(str(tmp_path / "sensors.sock"))
+    readings = {None: dict(SENSOR_READING), "bed-2": {**SENSOR_READING, "heartRate": 131}}
+
+    def read_sensor(station_id=None):
+        return readings[station_id]
+
+    sensors.register("read_sensor", read_sensor)
+    sensors.register("stations", lambda: {"bed-2": {"patient_id": "P-2", "camera": None}})
+    sensors.register("status", lambda: {"running": True, "source": "replay"})
+    sensors.start()
+
+    remote = RemoteAnalyzer(IPCClient(str(tmp_path / "inference.sock")))
+    remote_sensors = RemoteSensors(IPCClient(str(tmp_path / "sensors.sock")))
+    monkeypatch.setattr(main, "REMOTE_SERVICES", True)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "inference_client", remote)
+    monkeypatch.setattr(main, "sensor_client", remote_sensors)
+    monkeypatch.setattr(main, "analyze_health_image", remote.analyze_image)
+    monkeypatch.setattr(main, "analyze_health_image_bytes", remote.analyze_image_bytes)
+    monkeypatch.setattr(main, "get_sensor_data", remote_sensors.get_sensor_data)
+    monkeypatch.setattr(main, "station_registry", RemoteStationRegistry(remote_sensors))
+    client = TestClient(main.app)
+    image = cv2.imencode('.jpg', np.full((240, 320, 3), 90, np.uint8))[1].tobytes()
+    try:
+        body = client.post("/analyze/image?station=bed-2&detections=full", content=image,
+                           headers={"content-type": "application/octet-stream"}).json()
+        assert body["healthData"]["heartRate"] == 131
+        assert body["vision"]["detections"][0]["class"] == "distress_signs"
+        assert backend.frames == 1
+        assert client.post("/analyze", json={"stationId": "bed-9"}).status_code == 404
+        assert client.post("/analyze", json={}).json()["healthData"]["heartRate"] == 75
+
+        ready = client.get("/health/ready").json()
+        assert ready["status"] == "ready" and ready["sensor_source"] == "replay"
+        assert client.get("/inference/stats").json()["batching"]["frames"] == 1
+        assert client.get("/stations").json()["stations"]["bed-2"]["patient_id"] == "P-2"
+
+        # Layanan inferensi mati: worker tetap menjawab dengan sensor saja
+        inference.close()
+        remote.client.close()
+        body = client.post("/analyze/image", content=image,
+                           headers={"content-type": "application/octet-stream"}).json()
+        assert body["healthData"]["analysis_method"] == "sensor hardware only"
+        assert client.get("/health/ready").status_code == 503
+    finally:
+        remote.client.close()
+        remote_sensors.client.close()
+        inference.close()
+        sensors.close()
+        analyzer.batcher.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name == "test_remote_mode_worker":
+                    fn(Path(tmp), mp)
+                else:
+                    fn(Path(tmp))
+            print(f"✅ {name}")
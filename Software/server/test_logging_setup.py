@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test logging non-blocking: queue terbatas, rate limit, sampling dan request_id
+"""
+import json
+import logging
+import queue
+
+from fastapi.testclient import TestClient
+
+import main
+from logging_setup import (DroppingQueueHandler, JsonFormatter, RateLimitFilter,
+                           RequestContextFilter, request_id_var)
+
+
+def make_record(msg="Analysis complete", level=logging.INFO, args=(), **extra):
+    record = logging.LogRecord("main", level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.handle(make_record("pesan %d", args=(i,)))
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+    # Format pesan ditunda: args masih utuh di record yang antri
+    assert handler.queue.get_nowait().getMessage() == "pesan 0"
+
+
+def test_rate_limit_per_template(monkeypatch):
+    now = [10.0]
+    monkeypatch.setattr("logging_setup.time.monotonic", lambda: now[0])
+    limiter = RateLimitFilter(rate_per_s=1.0, burst=3)
+    passed = [limiter.filter(make_record("sensor %s", args=(i,))) for i in range(10)]
+    assert passed == [True] * 3 + [False] * 7
+    # Template lain punya bucket sendiri
+    assert limiter.filter(make_record("lain"))
+
+    now[0] += 1.0
+    record = make_record("sensor %s", args=(99,))
+    assert limiter.filter(record)
+    assert record.suppressed == 7
+    assert limiter.suppressed == 7
+
+
+def test_sampling_keeps_whole_requests_and_all_warnings():
+    limiter = RateLimitFilter(rate_per_s=0, sample_rate=0.25)
+    kept = 0
+    for i in range(400):
+        request_id = f"req-{i}"
+        decisions = {limiter.filter(make_record(f"pesan {j}", request_id=request_id)) for j in range(3)}
+        assert len(decisions) == 1
+        kept += decisions.pop()
+        assert limiter.filter(make_record("gagal", level=logging.WARNING, request_id=request_id))
+    assert 60 < kept < 140
+    # Pesan di luar request (startup) tidak di-sample
+    assert limiter.filter(make_record("startup", request_id="-"))
+
+
+def test_json_formatter_carries_request_id_and_extras():
+    token = request_id_var.set("abc123")
+    try:
+        record = make_record("Analysis complete", duration_ms=12.5)
+        RequestContextFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["request_id"] == "abc123"
+    assert entry["msg"] == "Analysis complete"
+    assert entry["duration_ms"] == 12.5
+
+
+def test_request_id_reaches_executor_threads(monkeypatch):
+    seen = []
+
+    def fake_vision(image_data, station_id=None):
+        seen.append(request_id_var.get())
+        raise RuntimeError("tidak dipakai")
+
+    monkeypatch.setattr(main, "analyze_health_image", fake_vision)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: {
+        "temperature": 36.8, "spo2": 98, "heartRate": 75,
+        "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+    })
+    client = TestClient(main.app)
+    response = client.post("/analyze", json={"imageData": "AAAA"}, headers={"X-Request-ID": "pasien-42"})
+    assert response.status_code == 200
+    assert response.headers["x-request-id"] == "pasien-42"
+    assert seen == ["pasien-42"]
+    # Tanpa header: request_id dibuat server
+    assert len(client.get("/").headers["x-request-id"]) == 16
+
+
+if __name__ == "__main__":
+    import pytest
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with pytest.MonkeyPatch.context() as mp:
+                if name in ("test_rate_limit_per_template", "test_request_id_reaches_executor_threads"):
+                    fn(mp)
+                else:
+                    fn()
+            print(f"✅ {name}")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Test /metrics: format teks Prometheus dan histogram per tahap pipeline
+"""
+import base64
+import re
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from metrics import Counter, Histogram, Registry
+from stations import Station, StationRegistry
+from test_result_cache import make_analyzer
+
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+
+
+def parse_samples(text: str):
+    """{(nama, labels-string): nilai} dari teks Prometheus"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = re.match(r'^([a-zA-Z_:][\w:]*)(\{[^}]*\})? (\S+)$', line)
+        assert match, line
+        samples[(match.group(1), match.group(2) or "")] = float(match.group(3))
+    return samples
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.register(Histogram("demo_seconds", "Demo", ("stage",), buckets=(0.1, 1.0)))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, stage="a")
+    samples = parse_samples(registry.render())
+    assert samples[("demo_seconds_bucket", '{stage="a",le="0.1"}')] == 1
+    assert samples[("demo_seconds_bucket", '{stage="a",le="1.0"}')] == 3
+    assert samples[("demo_seconds_bucket", '{stage="a",le="+Inf"}')] == 4
+    assert samples[("demo_seconds_count", '{stage="a"}')] == 4
+    assert samples[("demo_seconds_sum", '{stage="a"}')] == pytest.approx(4.05)
+
+
+def test_counter_labels_are_validated_and_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("demo_total", "Demo", ("reason",)))
+    counter.inc(reason='kutip "ganda"')
+    counter.inc(2, reason='kutip "ganda"')
+    assert 'demo_total{reason="kutip \\"ganda\\""} 3' in registry.render()
+    with pytest.raises(ValueError):
+        counter.inc(salah="x")
+
+
+def test_analyze_records_every_stage(tmp_path, monkeypatch):
+    analyzer, _ = make_analyzer(tmp_path)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    monkeypatch.setattr(main, "analyze_health_image", analyzer.analyze_image)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    client = TestClient(main.app)
+
+    image = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    image_data = "data:image/jpeg;base64," + base64.b64encode(cv2.imencode('.jpg', image)[1].tobytes()).decode()
+    before = parse_samples(client.get("/metrics").text)
+    try:
+        response = client.post("/analyze", json={"imageData": image_data})
+        assert response.status_code == 200
+        assert response.json()["healthData"]["analysis_method"] == "sensor hardware + vision"
+    finally:
+        analyzer.batcher.close()
+
+    after = parse_samples(client.get("/metrics").text)
+    for stage in ("sensor_read", "base64_decode", "image_decode", "yolo_inference",
+                  "post_processing", "rule_evaluation", "response_serialization"):
+        key = ("triage_stage_seconds_count", f'{{stage="{stage}"}}')
+        assert after[key] == before.get(key, 0) + 1, stage
+    key = ("triage_vision_model_total", '{model="CustomYOLO",backend="fake"}')
+    assert after[key] == before.get(key, 0) + 1
+    assert ("triage_model_ready", '{backend="' + main.yolo_analyzer.backend_name + '"}') in after
+
+
+def test_sensor_failure_and_fallback_are_counted(monkeypatch):
+    def broken_sensor():
+        raise RuntimeError("I2C timeout")
+
+    monkeypatch.setattr(main, "get_sensor_data", broken_sensor)
+    client = TestClient(main.app)
+    key = ("triage_sensor_errors_total", '{endpoint="analyze"}')
+    before = parse_samples(client.get("/metrics").text).get(key, 0)
+    assert client.post("/analyze", json={}).status_code == 503
+    assert parse_samples(client.get("/metrics").text)[key] == before + 1
+
+    fallback = ("triage_vision_fallback_total", '{reason="model_unavailable"}')
+    before = parse_samples(client.get("/metrics").text).get(fallback, 0)
+    main.yolo_analyzer.analyze_image("data:image/jpeg;base64,AAAA")  # model belum dimuat
+    assert parse_samples(client.get("/metrics").text)[fallback] == before + 1
+
+
+def test_motion_gate_labels_only_known_stations(tmp_path, monkeypatch):
+    analyzer, _ = make_analyzer(tmp_path)
+    registry = StationRegistry()
+    registry.stations = {"bed-1": Station("bed-1", sampler=None)}
+    monkeypatch.setattr(main, "yolo_analyzer", analyzer)
+    monkeypatch.setattr(main, "station_registry", registry)
+    gate = analyzer.motion_gate
+    thumb = np.zeros((48, 64), np.uint8)
+    try:
+        for station in ("bed-1", "default", "x-1", "x-2", "x-2"):
+            gate.lookup(station, thumb)
+        samples = parse_samples(TestClient(main.app).get("/metrics").text)
+    finally:
+        analyzer.batcher.close()
+        analyzer.small_batcher.close()
+
+    frames = {labels: value for (name, labels), value in samples.items()
+              if name == "triage_motion_gate_frames_total"}
+    # ID station acak dari client digabung menjadi satu seri "other"
+    assert frames == {'{station="bed-1"}': 1, '{station="default"}': 1, '{station="other"}': 3}
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name in ("test_analyze_records_every_stage", "test_motion_gate_labels_only_known_stations"):
+                    fn(Path(tmp), mp)
+                elif name == "test_sensor_failure_and_fallback_are_counted":
+                    fn(mp)
+                else:
+                    fn()
+            print(f"✅ {name}")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test motion gate: frame diam dilewati, gerakan/umur maksimum memicu inferensi
+"""
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from motion_gate import MotionGate
+from test_result_cache import make_analyzer
+
+
+def scene(seed: int = 0, shift: int = 0, noise: float = 2.0, box=None) -> bytes:
+    """Frame JPEG 640x480: latar gradasi + noise kamera, opsional kotak 'pasien' bergeser"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(40, 200, 640, dtype=np.float32)
+    frame = np.repeat(np.tile(x, (480, 1))[:, :, None], 3, axis=2)
+    x0, y0, x1, y1 = box or (200, 120, 360, 400)
+    frame[y0:y1, x0 + shift:x1 + shift] = 230
+    frame += rng.normal(0, noise, frame.shape)
+    return cv2.imencode('.jpg', np.clip(frame, 0, 255).astype(np.uint8))[1].tobytes()
+
+
+def test_still_scene_is_skipped_and_motion_is_not():
+    gate = MotionGate(threshold=0.02, pixel_delta=12, max_age_s=60)
+    reference = gate.thumbnail(scene(seed=0))
+    gate.update("bed-1", reference, {"detections": ["pasien"]})
+
+    # Noise kamera saja: pakai hasil sebelumnya
+    assert gate.lookup("bed-1", gate.thumbnail(scene(seed=1))) == {"detections": ["pasien"]}
+    # Pasien bergeser 40 piksel: harus inferensi ulang
+    assert gate.lookup("bed-1", gate.thumbnail(scene(seed=2, shift=40))) is None
+
+    stats = gate.stats()
+    assert (stats['frames'], stats['skipped']) == (2, 1)
+    assert stats['skip_ratio'] == 0.5
+    assert stats['stations']['bed-1']['skipped'] == 1
+
+
+def test_stations_are_independent():
+    gate = MotionGate()
+    thumb = gate.thumbnail(scene())
+    gate.update("bed-1", thumb, {"station": 1})
+    assert gate.lookup("bed-2", thumb) is None
+    assert gate.lookup("bed-1", thumb) == {"station": 1}
+    # Namespace berbeda (model lain) tidak memakai hasil lama
+    assert gate.lookup("bed-1", thumb, namespace="model-b") is None
+
+
+def test_max_age_forces_refresh(monkeypatch):
+    now = [50.0]
+    monkeypatch.setattr("motion_gate.time.monotonic", lambda: now[0])
+    gate = MotionGate(max_age_s=5)
+    thumb = gate.thumbnail(scene())
+    gate.update("bed-1", thumb, {"ok": True})
+    now[0] += 4
+    assert gate.lookup("bed-1", thumb) is not None
+    now[0] += 2
+    assert gate.lookup("bed-1", thumb) is None
+    assert gate.stats()['refreshed_by_age'] == 1
+
+
+def test_station_state_is_bounded_lru():
+    gate = MotionGate(max_stations=2)
+    thumb = gate.thumbnail(scene())
+    for station in ("bed-1", "bed-2"):
+        gate.lookup(station, thumb)
+        gate.update(station, thumb, {"station": station})
+    # bed-1 dipakai lagi, jadi bed-2 yang paling lama tidak dipakai
+    assert gate.lookup("bed-1", thumb) == {"station": "bed-1"}
+    gate.update("bed-1", thumb, {"station": "bed-1"})
+    for i in range(50):
+        gate.lookup(f"acak-{i}", thumb)
+        gate.update(f"acak-{i}", thumb, {"station": i})
+
+    stats = gate.stats()
+    assert len(gate._stations) == 2 and len(stats["stations"]) == 2
+    assert set(stats["stations"]) == {"acak-48", "acak-49"}
+    assert stats["evicted_stations"] == 50
+    # Frame station yang dibuang tetap terhitung di total
+    assert stats["frames"] == 53
+    assert stats["evicted_station_counts"] == {"frames": 51, "skipped": 1}
+    assert gate.lookup("bed-1", thumb) is None
+
+
+def test_analyzer_reuses_result_for_still_station(tmp_path):
+    analyzer, backend = make_analyzer(tmp_path)
+    try:
+        first = analyzer.analyze_image_bytes(scene(seed=0), station_id="bed-1")
+        still = analyzer.analyze_image_bytes(scene(seed=1), station_id="bed-1")
+        moved = analyzer.analyze_image_bytes(scene(seed=2, shift=40), station_id="bed-1")
+        # Tanpa station: motion gate tidak dipakai
+        analyzer.analyze_image_bytes(scene(seed=3))
+
+        assert backend.frames == 3
+        assert (first['motion_skipped'], still['motion_skipped'], moved['motion_skipped']) == (False, True, False)
+        assert still['detections'] == first['detections']
+        assert analyzer.motion_gate.stats()['skip_ratio'] == 1 / 3
+    finally:
+        analyzer.batcher.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import pytest
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            if name == "test_analyzer_reuses_result_for_still_station":
+                with tempfile.TemporaryDirectory() as tmp:
+                    fn(Path(tmp))
+            elif name == "test_max_age_forces_refresh":
+                with pytest.MonkeyPatch.context() as mp:
+                    fn(mp)
+            else:
+                fn()
+            print(f"✅ {name}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test post-processing deteksi kolumnar: hasil identik dengan loop per box,
+output compact dan bagian `vision` di response
+"""
+import base64
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from inference_backends import Detections
+from test_result_cache import make_analyzer
+from triage_rules import get_rules
+from yolo_inference import format_vision
+
+
+def random_detections(n, n_classes, seed=0):
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, 500, (n, 2))
+    boxes = np.hstack((xy, xy + rng.uniform(10, 100, (n, 2)))).astype(np.float32)
+    return Detections(boxes, rng.uniform(0.25, 1.0, n).astype(np.float32),
+                      rng.integers(0, n_classes, n).astype(np.int32))
+
+
+def reference_analysis(analyzer, result):
+    """Implementasi lama: satu dict dan satu lookup per box"""
+    rules = get_rules()
+    detections, conditions = [], []
+    for box, confidence, class_id in zip(result.boxes.tolist(), result.scores.tolist(), result.classes.tolist()):
+        if analyzer.using_standard_model:
+            if class_id != 0:
+                continue
+            class_name = 'person_detected'
+        else:
+            class_name = analyzer.custom_class_names.get(class_id, f"class_{class_id}")
+        detections.append({'class': class_name, 'confidence': confidence, 'bbox': box})
+        condition = rules.vision_conditions.get(class_name)
+        if condition is not None:
+            conditions.append((condition, confidence))
+
+    if not conditions:
+        return detections, [], None
+    severity = max(conditions, key=lambda c: c[0].severity_rank)[0].severity
+    symptoms = list(dict.fromkeys(s for c, _ in conditions for s in c.symptoms))
+    return detections, [(c.condition, conf) for c, conf in conditions], (severity, symptoms,
+                                                                        [c.condition for c, _ in conditions])
+
+
+@pytest.mark.parametrize("standard", [False, True])
+def test_columnar_matches_per_box_loop(tmp_path, standard):
+    analyzer, _ = make_analyzer(tmp_path)
+    analyzer.using_standard_model = standard
+    for seed, n in enumerate((0, 1, 7, 300)):
+        # Kelas 0-9: id 6-9 di luar tabel custom (class_<id>)
+        result = random_detections(n, 10, seed)
+        analysis = analyzer._build_analysis(result, batch_size=1, compact=False)
+        detections, conditions, overall = reference_analysis(analyzer, result)
+
+        assert analysis['detections'] == detections
+        assert [(c['condition'], c['confidence']) for c in analysis['health_conditions']] == conditions
+        if overall is None:
+            assert analysis['overall_analysis']['risk_level'] == 'LOW'
+        else:
+            severity, symptoms, detected = overall
+            assert analysis['overall_analysis']['risk_level'] == severity
+            assert analysis['overall_analysis']['symptoms'] == symptoms
+            assert analysis['overall_analysis']['detected_conditions'] == detected
+
+
+def test_compact_output_and_format_conversion(tmp_path):
+    analyzer, _ = make_analyzer(tmp_path)
+    result = random_detections(50, 6, seed=3)
+    full = analyzer._build_analysis(result, batch_size=2, compact=False)
+    compact = analyzer._build_analysis(result, batch_size=2, compact=True)
+
+    assert compact['overall_analysis'] == full['overall_analysis']
+    assert compact['detections']['classes'] == [d['class'] for d in full['detections']]
+    assert compact['detections']['boxes'] == [d['bbox'] for d in full['detections']]
+    summary = {c['condition']: c for c in compact['health_conditions']}
+    for condition in {c['condition'] for c in full['health_conditions']}:
+        matching = [c['confidence'] for c in full['health_conditions'] if c['condition'] == condition]
+        assert summary[condition]['count'] == len(matching)
+        assert summary[condition]['max_confidence'] == pytest.approx(max(matching))
+
+    # Konversi dua arah menghasilkan bentuk yang sama dengan build langsung
+    assert format_vision(full, "compact")['detections'] == compact['detections']
+    assert format_vision(full, "compact")['health_conditions'] == compact['health_conditions']
+    assert format_vision(compact, "full")['detections'] == full['detections']
+    assert format_vision(compact, "full")['health_conditions'] == full['health_conditions']
+
+    # Tabel class dibangun ulang hanya jika aturan/model berganti
+    table = analyzer._class_table()
+    analyzer._build_analysis(result, batch_size=1)
+    assert analyzer._class_table() is table
+    analyzer.using_standard_model = True
+    assert analyzer._class_table() is not table
+
+
+def test_analyze_returns_requested_detection_format(tmp_path, monkeypatch):
+    analyzer, _ = make_analyzer(tmp_path)
+    monkeypatch.setattr(main, "analyze_health_image", analyzer.analyze_image)
+    monkeypatch.setattr(main, "analyze_health_image_bytes", analyzer.analyze_image_bytes)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: {
+        "temperature": 36.8, "spo2": 98, "heartRate": 75,
+        "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+    })
+    client = TestClient(main.app)
+    image = cv2.imencode('.jpg', np.full((240, 320, 3), 90, np.uint8))[1].tobytes()
+    try:
+        body = client.post("/analyze", json={
+            "imageData": "data:image/jpeg;base64," + base64.b64encode(image).decode(),
+            "detections": "compact"
+        }).json()
+        assert body["vision"]["format"] == "compact"
+        assert body["vision"]["detections"]["classes"] == ["distress_signs"]
+        assert body["vision"]["health_conditions"][0]["count"] == 1
+
+        response = client.post("/analyze/image?detections=full", content=image,
+                               headers={"content-type": "application/octet-stream"})
+        assert response.json()["vision"]["detections"][0]["class"] == "distress_signs"
+        assert "vision" not in client.post("/analyze/image", content=image,
+                                           headers={"content-type": "application/octet-stream"}).json()
+        assert client.post("/analyze/image?detections=xml", content=image).status_code == 422
+        assert client.post("/analyze", json={"detections": "xml"}).status_code == 422
+    finally:
+        analyzer.batcher.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for standard in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            test_columnar_matches_per_box_loop(Path(tmp), standard)
+    print("✅ test_columnar_matches_per_box_loop")
+    with tempfile.TemporaryDirectory() as tmp:
+        test_compact_output_and_format_conversion(Path(tmp))
+    print("✅ test_compact_output_and_format_conversion")
+    with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+        test_analyze_returns_requested_detection_format(Path(tmp), mp)
+    print("✅ test_analyze_returns_requested_detection_format")
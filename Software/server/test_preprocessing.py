@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test preprocessing: ukuran dari header, decode tereduksi, letterbox ke buffer
+"""
+import cv2
+import numpy as np
+
+from preprocessing import (choose_reduction, decode_image, letterbox, prepare_frame,
+                           read_image_size, scale_boxes)
+
+
+def encoded(width, height, ext='.jpg'):
+    """Gambar gradasi terenkode (bytes) ukuran width x height"""
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)
+    image = np.dstack([np.add.outer(y, x) / 2, np.tile(x, (height, 1)), np.tile(y[:, None], (1, width))])
+    ok, data = cv2.imencode(ext, image.astype(np.uint8))
+    assert ok
+    return data.tobytes()
+
+
+def test_read_image_size_from_header():
+    assert read_image_size(encoded(4000, 3000)) == ('jpeg', 4000, 3000)
+    assert read_image_size(memoryview(encoded(320, 240, '.png'))) == ('png', 320, 240)
+    assert read_image_size(b'bukan gambar') is None
+
+
+def test_choose_reduction_keeps_long_side_above_imgsz():
+    assert choose_reduction(4000, 3000, 640) == 4
+    assert choose_reduction(1280, 720, 640) == 2
+    assert choose_reduction(1000, 800, 640) == 1
+    assert choose_reduction(6000, 4000, 640) == 8
+
+
+def test_reduced_decode_reports_original_shape():
+    image, shape, reduction = decode_image(encoded(4000, 3000), target=640)
+    assert reduction == 4
+    assert image.shape[:2] == (750, 1000)
+    assert shape == (3000, 4000)
+
+    # PNG tidak punya DCT scaling: decode penuh
+    image, shape, reduction = decode_image(encoded(800, 600, '.png'), target=640)
+    assert (image.shape[:2], shape, reduction) == ((600, 800), (600, 800), 1)
+
+
+def test_letterbox_round_trip():
+    image = np.zeros((480, 1280, 3), dtype=np.uint8)
+    boxed, scale, pad = letterbox(image, 640)
+    assert boxed.shape == (640, 640, 3)
+    original = np.array([[100, 50, 400, 300]], dtype=np.float32)
+    in_model = original * scale + np.array([pad[0], pad[1], pad[0], pad[1]], dtype=np.float32)
+    np.testing.assert_allclose(scale_boxes(in_model, scale, pad, image.shape[:2]), original, atol=1e-3)
+
+
+def test_letterbox_into_reused_buffer_matches_fresh():
+    buffer = np.zeros((640, 640, 3), dtype=np.uint8)
+    for shape in [(480, 1280, 3), (1280, 480, 3), (640, 640, 3)]:
+        image = np.random.default_rng(0).integers(0, 255, shape, dtype=np.uint8)
+        fresh, scale, pad = letterbox(image, 640)
+        reused, scale_b, pad_b = letterbox(image, 640, out=buffer)
+        assert reused is buffer
+        assert (scale, pad) == (scale_b, pad_b)
+        np.testing.assert_array_equal(reused, fresh)
+
+
+def test_boxes_map_back_to_original_coordinates():
+    # Box di gambar asli 4000x3000, dipetakan lewat decode 1/4 + letterbox
+    image, shape, reduction = decode_image(encoded(4000, 3000), target=640)
+    frame = prepare_frame(image, 640, shape=shape, reduction=reduction)
+    original = np.array([[400, 300, 2000, 2400]], dtype=np.float32)
+    sx, sy = frame.scale
+    in_model = original * np.array([sx, sy, sx, sy], dtype=np.float32) \
+        + np.array([frame.pad[0], frame.pad[1]] * 2, dtype=np.float32)
+    assert frame.image.shape == (640, 640, 3)
+    assert in_model.max() <= 640
+    np.testing.assert_allclose(scale_boxes(in_model, frame.scale, frame.pad, frame.shape), original, atol=1e-2)
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print(f"✅ {name}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test cache hasil inferensi: LRU, TTL, counter dan invalidasi saat model berganti
+"""
+import base64
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from inference_backends import Detections
+from result_cache import ResultCache, content_digest
+from yolo_inference import YOLOHealthAnalyzer
+
+
+class CountingBackend:
+    """Backend palsu: satu deteksi tetap, menghitung jumlah frame yang diinferensi"""
+
+    name = "fake"
+    dynamic_imgsz = True
+
+    def __init__(self, model_path: Path, imgsz: int = 320):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        self.frames = 0
+        self.sizes = []
+
+    def predict(self, images, imgsz=None):
+        self.frames += len(images)
+        self.sizes.append(imgsz or self.imgsz)
+        return [Detections(np.array([[10, 20, 110, 220]], np.float32),
+                           np.array([0.9], np.float32),
+                           np.array([3], np.int32)) for _ in images]
+
+
+def make_analyzer(tmp_path: Path):
+    model_file = tmp_path / "model.onnx"
+    model_file.write_bytes(b"v1")
+    analyzer = YOLOHealthAnalyzer(str(model_file), backend="onnxruntime")
+    backend = CountingBackend(model_file)
+    analyzer.model = backend
+    analyzer.model_fingerprint = analyzer._fingerprint(backend)
+    analyzer.state = analyzer.STATE_READY
+    return analyzer, backend
+
+
+def jpeg_bytes(seed: int = 0) -> bytes:
+    image = np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def test_lru_eviction_and_counters():
+    cache = ResultCache(max_entries=2, ttl_s=0)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1          # "a" jadi paling baru dipakai
+    cache.put("c", 3)                   # "b" dibuang
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions'], stats['entries']) == (2, 1, 1, 2)
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("result_cache.time.monotonic", lambda: now[0])
+    cache = ResultCache(max_entries=8, ttl_s=5)
+    cache.put("frame", "hasil")
+    now[0] += 4
+    assert cache.get("frame") == "hasil"
+    now[0] += 2
+    assert cache.get("frame") is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_disabled_cache_stores_nothing():
+    cache = ResultCache(max_entries=0)
+    cache.put("a", 1)
+    assert cache.get("a") is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_digest_is_content_addressed():
+    assert content_digest(b"abc") == content_digest(memoryview(b"abc"))
+    assert content_digest(b"abc") != content_digest(b"abd")
+    assert len(content_digest("aGFsbw==")) == 16
+
+
+def test_repeated_frame_skips_inference(tmp_path):
+    analyzer, backend = make_analyzer(tmp_path)
+    try:
+        data = jpeg_bytes()
+        first = analyzer.analyze_image_bytes(data)
+        second = analyzer.analyze_image_bytes(data)
+        assert backend.frames == 1
+        assert (first['cache_hit'], second['cache_hit']) == (False, True)
+        assert first['detections'] == second['detections']
+        assert first['overall_analysis'] == second['overall_analysis']
+
+        # Base64 dengan prefix data URL: hit kedua tanpa decode base64
+        encoded = "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes(1)).decode()
+        analyzer.analyze_image(encoded)
+        assert analyzer.analyze_image(encoded)['cache_hit']
+        assert backend.frames == 2
+        assert analyzer.cache.stats()['hits'] == 2
+    finally:
+        analyzer.batcher.close()
+
+
+def test_model_change_invalidates_cache(tmp_path):
+    analyzer, backend = make_analyzer(tmp_path)
+    try:
+        data = jpeg_bytes()
+        analyzer.analyze_image_bytes(data)
+
+        # Model file diganti -> fingerprint berbeda -> entri lama tidak dipakai
+        backend.model_path.write_bytes(b"v2 lebih panjang")
+        analyzer.model_fingerprint = analyzer._fingerprint(backend)
+        assert not analyzer.analyze_image_bytes(data)['cache_hit']
+        assert backend.frames == 2
+    finally:
+        analyzer.batcher.close()
+
+
+if __name__ == "__main__":
+    import tempfile
+    import pytest
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            if name in ("test_repeated_frame_skips_inference", "test_model_change_invalidates_cache"):
+                with tempfile.TemporaryDirectory() as tmp:
+                    fn(Path(tmp))
+            elif name == "test_ttl_expiry":
+                with pytest.MonkeyPatch.context() as mp:
+                    fn(mp)
+            else:
+                fn()
+            print(f"✅ {name}")
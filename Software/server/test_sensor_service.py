@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Test sampler sensor: ring buffer (wraparound, window), ingest sampel ke
+snapshot dan start() yang tidak dipanggil ulang per request
+"""
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import sensor_service
+from sensor_service import RingBuffer, SensorSampler
+from sensor_trace import SensorSample
+from signal_processing import PPGEstimate
+
+
+class FakeSource:
+    """Sumber sensor palsu: menghitung check(), sampel dari list"""
+
+    name = "fake"
+    simulated = True
+    sample_rate_hz = None
+    tick_rate_hz = None
+
+    def __init__(self, samples=(), error: str = None):
+        self.samples = list(samples)
+        self.error = error
+        self.checks = 0
+
+    def check(self):
+        self.checks += 1
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+    def read(self) -> SensorSample:
+        # Setelah sampel habis: tick tanpa nilai
+        return self.samples.pop(0) if self.samples else SensorSample()
+
+
+def test_ring_buffer_wraps_around_in_order():
+    buffer = RingBuffer(4, ('red', 'ir'))
+    assert len(buffer) == 0 and buffer.latest() is None
+    assert buffer.window().shape == (0, 3)
+    for t in range(6):
+        buffer.append(100.0 + t, t * 10, t * 100)
+
+    assert len(buffer) == 4
+    np.testing.assert_array_equal(buffer.latest(), [105.0, 50, 500])
+    # Sampel tertua (t=0, 1) sudah ditimpa; urutan tetap kronologis
+    np.testing.assert_array_equal(buffer.window()[:, 0], [102.0, 103.0, 104.0, 105.0])
+    np.testing.assert_array_equal(buffer.window(count=2)[:, 1], [40, 50])
+    assert len(buffer.window(count=0)) == 0
+    # latest() mengembalikan salinan
+    buffer.latest()[1] = -1
+    assert buffer.latest()[1] == 50
+
+
+def test_ring_buffer_window_by_seconds():
+    buffer = RingBuffer(8, ('temperature',))
+    for t in (0.0, 0.5, 1.0, 2.0, 3.0, 3.5):
+        buffer.append(t, 36.0 + t)
+    # Relatif terhadap sampel terbaru (3.5): t >= 2.0
+    np.testing.assert_array_equal(buffer.window(seconds=1.5)[:, 0], [2.0, 3.0, 3.5])
+    np.testing.assert_array_equal(buffer.window(seconds=10)[:, 0], [0.0, 0.5, 1.0, 2.0, 3.0, 3.5])
+    np.testing.assert_array_equal(buffer.window(seconds=1.5, count=2)[:, 0], [3.0, 3.5])
+
+
+def test_ingest_updates_vitals_per_ppg_chunk():
+    sampler = SensorSampler(source=FakeSource(), ppg_rate_hz=50, ppg_chunk=4)
+    chunks = []
+
+    def update(red, ir):
+        chunks.append((red.copy(), ir.copy()))
+        return PPGEstimate(88.0, 97.0, 0.5, True)
+
+    sampler.processor.update = update
+    now = time.time()
+    for i in range(10):
+        sampler._ingest(now + i * 0.02, SensorSample(red=1000 + i, ir=2000 + i,
+                                                     temperature=37.24 if i == 9 else None))
+
+    # Dua chunk penuh (8 sampel), dua sampel masih menunggu chunk berikutnya
+    assert [list(red) for red, _ in chunks] == [[1000, 1001, 1002, 1003], [1004, 1005, 1006, 1007]]
+    assert len(sampler.ppg) == 10 and len(sampler.temperature) == 1
+    snapshot = sampler.snapshot()
+    assert (snapshot["heartRate"], snapshot["spo2"], snapshot["temperature"]) == (88, 97, 37.2)
+    assert snapshot["is_simulated"] is True
+    assert snapshot["sampled_at"] == int((now + 9 * 0.02) * 1000)
+
+
+def test_snapshot_errors(monkeypatch):
+    sampler = SensorSampler(source=FakeSource())
+    with pytest.raises(RuntimeError, match="Belum ada data"):
+        sampler.snapshot()
+
+    # Suhu ada, tapi sinyal PPG belum cukup (jari tidak terdeteksi)
+    sampler._ingest(time.time(), SensorSample(temperature=36.5))
+    with pytest.raises(RuntimeError, match="jari tidak terdeteksi"):
+        sampler.snapshot()
+
+    # Trace tanda vital saja: HR/SpO2 langsung dipakai
+    sampler._ingest(time.time(), SensorSample(temperature=36.6, heart_rate=121.6, spo2=92.2))
+    assert sampler.snapshot()["heartRate"] == 122
+
+    monkeypatch.setattr("config.SENSOR_STALE_S", 5.0)
+    sampler._ingest(time.time() - 10, SensorSample(temperature=36.7))
+    with pytest.raises(RuntimeError, match="data terakhir"):
+        sampler.snapshot()
+
+
+def test_start_is_idempotent_and_records_failure():
+    source = FakeSource(samples=[SensorSample(temperature=36.9, heart_rate=80, spo2=98)])
+    sampler = SensorSampler(source=source, ppg_rate_hz=50)
+    try:
+        sampler.start()
+        for _ in range(5):
+            sampler.start()
+        assert source.checks == 1 and sampler.running
+        assert sampler.snapshot(wait_s=2)["heartRate"] == 80
+    finally:
+        sampler.stop()
+
+    broken = SensorSampler(source=FakeSource(error="Sensor Suhu (MLX90614) tidak terdeteksi"))
+    with pytest.raises(RuntimeError):
+        broken.start()
+    assert not broken.running
+    # Sampler yang tidak berjalan: snapshot langsung gagal dengan alasannya
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError, match="MLX90614"):
+        broken.snapshot(wait_s=5)
+    assert time.perf_counter() - start < 1
+
+
+def test_get_sensor_data_does_not_start_sampler(monkeypatch):
+    source = FakeSource(error="Sensor Jantung (MAX30102) tidak terdeteksi")
+    sampler = SensorSampler(source=source)
+    monkeypatch.setattr(sensor_service, "sampler", sampler)
+    monkeypatch.setattr("config.SENSOR_STARTUP_WAIT_S", 5.0)
+    assert sensor_service.start_sampler() is False
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="MAX30102"):
+            sensor_service.get_sensor_data()
+    # Sumber sensor hanya diperiksa sekali (saat startup), bukan per request
+    assert source.checks == 1
+
+
+def test_replay_path_is_relative_to_server_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("config.SENSOR_REPLAY_PATH", "traces/sensor.npy")
+    source = sensor_service.create_source("replay")
+    assert source.path == Path(sensor_service.__file__).resolve().parent / "traces" / "sensor.npy"
+    monkeypatch.setattr("config.SENSOR_REPLAY_PATH", str(tmp_path / "trace.npy"))
+    assert sensor_service.create_source("replay").path == tmp_path / "trace.npy"
+
+
+if __name__ == "__main__":
+    import tempfile
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name == "test_replay_path_is_relative_to_server_dir":
+                    fn(Path(tmp), mp)
+                elif name in ("test_snapshot_errors", "test_get_sensor_data_does_not_start_sampler"):
+                    fn(mp)
+                else:
+                    fn()
+            print(f"✅ {name}")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test replay dan rekaman trace sensor (tanpa hardware)
+"""
+import time
+
+import numpy as np
+import pytest
+
+from sensor_service import SensorSampler
+from sensor_trace import (TRACE_DTYPE, ReplaySource, TraceRecorder, load_trace, save_trace,
+                          synthetic_trace, trace_sample_rate)
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = condition()
+        except RuntimeError:
+            result = None
+        if result:
+            return result
+        time.sleep(0.01)
+    raise AssertionError("kondisi tidak tercapai")
+
+
+def test_npy_and_csv_round_trip(tmp_path):
+    trace = synthetic_trace(seconds=4.0, fs=50.0)
+    for name in ("trace.npy", "trace.csv"):
+        save_trace(tmp_path / name, trace)
+        loaded = load_trace(tmp_path / name)
+        assert loaded.dtype == TRACE_DTYPE and len(loaded) == 200
+        assert trace_sample_rate(loaded) == pytest.approx(50.0)
+        np.testing.assert_allclose(loaded["ir"], trace["ir"], rtol=1e-5)
+        assert np.isnan(loaded["heart_rate"]).all()
+    # .npy dibuka sebagai memory map, bukan disalin ke RAM
+    assert isinstance(load_trace(tmp_path / "trace.npy"), np.memmap)
+
+
+def test_vitals_only_csv_and_invalid_files(tmp_path):
+    path = tmp_path / "vitals.csv"
+    path.write_text("t,temperature,heart_rate,spo2\n0,38.9,128,89\n1,38.9,129,89\n2,39.0,131,88\n")
+    trace = load_trace(path)
+    assert np.isnan(trace["red"]).all() and trace["heart_rate"][2] == 131
+
+    (tmp_path / "bad.csv").write_text("t,temperature\n0,37\n1,37\n")
+    with pytest.raises(ValueError):
+        load_trace(tmp_path / "bad.csv")
+    with pytest.raises(RuntimeError):
+        ReplaySource(tmp_path / "tidak-ada.npy").check()
+
+    sampler = SensorSampler(source=ReplaySource(path, speed=0), temp_interval_s=1.0)
+    sampler.start()
+    try:
+        snapshot = wait_until(lambda: sampler.snapshot())
+    finally:
+        sampler.stop()
+    assert snapshot["heartRate"] in (128, 129, 131)
+    assert snapshot["is_simulated"] is True
+
+
+def test_accelerated_replay_estimates_vitals_and_records(tmp_path):
+    save_trace(tmp_path / "pasien.npy", synthetic_trace(hr_bpm=96, spo2=94, temperature=38.4, seconds=20.0))
+    recorder = TraceRecorder(tmp_path / "rekaman.csv", flush_interval_s=0)
+    source = ReplaySource(tmp_path / "pasien.npy", speed=20.0, loop=False)
+    sampler = SensorSampler(source=source, recorder=recorder)
+
+    start = time.monotonic()
+    sampler.start()
+    wait_until(lambda: source.finished)
+    elapsed = time.monotonic() - start
+    snapshot = sampler.snapshot()
+    sampler.stop()
+
+    # 20 detik trace selesai jauh di bawah real time
+    assert elapsed < 10.0
+    assert snapshot["temperature"] == pytest.approx(38.4, abs=0.2)
+    assert abs(snapshot["heartRate"] - 96) <= 3
+    assert abs(snapshot["spo2"] - 94) <= 2
+    assert sampler.error_count == 1  # hanya tanda replay selesai
+    assert not sampler.running
+
+    recorded = load_trace(tmp_path / "rekaman.csv")
+    assert len(recorded) == 1000
+    np.testing.assert_allclose(recorded["red"], load_trace(tmp_path / "pasien.npy")["red"], rtol=1e-5)
+
+
+def test_replay_loops(tmp_path):
+    save_trace(tmp_path / "pendek.npy", synthetic_trace(seconds=0.2))
+    source = ReplaySource(tmp_path / "pendek.npy")
+    source.check()
+    samples = [source.read() for _ in range(25)]
+    assert source.loops == 2 and source.position == 5
+    assert samples[0] == samples[10] and samples[0].temperature is not None
+    assert samples[1].temperature is None
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp:
+                fn(Path(tmp))
+            print(f"✅ {name}")
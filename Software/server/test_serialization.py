@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test serialisasi response: negosiasi Accept, round-trip format biner
+terhadap AnalyzeResponse dan mode tanpa validasi
+"""
+import json
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import serialization
+from serialization import CBOR, JSON, MSGPACK, decode, encode, negotiate
+
+SENSOR_READING = {
+    "temperature": 38.4, "spo2": 91, "heartRate": 124,
+    "bloodPressure": {"systolic": 150, "diastolic": 95}, "respiratoryRate": None, "is_simulated": False
+}
+VISION = {
+    "overall_analysis": {"risk_level": "HIGH", "symptoms": ["Sesak napas"], "detected_conditions": ["Distress"],
+                         "recommendations": ["Periksa saluran napas"]},
+    "model_used": "custom", "model_backend": "fake",
+}
+
+
+def binary_formats():
+    return [media_type for media_type in (MSGPACK, CBOR) if media_type in serialization.CODECS]
+
+
+def test_negotiate_accept_header():
+    assert negotiate(None) == JSON
+    assert negotiate("*/*") == JSON
+    assert negotiate("text/html, application/json;q=0.5") == JSON
+    if MSGPACK in serialization.CODECS:
+        assert negotiate("application/x-msgpack") == MSGPACK
+        assert negotiate("application/json;q=0.5, application/msgpack") == MSGPACK
+        assert negotiate("application/msgpack;q=0, application/json") == JSON
+    if CBOR in serialization.CODECS:
+        assert negotiate("application/cbor, application/msgpack") == CBOR
+    # Tipe yang tidak terpasang / tidak dikenal jatuh ke JSON
+    assert negotiate("application/x-protobuf") == JSON
+
+
+@pytest.mark.parametrize("media_type", [JSON, MSGPACK, CBOR])
+def test_round_trip_matches_analyze_response(media_type):
+    if media_type not in serialization.CODECS:
+        pytest.skip(f"{media_type} tidak terpasang")
+    response = main._build_response(SENSOR_READING, VISION)
+    payload = response.model_dump(mode="json")
+    decoded = decode(encode(payload, media_type), media_type)
+
+    assert decoded == payload
+    assert main.AnalyzeResponse.model_validate(decoded) == response
+    # Payload tanpa validasi (mode produksi) identik dengan hasil validasi
+    fast = main._build_payload(SENSOR_READING, VISION)
+    fast["timestamp"] = payload["timestamp"]
+    assert decode(encode(fast, media_type), media_type) == payload
+    # Skalar NumPy yang lolos tanpa validasi tetap bisa di-encode
+    assert decode(encode({"spo2": np.int64(91), "t": np.float32(0.5)}, media_type), media_type) == \
+        {"spo2": 91, "t": 0.5}
+
+
+@pytest.mark.parametrize("validate", [True, False])
+def test_analyze_negotiates_response_format(monkeypatch, validate):
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    monkeypatch.setattr(main.config, "VALIDATE_RESPONSES", validate)
+    client = TestClient(main.app)
+
+    response = client.post("/analyze", json={})
+    assert response.headers["content-type"] == JSON
+    expected = response.json()
+    assert main.AnalyzeResponse.model_validate(expected).healthData["riskLevel"] == "HIGH"
+
+    for media_type in binary_formats():
+        response = client.post("/analyze", json={}, headers={"accept": media_type})
+        assert response.headers["content-type"] == media_type
+        assert "Accept" in response.headers["vary"]
+        body = decode(response.content, media_type)
+        main.AnalyzeResponse.model_validate(body)
+        body["timestamp"] = expected["timestamp"]
+        assert body == expected
+
+    # Endpoint lain tetap JSON (orjson) dan isinya sama dengan json stdlib
+    stats = client.get("/inference/stats")
+    assert stats.json() == json.loads(stats.content)
+
+
+if __name__ == "__main__":
+    test_negotiate_accept_header()
+    print("✅ test_negotiate_accept_header")
+    for media_type in [JSON] + binary_formats():
+        test_round_trip_matches_analyze_response(media_type)
+    print("✅ test_round_trip_matches_analyze_response")
+    for validate in (True, False):
+        with pytest.MonkeyPatch.context() as mp:
+            test_analyze_negotiates_response_format(mp, validate)
+    print("✅ test_analyze_negotiates_response_format")
@@ -47,7 +47,8 @@ def test_server():
 
             if response.status_code == 200:
                 result = response.json()
-                print("✅ Success!"                print(f"   Status: {result['healthData']['status']}")
+                print("✅ Success!")
+                print(f"   Status: {result['healthData']['status']}")
                 print(f"   Risk Level: {result['healthData']['riskLevel']}")
                 print(f"   Message: {result['healthData']['message']}")
                 print(f"   Symptoms: {', '.join(result['healthData']['symptoms'])}")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Test registry station: konfigurasi, lock bus I2C dan sensor per station
+"""
+import json
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from sensor_service import HardwareSource
+from stations import StationRegistry, parse_stations
+
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+
+
+class FakeBus:
+    """SMBus palsu: mencatat kanal mux yang dipilih dan pembacaan yang tumpang tindih"""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.channel = None
+
+    def write_byte(self, address, value):
+        self.channel = value.bit_length() - 1
+
+    def read_word_data(self, address, register):
+        return int((36.6 + 273.15) / 0.02)
+
+
+class FakeMax:
+    def __init__(self, source, tracker):
+        self.source = source
+        self.tracker = tracker
+
+    def read_fifo(self):
+        with self.tracker["lock"]:
+            self.tracker["active"] += 1
+            self.tracker["max_active"] = max(self.tracker["max_active"], self.tracker["active"])
+        # Kanal mux tidak boleh diganti station lain di tengah pembacaan
+        bus = self.source._smbus
+        channel = bus.channel
+        time.sleep(0.005)
+        assert bus.channel == channel == self.source.mux_channel
+        with self.tracker["lock"]:
+            self.tracker["active"] -= 1
+        return 60000, 80000
+
+
+def fake_hardware(bus, channel, shared_bus=None, tracker=None):
+    source = HardwareSource(bus=bus, mux_address=0x70 if channel is not None else None, mux_channel=channel)
+    source._smbus = shared_bus or FakeBus(tracker)
+    source._max = FakeMax(source, tracker)
+    return source
+
+
+def read_concurrently(sources, reads=8):
+    threads = [threading.Thread(target=lambda s=s: [s.read() for _ in range(reads)]) for s in sources]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def new_tracker():
+    return {"lock": threading.Lock(), "active": 0, "max_active": 0}
+
+
+def test_same_bus_is_serialized_different_buses_run_in_parallel():
+    tracker = new_tracker()
+    shared = FakeBus(tracker)
+    a, b = fake_hardware(11, 0, shared, tracker), fake_hardware(11, 1, shared, tracker)
+    assert a.lock is b.lock
+    read_concurrently([a, b])
+    assert tracker["max_active"] == 1
+
+    tracker = new_tracker()
+    c, d = fake_hardware(12, None, tracker=tracker), fake_hardware(13, None, tracker=tracker)
+    assert c.lock is not d.lock
+    read_concurrently([c, d])
+    assert tracker["max_active"] == 2
+    assert c.read().temperature is None  # suhu hanya tiap temp_interval
+    assert HardwareSource(bus=12).lock is c.lock
+
+
+def test_parse_example_and_reject_invalid_configs():
+    path = Path(__file__).resolve().parent / "stations.example.json"
+    stations = parse_stations(json.loads(path.read_text(encoding="utf-8")), base_dir=path.parent)
+    by_id = {station.id: station for station in stations}
+    assert by_id["bed-1"].patient_id == "P-001" and by_id["bed-1"].camera == 0
+    assert by_id["bed-1"].sampler.source.lock is by_id["bed-2"].sampler.source.lock
+    assert by_id["bed-3"].sampler.source.lock is not by_id["bed-1"].sampler.source.lock
+    assert by_id["demo"].sampler.source.name == "replay"
+
+    invalid = [
+        {"stations": [{"id": "a"}, {"id": "a", "sensor": {"backend": "replay", "path": "x.npy"}}]},
+        {"stations": [{"id": "a", "sensor": {"bus": 1}}, {"id": "b", "sensor": {"bus": 1}}]},
+        {"stations": [{"id": "a", "sensor": {"bus": 1, "mux_address": "0x70"}}]},
+        {"stations": [{"id": "a", "sensor": {"backend": "spi"}}]},
+        {"stasiun": []},
+    ]
+    for spec in invalid:
+        with pytest.raises(ValueError):
+            parse_stations(spec)
+
+
+def test_requests_read_their_own_station(tmp_path, monkeypatch):
+    for name, hr in (("a", 72), ("b", 131)):
+        rows = "\n".join(f"{t},38.{t % 2},{hr},{95 - t % 2}" for t in range(5))
+        (tmp_path / f"{name}.csv").write_text("t,temperature,heart_rate,spo2\n" + rows + "\n")
+    (tmp_path / "stations.json").write_text(json.dumps({"stations": [
+        {"id": "bed-a", "patient_id": "P-A", "sensor": {"backend": "replay", "path": "a.csv", "speed": 0}},
+        {"id": "bed-b", "sensor": {"backend": "replay", "path": "b.csv", "speed": 0}},
+    ]}))
+    registry = StationRegistry()
+    assert registry.load(tmp_path / "stations.json") == 2
+    monkeypatch.setattr(main, "station_registry", registry)
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(SENSOR_READING))
+    client = TestClient(main.app)
+    try:
+        registry.start()
+        assert client.post("/analyze", json={"stationId": "bed-a"}).json()["healthData"]["heartRate"] == 72
+        body = client.post("/analyze", json={"stationId": "bed-b"}).json()
+        assert body["healthData"]["heartRate"] == 131 and body["healthData"]["is_simulated"] is True
+        assert client.post("/analyze", json={"stationId": "bed-x"}).status_code == 404
+        assert client.post("/analyze", json={}).json()["healthData"]["heartRate"] == 75
+
+        stations = client.get("/stations").json()["stations"]
+        assert stations["bed-a"]["patient_id"] == "P-A"
+        assert stations["bed-b"]["sensor"]["running"] is True
+    finally:
+        registry.stop()
+
+
+if __name__ == "__main__":
+    import tempfile
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with tempfile.TemporaryDirectory() as tmp, pytest.MonkeyPatch.context() as mp:
+                if name == "test_requests_read_their_own_station":
+                    fn(Path(tmp), mp)
+                else:
+                    fn()
+            print(f"✅ {name}")
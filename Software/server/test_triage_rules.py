@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Test parity aturan triase: /analyze/batch (NumPy) vs jalur satu record
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import triage_rules
+from triage_rules import RulesWatcher, evaluate_vitals, get_rules, triage_batch
+
+
+def random_records(n: int = 2000, seed: int = 42):
+    """Record acak termasuk nilai batas, nilai kosong dan heart rate 0"""
+    rng = random.Random(seed)
+
+    def pick(values, low, high, digits=None):
+        if rng.random() < 0.3:
+            return rng.choice(values)
+        value = rng.uniform(low, high)
+        return round(value, digits) if digits else int(value)
+
+    records = []
+    for _ in range(n):
+        bp = None
+        if rng.random() > 0.15:
+            bp = {
+                "systolic": pick([0, 139, 140, 179, 180], 80, 200),
+                "diastolic": pick([0, 89, 90, 119, 120], 50, 130)
+            }
+        records.append({
+            "temperature": pick([None, 37.4, 37.5, 37.9, 38.0], 35.0, 40.0, 1),
+            "spo2": pick([None, 89, 90, 94, 95], 80, 100),
+            "heartRate": pick([None, 0, 49, 50, 120, 121], 35, 160),
+            "bloodPressure": bp,
+            "respiratoryRate": pick([None], 10, 30)
+        })
+    return records
+
+
+def single_record_result(record):
+    sensor_reading = {
+        "temperature": record["temperature"],
+        "spo2": record["spo2"],
+        "heartRate": record["heartRate"],
+        "bloodPressure": record["bloodPressure"],
+        "respiratoryRate": record["respiratoryRate"],
+    }
+    health_data = main._build_response(sensor_reading, None).healthData
+    return {key: health_data[key] for key in ("status", "riskLevel", "symptoms", "message")}
+
+
+def test_batch_matches_single_record_path():
+    records = random_records()
+    batch = triage_batch(main.BATCH_RECORDS.validate_python(records))
+    assert len(batch) == len(records)
+    for record, result in zip(records, batch):
+        assert result == single_record_result(record), record
+
+
+def test_known_cases():
+    assert evaluate_vitals(36.8, 98, 72, {"systolic": 120, "diastolic": 80}) == ([], "LOW")
+    assert evaluate_vitals(39.2, 88, 130, {"systolic": 170, "diastolic": 110}) == (
+        ["Demam Tinggi", "Hipoksemia Berat", "Takikardia", "Hipertensi"], "CRITICAL")
+    assert evaluate_vitals(37.6, 96, 45, None) == (["Demam", "Bradikardia"], "MEDIUM")
+    assert evaluate_vitals(36.5, 97, 0, {"systolic": 185, "diastolic": 0}) == (["Hipertensi Kritis"], "CRITICAL")
+
+
+def test_hot_reload_swaps_table(tmp_path):
+    spec = json.loads(triage_rules.RULES_PATH.read_text(encoding="utf-8"))
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(spec), encoding="utf-8")
+    watcher = RulesWatcher(path)
+    original = get_rules()
+    try:
+        # Ambang demam diturunkan -> 37.2 menjadi "Demam"
+        spec["version"] = 2
+        spec["vital_rules"][0]["tiers"][1]["any"][0][2] = 37.0
+        path.write_text(json.dumps(spec), encoding="utf-8")
+        os.utime(path, (time.time() + 5, time.time() + 5))
+        assert watcher.check()
+        assert get_rules().version == 2
+        assert evaluate_vitals(37.2, 98, 72, None) == (["Demam"], "MEDIUM")
+
+        # Konfigurasi rusak tidak menggantikan tabel aktif
+        path.write_text("{ rusak", encoding="utf-8")
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        assert not watcher.check()
+        assert get_rules().version == 2
+    finally:
+        triage_rules._active_rules = original
+
+
+def test_vision_risk_merges_by_compiled_rank():
+    spec = json.loads(triage_rules.RULES_PATH.read_text(encoding="utf-8"))
+    # Level tambahan di antara HIGH dan CRITICAL
+    spec["risk_levels"] = ["LOW", "MEDIUM", "HIGH", "SEVERE", "CRITICAL"]
+    spec["outcomes"]["SEVERE"] = {"status": "KRITIS", "message": "Berat", "recommendations": []}
+    spec["vision_outcomes"]["SEVERE"] = spec["vision_outcomes"]["HIGH"]
+    original = get_rules()
+    sensor_reading = {"temperature": 36.8, "spo2": 92, "heartRate": 75,
+                      "bloodPressure": None, "respiratoryRate": None}
+
+    def merged(vision_risk):
+        vision = {"overall_analysis": {"risk_level": vision_risk, "symptoms": [], "recommendations": []}}
+        return main._build_payload(sensor_reading, vision)["healthData"]
+
+    try:
+        triage_rules._active_rules = triage_rules.compile_rules(spec)
+        assert evaluate_vitals(36.8, 92, 75, None)[1] == "HIGH"
+        assert merged("SEVERE")["riskLevel"] == "SEVERE" and merged("SEVERE")["message"] == "Berat"
+        assert merged("MEDIUM")["riskLevel"] == "HIGH"
+        # Level visual yang tidak dikenal tabel aturan tidak menaikkan risiko
+        assert merged("UNKNOWN")["riskLevel"] == "HIGH"
+    finally:
+        triage_rules._active_rules = original
+
+
+def test_batch_endpoint_json_and_ndjson():
+    records = random_records(200, seed=7)
+    expected = [single_record_result(r) for r in records]
+    client = TestClient(main.app)
+
+    response = client.post("/analyze/batch", json=records)
+    assert response.status_code == 200
+    assert response.json() == {"count": len(records), "results": expected}
+
+    ndjson = "\n".join(json.dumps(r) for r in records)
+    response = client.post("/analyze/batch", content=ndjson,
+                           headers={"content-type": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.json()["results"] == expected
+
+
+def test_batch_endpoint_rejects_invalid_body():
+    client = TestClient(main.app)
+    assert client.post("/analyze/batch", json={"temperature": 37.0}).status_code == 400
+    assert client.post("/analyze/batch", json=[{"spo2": "abc"}]).status_code == 422
+    assert client.post("/analyze/batch", json=[]).json() == {"count": 0, "results": []}
+
+
+def test_large_batch_is_parsed_off_the_event_loop(monkeypatch):
+    records = random_records(100000, seed=11)
+    body = json.dumps(records)
+    loop_threads, validate_threads = set(), set()
+
+    class RecordingAdapter:
+        def validate_python(self, value):
+            validate_threads.add(threading.get_ident())
+            return adapter.validate_python(value)
+
+    adapter = main.BATCH_RECORDS
+    monkeypatch.setattr(main, "BATCH_RECORDS", RecordingAdapter())
+
+    async def run():
+        loop_threads.add(threading.get_ident())
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+            batch = asyncio.create_task(client.post("/analyze/batch", content=body,
+                                                    headers={"content-type": "application/json"}))
+            # Event loop tetap melayani request lain selama parse + validasi
+            gaps = []
+            while not batch.done():
+                start = time.perf_counter()
+                assert (await client.get("/")).status_code == 200
+                gaps.append(time.perf_counter() - start)
+            return await batch, gaps
+
+    response, gaps = asyncio.run(run())
+    assert response.status_code == 200
+    result = response.json()
+    assert result["count"] == len(records)
+    assert result["results"][:50] == [single_record_result(r) for r in records[:50]]
+    # Validasi berjalan di thread executor, loop sempat melayani request lain
+    assert validate_threads and not validate_threads & loop_threads
+    assert len(gaps) > 3
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            if name == "test_hot_reload_swaps_table":
+                with tempfile.TemporaryDirectory() as tmp:
+                    fn(Path(tmp))
+            elif name == "test_large_batch_is_parsed_off_the_event_loop":
+                with pytest.MonkeyPatch.context() as mp:
+                    fn(mp)
+            else:
+                fn()
+            print(f"✅ {name}")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Test antrian prioritas vision: urutan risiko lalu waktu datang, batas
+kapasitas (tolak/gusur) dan 429 + Retry-After di endpoint
+"""
+import threading
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import vision_scheduler
+from vision_scheduler import QueueFullError, VisionScheduler
+
+RANK = {"LOW": 0, "MEDIUM": 1, "HIGH": 2, "CRITICAL": 3}
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False
+}
+
+
+def blocked_scheduler(**kwargs):
+    """Scheduler dengan satu worker yang ditahan sampai gate.set()"""
+    scheduler = VisionScheduler(workers=1, **kwargs)
+    gate, started = threading.Event(), threading.Event()
+    scheduler.submit(lambda: (started.set(), gate.wait(10)), priority=99, label="GATE")
+    assert started.wait(5)
+    return scheduler, gate
+
+
+def submit(scheduler, order, name, risk):
+    return scheduler.submit(order.append, name, priority=RANK[risk], label=risk)
+
+
+def test_runs_by_risk_then_arrival():
+    scheduler, gate = blocked_scheduler(capacity=10)
+    order = []
+    try:
+        futures = [submit(scheduler, order, name, risk) for name, risk in
+                   (("a", "LOW"), ("b", "HIGH"), ("c", "CRITICAL"), ("d", "LOW"), ("e", "MEDIUM"), ("f", "HIGH"))]
+        stats = scheduler.stats()
+        assert stats["depth"] == 6 and stats["depth_by_risk"] == {"LOW": 2, "HIGH": 2, "CRITICAL": 1, "MEDIUM": 1}
+        gate.set()
+        for future in futures:
+            future.result(5)
+        assert order == ["c", "b", "f", "e", "a", "d"]
+        stats = scheduler.stats()
+        assert stats["completed"] == 7 and stats["depth"] == 0 and stats["wait_ms_p95"] > 0
+    finally:
+        gate.set()
+        scheduler.close()
+
+
+def test_full_queue_rejects_or_evicts_lowest():
+    scheduler, gate = blocked_scheduler(capacity=2)
+    order = []
+    try:
+        low_a = submit(scheduler, order, "a", "LOW")
+        low_b = submit(scheduler, order, "b", "LOW")
+        with pytest.raises(QueueFullError) as error:
+            submit(scheduler, order, "c", "LOW")
+        assert error.value.retry_after_s >= 1
+
+        # CRITICAL menggusur LOW yang paling baru datang
+        critical = submit(scheduler, order, "d", "CRITICAL")
+        with pytest.raises(QueueFullError):
+            low_b.result(1)
+        # Pekerjaan yang dibatalkan (client pergi) tidak menahan slot
+        low_a.cancel()
+        high = submit(scheduler, order, "e", "HIGH")
+        gate.set()
+        critical.result(5), high.result(5)
+        assert order == ["d", "e"]
+        stats = scheduler.stats()
+        assert (stats["rejected"], stats["evicted"]) == (1, 1)
+    finally:
+        gate.set()
+        scheduler.close()
+
+    # Setelah close scheduler bisa dipakai lagi
+    assert scheduler.submit(sum, [1, 2]).result(5) == 3
+    scheduler.close()
+
+
+def test_evicted_job_cancelled_by_its_client(monkeypatch):
+    scheduler, gate = blocked_scheduler(capacity=1)
+    order = []
+    try:
+        low = submit(scheduler, order, "a", "LOW")
+        inc = vision_scheduler.VISION_REJECTED.inc
+
+        def cancel_then_count(**labels):
+            # Client LOW batal (timeout/disconnect) tepat setelah digusur
+            low.cancel()
+            inc(**labels)
+
+        monkeypatch.setattr(vision_scheduler.VISION_REJECTED, "inc", cancel_then_count)
+        critical = submit(scheduler, order, "b", "CRITICAL")
+        assert low.cancelled()
+        gate.set()
+        critical.result(5)
+        assert order == ["b"]
+    finally:
+        gate.set()
+        scheduler.close()
+
+
+def test_analyze_returns_429_when_vision_queue_full(monkeypatch):
+    scheduler, gate = blocked_scheduler(capacity=1)
+    monkeypatch.setattr(main, "vision_scheduler", scheduler)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    readings = {"reading": dict(SENSOR_READING)}
+    monkeypatch.setattr(main, "get_sensor_data", lambda: dict(readings["reading"]))
+    frames = []
+    monkeypatch.setattr(main, "analyze_health_image_bytes",
+                        lambda image, station_id: frames.append(image) or {"overall_analysis": None})
+    client = TestClient(main.app)
+    image = cv2.imencode('.jpg', np.full((64, 64, 3), 90, np.uint8))[1].tobytes()
+    headers = {"content-type": "application/octet-stream"}
+    try:
+        queued = scheduler.submit(lambda: None, priority=RANK["MEDIUM"], label="MEDIUM")
+        response = client.post("/analyze/image", content=image, headers=headers)
+        assert response.status_code == 429
+        assert int(response.headers["retry-after"]) >= 1
+
+        stats = client.get("/inference/stats").json()["scheduler"]
+        assert stats["depth"] == 1 and stats["rejected"] == 1
+        metrics = client.get("/metrics").text
+        assert "triage_vision_queue_depth 1" in metrics
+        assert 'triage_vision_rejected_total{reason="full",risk="LOW"}' in metrics
+
+        # Tanda vital CRITICAL menggusur pekerjaan MEDIUM dan lolos
+        readings["reading"] = {**SENSOR_READING, "spo2": 82, "heartRate": 150}
+
+        def release():
+            with pytest.raises(QueueFullError):
+                queued.result(5)
+            gate.set()
+
+        releaser = threading.Thread(target=release)
+        releaser.start()
+        response = client.post("/analyze/image", content=image, headers=headers)
+        releaser.join()
+        assert response.status_code == 200
+        assert response.json()["healthData"]["riskLevel"] == "CRITICAL"
+        assert frames == [image]
+    finally:
+        gate.set()
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with pytest.MonkeyPatch.context() as mp:
+                if name in ("test_evicted_job_cancelled_by_its_client",
+                            "test_analyze_returns_429_when_vision_queue_full"):
+                    fn(mp)
+                else:
+                    fn()
+            print(f"✅ {name}")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test WebSocket /ws/triage: push vitals, triage hanya saat berubah, transisi
+error sensor, frame yang dibuang saat analisis visual berjalan, umur hasil
+visual dan close 4404 untuk station yang tidak terdaftar
+"""
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from stations import Station, StationRegistry
+from vision_scheduler import VisionScheduler
+
+SENSOR_READING = {
+    "temperature": 36.8, "spo2": 98, "heartRate": 75,
+    "bloodPressure": None, "respiratoryRate": None, "is_simulated": False, "sampled_at": 1
+}
+VISION_DISTRESS = {
+    "overall_analysis": {
+        "status": "WARNING",
+        "risk_level": "HIGH",
+        "symptoms": ["Tanda distress terdeteksi"],
+        "recommendations": [],
+        "detected_conditions": ["distress_signs"],
+    },
+    "tier": "full",
+}
+
+
+class FakeSensor:
+    """Sensor palsu untuk push loop: snapshot tetap atau RuntimeError"""
+
+    def __init__(self):
+        self.reading = dict(SENSOR_READING)
+        self.error = None
+
+    def __call__(self):
+        if self.error is not None:
+            raise RuntimeError(self.error)
+        return dict(self.reading)
+
+
+def fake_sensor(monkeypatch) -> FakeSensor:
+    """Pasang sensor palsu dan interval push pendek"""
+    fake = FakeSensor()
+    monkeypatch.setattr(main, "get_sensor_data", fake)
+    monkeypatch.setattr("config.WS_PUSH_INTERVAL_S", 0.02)
+    monkeypatch.setattr("config.LATENCY_BUDGET_MS", 0)
+    return fake
+
+
+def test_pushes_vitals_and_changed_triage_only(monkeypatch):
+    sensor = fake_sensor(monkeypatch)
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/triage") as ws:
+        vitals = ws.receive_json()
+        assert vitals["type"] == "vitals" and vitals["heartRate"] == 75 and vitals["sampled_at"] == 1
+        triage = ws.receive_json()
+        assert triage["type"] == "triage" and triage["healthData"]["riskLevel"] == "LOW"
+
+        # Sampel baru dengan hasil triase sama: hanya vitals
+        for sampled_at in (2, 3):
+            sensor.reading = {**sensor.reading, "sampled_at": sampled_at}
+            message = ws.receive_json()
+            assert message["type"] == "vitals" and message["sampled_at"] == sampled_at
+
+        sensor.reading = {**sensor.reading, "spo2": 85, "heartRate": 135, "sampled_at": 4}
+        assert ws.receive_json()["type"] == "vitals"
+        triage = ws.receive_json()
+        assert triage["type"] == "triage" and triage["healthData"]["riskLevel"] != "LOW"
+
+
+def test_sensor_error_is_sent_once_per_transition(monkeypatch):
+    sensor = fake_sensor(monkeypatch)
+    sensor.error = "Sensor Suhu (MLX90614) tidak terdeteksi"
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/triage") as ws:
+        error = ws.receive_json()
+        assert error == {"type": "error", "detail": "Hardware Sensor Error: Sensor Suhu (MLX90614) tidak terdeteksi"}
+        time.sleep(0.1)
+
+        # Pulih: vitals lalu triage, tanpa pesan error kedua
+        sensor.error = None
+        assert ws.receive_json()["type"] == "vitals"
+        assert ws.receive_json()["type"] == "triage"
+
+        # Error lagi lalu pulih dengan sampel yang sama: triage dikirim ulang
+        sensor.error = "jari tidak terdeteksi"
+        assert ws.receive_json()["type"] == "error"
+        sensor.error = None
+        assert ws.receive_json()["type"] == "triage"
+
+
+def test_frames_dropped_while_vision_busy_and_result_expires(monkeypatch):
+    fake_sensor(monkeypatch)
+    scheduler = VisionScheduler(workers=2, capacity=8)
+    monkeypatch.setattr(main, "vision_scheduler", scheduler)
+    monkeypatch.setattr(main, "YOLO_AVAILABLE", True)
+    monkeypatch.setattr("config.WS_VISION_MAX_AGE_S", 0.5)
+    frames = []
+    started, release = threading.Event(), threading.Event()
+
+    def fake_vision(image, station_id):
+        frames.append((bytes(image), station_id))
+        started.set()
+        assert release.wait(5)
+        return VISION_DISTRESS
+
+    monkeypatch.setattr(main, "analyze_health_image_bytes", fake_vision)
+    client = TestClient(main.app)
+    try:
+        with client.websocket_connect("/ws/triage?station=bed-1") as ws:
+            assert ws.receive_json()["type"] == "vitals"
+            assert ws.receive_json()["healthData"]["analysis_method"] == "sensor hardware only"
+
+            ws.send_bytes(b"frame-1")
+            assert started.wait(5)
+            # Analisis frame-1 masih berjalan: frame berikutnya dibuang
+            ws.send_bytes(b"frame-2")
+            ws.send_bytes(b"frame-3")
+            time.sleep(0.2)
+            release.set()
+
+            triage = ws.receive_json()
+            assert triage["type"] == "triage"
+            assert triage["healthData"]["riskLevel"] == "HIGH"
+            assert "Tanda distress terdeteksi" in triage["healthData"]["symptoms"]
+            assert triage["healthData"]["analysis_method"] == "sensor hardware + vision"
+            assert frames == [(b"frame-1", "bed-1")]
+
+            # Tanpa frame baru hasil visual kedaluwarsa: kembali sensor saja
+            triage = ws.receive_json()
+            assert triage["healthData"]["riskLevel"] == "LOW"
+            assert triage["healthData"]["analysis_method"] == "sensor hardware only"
+
+            # Analisis sudah selesai: frame baru diproses lagi
+            ws.send_bytes(b"frame-4")
+            assert ws.receive_json()["healthData"]["riskLevel"] == "HIGH"
+            assert [frame for frame, _ in frames] == [b"frame-1", b"frame-4"]
+    finally:
+        release.set()
+        scheduler.close()
+
+
+def test_unknown_station_is_closed_with_4404(monkeypatch):
+    fake_sensor(monkeypatch)
+    registry = StationRegistry()
+    registry.stations = {"bed-a": Station("bed-a", sampler=None)}
+    monkeypatch.setattr(main, "station_registry", registry)
+    client = TestClient(main.app)
+    with pytest.raises(WebSocketDisconnect) as error:
+        with client.websocket_connect("/ws/triage?station=bed-x") as ws:
+            ws.receive_json()
+    assert error.value.code == 4404
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            with pytest.MonkeyPatch.context() as mp:
+                fn(mp)
+            print(f"✅ {name}")
@@ -7,6 +7,7 @@ dari gambar/video kamera.
 """
 
 import os
+import shutil
 import yaml
 from pathlib import Path
 import torch
@@ -106,6 +107,26 @@ def train_yolo_model():
         print(" Pastikan dataset sudah ada di folder datasets/")
         return None
 
+def export_onnx_model(model_path='models/health_triage_yolo.pt', imgsz=640):
+    """
+    Export model ke ONNX untuk backend inferensi onnxruntime/openvino
+
+    File .onnx ditulis di sebelah file .pt (models/health_triage_yolo.onnx).
+    Batch dan ukuran input dibuat dinamis supaya bisa dipakai micro-batching.
+    """
+    print(" Export model ke ONNX...")
+    try:
+        model = YOLO(model_path)
+        exported = Path(model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True))
+        target = Path(model_path).with_suffix('.onnx')
+        if exported.resolve() != target.resolve():
+            shutil.move(str(exported), str(target))
+        print(f"✅ Model ONNX disimpan sebagai: {target}")
+        return target
+    except Exception as e:
+        print(f" Error during ONNX export: {e}")
+        return None
+
 def main():
     """Main function"""
     print(" YOLOv11 Health Triage Training Script")
@@ -129,6 +150,7 @@ def main():
     results = train_yolo_model()
 
     if results:
+        export_onnx_model()
         print("\n🎉 Training berhasil!")
         print(" Hasil training tersimpan di folder 'models/'")
         print(" Model siap digunakan untuk inferensi kesehatan")
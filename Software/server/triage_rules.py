@@ -0,0 +1,349 @@
+"""
+Aturan triase (tanda vital + kondisi visual YOLO).
+
+Aturan didefinisikan secara deklaratif di triage_rules.json dan dikompilasi
+sekali menjadi tabel immutable (tuple, MappingProxyType, string yang
+di-intern). File dipantau oleh RulesWatcher; perubahan dikompilasi ulang
+lalu tabel aktif ditukar secara atomik tanpa restart server.
+
+Evaluasi tanda vital punya dua jalur dengan hasil identik:
+- evaluate_vitals(): satu record (dipakai /analyze dan /ws/triage)
+- evaluate_vitals_batch(): ribuan record sekaligus sebagai operasi array
+  NumPy (dipakai /analyze/batch)
+"""
+
+import json
+import logging
+import operator
+import sys
+import threading
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Field tanda vital yang boleh dipakai di aturan, index = posisi kolom
+VITAL_FIELDS = ('temperature', 'spo2', 'heart_rate', 'systolic', 'diastolic')
+
+OPERATORS = MappingProxyType({
+    '>=': operator.ge,
+    '>': operator.gt,
+    '<=': operator.le,
+    '<': operator.lt,
+})
+
+
+class Condition(NamedTuple):
+    field: int       # index ke VITAL_FIELDS
+    op: Any          # fungsi operator (bekerja untuk skalar dan array NumPy)
+    threshold: float
+
+
+class VitalTier(NamedTuple):
+    conditions: Tuple[Condition, ...]  # terpenuhi jika salah satu benar
+    symptom: str
+    risk: int
+
+
+class TriageOutcome(NamedTuple):
+    status: str
+    message: str
+    recommendations: Tuple[str, ...]
+
+
+class VisionCondition(NamedTuple):
+    condition: str
+    severity: str
+    severity_rank: int
+    symptoms: Tuple[str, ...]
+    recommendations: Tuple[str, ...]
+
+
+class CompiledRules(NamedTuple):
+    version: Any
+    source: str
+    risk_levels: Tuple[str, ...]
+    risk_rank: Mapping[str, int]
+    outcomes: Mapping[str, TriageOutcome]
+    zero_is_missing: Tuple[int, ...]
+    # Grup aturan; di dalam grup, tier pertama yang cocok yang dipakai
+    groups: Tuple[Tuple[VitalTier, ...], ...]
+    # Semua tier berurutan (urutan kolom mask gejala di jalur batch)
+    tiers: Tuple[VitalTier, ...]
+    symptoms: Tuple[str, ...]
+    vision_outcomes: Mapping[str, Tuple[str, str]]
+    vision_conditions: Mapping[str, VisionCondition]
+
+
+def _strings(values: Sequence[str]) -> Tuple[str, ...]:
+    return tuple(sys.intern(str(v)) for v in values)
+
+
+def compile_rules(spec: Dict[str, Any], source: str = "<dict>") -> CompiledRules:
+    """
+    Kompilasi konfigurasi aturan menjadi tabel lookup immutable
+
+    Raise ValueError jika konfigurasi tidak valid.
+    """
+    try:
+        risk_levels = _strings(spec['risk_levels'])
+        risk_rank = MappingProxyType({level: i for i, level in enumerate(risk_levels)})
+
+        outcomes = MappingProxyType({
+            sys.intern(level): TriageOutcome(
+                sys.intern(spec['outcomes'][level]['status']),
+                sys.intern(spec['outcomes'][level]['message']),
+                _strings(spec['outcomes'][level]['recommendations'])
+            )
+            for level in risk_levels
+        })
+
+        groups = []
+        for group in spec['vital_rules']:
+            tiers = []
+            for tier in group['tiers']:
+                conditions = tuple(
+                    Condition(VITAL_FIELDS.index(field), OPERATORS[op], float(threshold))
+                    for field, op, threshold in tier['any']
+                )
+                if not conditions:
+                    raise ValueError(f"Tier '{tier.get('symptom')}' tidak punya kondisi")
+                tiers.append(VitalTier(conditions, sys.intern(tier['symptom']), risk_rank[tier['risk']]))
+            groups.append(tuple(tiers))
+        all_tiers = tuple(tier for group in groups for tier in group)
+
+        vision_outcomes = MappingProxyType({
+            level: (sys.intern(spec['vision_outcomes'][level]['status']),
+                    sys.intern(spec['vision_outcomes'][level]['message']))
+            for level in risk_levels
+        })
+
+        vision_conditions = MappingProxyType({
+            sys.intern(name): VisionCondition(
+                sys.intern(entry['condition']),
+                risk_levels[risk_rank[entry['severity']]],
+                risk_rank[entry['severity']],
+                _strings(entry.get('symptoms', [])),
+                _strings(entry.get('recommendations', []))
+            )
+            for name, entry in spec['vision_conditions'].items()
+        })
+
+        return CompiledRules(
+            version=spec.get('version'),
+            source=source,
+            risk_levels=risk_levels,
+            risk_rank=risk_rank,
+            outcomes=outcomes,
+            zero_is_missing=tuple(VITAL_FIELDS.index(f) for f in spec.get('zero_is_missing', [])),
+            groups=tuple(groups),
+            tiers=all_tiers,
+            symptoms=tuple(tier.symptom for tier in all_tiers),
+            vision_outcomes=vision_outcomes,
+            vision_conditions=vision_conditions
+        )
+    except (KeyError, TypeError, IndexError) as e:
+        raise ValueError(f"Konfigurasi aturan tidak valid ({source}): {e!r}")
+    except ValueError as e:
+        raise ValueError(f"Konfigurasi aturan tidak valid ({source}): {e}")
+
+
+def load_rules(path: Path) -> CompiledRules:
+    """Baca dan kompilasi file aturan JSON"""
+    with open(path, encoding='utf-8') as f:
+        spec = json.load(f)
+    return compile_rules(spec, source=str(path))
+
+
+RULES_PATH = Path(config.RULES_PATH)
+if not RULES_PATH.is_absolute():
+    RULES_PATH = Path(__file__).resolve().parent / RULES_PATH
+
+# Tabel aktif. Hanya ditukar dengan satu assignment (atomik), pembaca cukup
+# mengambil referensinya lewat get_rules().
+_active_rules: CompiledRules = load_rules(RULES_PATH)
+
+
+def get_rules() -> CompiledRules:
+    """Tabel aturan yang sedang aktif"""
+    return _active_rules
+
+
+def reload_rules(path: Optional[Path] = None) -> CompiledRules:
+    """Kompilasi ulang file aturan lalu tukar tabel aktif"""
+    global _active_rules
+    rules = load_rules(path or RULES_PATH)
+    _active_rules = rules
+    return rules
+
+
+class RulesWatcher:
+    """Thread yang memantau mtime file aturan dan memuat ulang jika berubah"""
+
+    def __init__(self, path: Path, interval_s: float = 2.0):
+        self.path = path
+        self.interval = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._mtime = self._current_mtime()
+
+    def _current_mtime(self) -> Optional[float]:
+        try:
+            return self.path.stat().st_mtime
+        except OSError:
+            return None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="rules-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def check(self) -> bool:
+        """Muat ulang jika file berubah. Return True jika tabel ditukar."""
+        mtime = self._current_mtime()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            rules = reload_rules(self.path)
+        except (OSError, ValueError) as e:
+            # Konfigurasi rusak: tetap pakai tabel lama
+            logger.warning("Gagal memuat ulang aturan triase, tetap memakai versi lama: %s", e)
+            return False
+        logger.info("Aturan triase dimuat ulang (versi %s) dari %s", rules.version, self.path)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+
+rules_watcher = RulesWatcher(RULES_PATH, interval_s=config.RULES_RELOAD_INTERVAL_S)
+
+
+def evaluate_vitals(temperature: Optional[float],
+                    spo2: Optional[float],
+                    heart_rate: Optional[float],
+                    blood_pressure: Optional[Dict[str, Any]],
+                    rules: Optional[CompiledRules] = None) -> Tuple[List[str], str]:
+    """
+    Evaluasi aturan tanda vital untuk satu record
+
+    Returns:
+        (daftar gejala, risk level)
+    """
+    rules = rules or _active_rules
+    blood_pressure = blood_pressure or {}
+    values = [temperature, spo2, heart_rate,
+              blood_pressure.get('systolic'), blood_pressure.get('diastolic')]
+    for field in rules.zero_is_missing:
+        if not values[field]:
+            values[field] = None
+
+    symptoms: List[str] = []
+    risk = 0
+    for group in rules.groups:
+        for tier in group:
+            if any(values[c.field] is not None and c.op(values[c.field], c.threshold) for c in tier.conditions):
+                symptoms.append(tier.symptom)
+                # Setiap aturan hanya bisa menaikkan risk
+                if tier.risk > risk:
+                    risk = tier.risk
+                break
+
+    return symptoms, rules.risk_levels[risk]
+
+
+def evaluate_vitals_batch(temperature: np.ndarray,
+                          spo2: np.ndarray,
+                          heart_rate: np.ndarray,
+                          systolic: np.ndarray,
+                          diastolic: np.ndarray,
+                          rules: Optional[CompiledRules] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluasi aturan tanda vital untuk banyak record sekaligus
+
+    Nilai yang tidak ada diisi NaN (perbandingan dengan NaN selalu False,
+    sama seperti aturan yang dilewati di evaluate_vitals).
+
+    Returns:
+        (kode risk per record (int8, index ke rules.risk_levels),
+         mask gejala (n, len(rules.symptoms)) sesuai urutan rules.symptoms)
+    """
+    rules = rules or _active_rules
+    columns = [temperature, spo2, heart_rate, systolic, diastolic]
+    for field in rules.zero_is_missing:
+        columns[field] = np.where(columns[field] == 0, np.nan, columns[field])
+
+    n = len(temperature)
+    mask = np.zeros((n, len(rules.tiers)), dtype=bool)
+    risk = np.zeros(n, dtype=np.int8)
+    column = 0
+    with np.errstate(invalid='ignore'):
+        for group in rules.groups:
+            matched = np.zeros(n, dtype=bool)
+            for tier in group:
+                hit = np.zeros(n, dtype=bool)
+                for c in tier.conditions:
+                    hit |= c.op(columns[c.field], c.threshold)
+                hit &= ~matched
+                matched |= hit
+                mask[:, column] = hit
+                np.maximum(risk, np.where(hit, tier.risk, 0).astype(np.int8), out=risk)
+                column += 1
+    return risk, mask
+
+
+def triage_batch(records: Sequence[Any]) -> List[Dict[str, Any]]:
+    """
+    Skor ulang banyak record berbentuk AnalyzeRequest
+
+    Returns:
+        List hasil per record: status, riskLevel, symptoms, message
+    """
+    rules = _active_rules
+    n = len(records)
+    nan = float('nan')
+
+    def column(getter) -> np.ndarray:
+        return np.fromiter((nan if (v := getter(r)) is None else v for r in records), dtype=np.float64, count=n)
+
+    temperature = column(lambda r: r.temperature)
+    spo2 = column(lambda r: r.spo2)
+    heart_rate = column(lambda r: r.heartRate)
+    systolic = column(lambda r: r.bloodPressure.systolic if r.bloodPressure else None)
+    diastolic = column(lambda r: r.bloodPressure.diastolic if r.bloodPressure else None)
+
+    risk, mask = evaluate_vitals_batch(temperature, spo2, heart_rate, systolic, diastolic, rules=rules)
+
+    # Encode kombinasi gejala sebagai bit, lalu bangun hasil sekali per
+    # kombinasi unik (jumlahnya jauh lebih kecil dari jumlah record)
+    levels = len(rules.risk_levels)
+    codes = (mask.astype(np.int64) << np.arange(mask.shape[1])).sum(axis=1) * levels + risk
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+
+    templates = []
+    for code in unique_codes.tolist():
+        risk_level = rules.risk_levels[code % levels]
+        bits = code // levels
+        outcome = rules.outcomes[risk_level]
+        templates.append({
+            "status": outcome.status,
+            "riskLevel": risk_level,
+            "symptoms": [s for i, s in enumerate(rules.symptoms) if bits >> i & 1],
+            "message": outcome.message
+        })
+
+    return [dict(templates[i]) for i in inverse.reshape(-1).tolist()]
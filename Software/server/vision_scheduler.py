@@ -0,0 +1,211 @@
+"""
+Admission control dan antrian prioritas untuk analisis visual.
+
+Pekerjaan vision (decode + YOLO) tidak lagi langsung masuk thread pool:
+request masuk antrian terbatas yang diurutkan menurut risiko dari tanda
+vital sensor (CRITICAL dulu) lalu waktu datang, sehingga pasien darurat
+mendapat analisis visual lebih dulu saat beban tinggi.
+
+Jika antrian penuh, pekerjaan baru yang prioritasnya lebih tinggi dari
+isi antrian terendah menggusur pekerjaan terendah itu (yang terbaru di
+antara yang terendah); selain itu pekerjaan baru ditolak. Keduanya
+menghasilkan QueueFullError dengan perkiraan Retry-After (429 di main.py).
+"""
+
+import contextvars
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+import config
+from metrics import VISION_QUEUE_WAIT, VISION_REJECTED
+
+
+class QueueFullError(RuntimeError):
+    """Antrian vision penuh (ditolak saat masuk atau digusur prioritas lebih tinggi)"""
+
+    def __init__(self, message: str, retry_after_s: int):
+        super().__init__(message)
+        self.retry_after_s = retry_after_s
+
+
+class _Job(NamedTuple):
+    label: str
+    enqueued: float
+    context: contextvars.Context
+    fn: Callable[..., Any]
+    args: tuple
+    future: Future
+
+
+class VisionScheduler:
+    """Antrian prioritas terbatas + worker thread untuk pekerjaan vision"""
+
+    def __init__(self, workers: int = 4, capacity: int = 32, service_ms: float = 100.0):
+        """
+        Args:
+            workers: Jumlah thread yang menjalankan pekerjaan vision
+            capacity: Jumlah maksimum pekerjaan yang menunggu (tidak termasuk
+                yang sedang berjalan)
+            service_ms: Perkiraan awal lama satu pekerjaan (untuk Retry-After
+                sebelum ada pengukuran)
+        """
+        self.workers = max(1, workers)
+        self.capacity = max(1, capacity)
+        # Entry heap: (-prioritas, urutan datang, job)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        # Dinaikkan oleh close(): worker generasi lama berhenti
+        self._generation = 0
+
+        self._service_s = service_ms / 1000.0
+        self._waits_ms: deque = deque(maxlen=1024)
+        self._active = 0
+        self._submitted = 0
+        self._completed = 0
+        self._rejected = 0
+        self._evicted = 0
+
+    def submit(self, fn: Callable[..., Any], *args, priority: int = 0, label: str = "LOW") -> Future:
+        """
+        Antrikan fn(*args) (dijalankan dengan contextvars pemanggil)
+
+        Raise QueueFullError jika antrian penuh dan tidak ada pekerjaan
+        berprioritas lebih rendah yang bisa digusur.
+        """
+        future: Future = Future()
+        job = _Job(label, time.monotonic(), contextvars.copy_context(), fn, args, future)
+        entry = (-priority, next(self._seq), job)
+        evicted = None
+        with self._cond:
+            self._ensure_started()
+            if len(self._heap) >= self.capacity:
+                # Pekerjaan yang client-nya sudah pergi tidak menahan slot
+                self._heap = [e for e in self._heap if not e[2].future.cancelled()]
+                heapq.heapify(self._heap)
+            if len(self._heap) >= self.capacity:
+                lowest = max(self._heap)
+                if entry >= lowest:
+                    self._rejected += 1
+                    VISION_REJECTED.inc(reason="full", risk=label)
+                    raise QueueFullError("Antrian analisis visual penuh", self._retry_after())
+                self._heap.remove(lowest)
+                heapq.heapify(self._heap)
+                evicted = lowest[2]
+                self._evicted += 1
+            heapq.heappush(self._heap, entry)
+            self._submitted += 1
+            retry_after = self._retry_after()
+            self._cond.notify()
+        if evicted is not None:
+            VISION_REJECTED.inc(reason="evicted", risk=evicted.label)
+            # Client pekerjaan yang digusur bisa membatalkannya setelah lock
+            # dilepas; future yang sudah batal tidak diberi exception lagi
+            if evicted.future.set_running_or_notify_cancel():
+                evicted.future.set_exception(QueueFullError(
+                    f"Digusur pekerjaan berprioritas lebih tinggi ({label})", retry_after))
+        return future
+
+    def _retry_after(self) -> int:
+        """Perkiraan detik sampai antrian sekarang habis diproses"""
+        pending = len(self._heap) + self._active
+        return max(1, math.ceil(pending * self._service_s / self.workers))
+
+    def expected_wait_s(self, priority: int = 0) -> float:
+        """
+        Perkiraan waktu tunggu pekerjaan baru berprioritas ini: pekerjaan
+        antri yang prioritasnya >= ini dijalankan lebih dulu
+        """
+        with self._cond:
+            ahead = sum(1 for entry in self._heap if -entry[0] >= priority and not entry[2].future.cancelled())
+            busy = ahead + self._active - self.workers + 1
+            return max(0, busy) * self._service_s / self.workers
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        self._threads = [threading.Thread(target=self._run, args=(self._generation,), name=f"vision-{i}",
+                                          daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _run(self, generation: int):
+        while True:
+            with self._cond:
+                while not self._heap and generation == self._generation:
+                    self._cond.wait()
+                if generation != self._generation:
+                    return
+                _, _, job = heapq.heappop(self._heap)
+                self._active += 1
+            try:
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                waited = time.monotonic() - job.enqueued
+                VISION_QUEUE_WAIT.observe(waited, risk=job.label)
+                start = time.perf_counter()
+                try:
+                    result = job.context.run(job.fn, *job.args)
+                except BaseException as e:
+                    job.future.set_exception(e)
+                else:
+                    job.future.set_result(result)
+                elapsed = time.perf_counter() - start
+                with self._cond:
+                    self._waits_ms.append(waited * 1000.0)
+                    # EWMA lama satu pekerjaan untuk perkiraan Retry-After
+                    self._service_s += 0.2 * (elapsed - self._service_s)
+                    self._completed += 1
+            finally:
+                with self._cond:
+                    self._active -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            depth_by_risk: Dict[str, int] = {}
+            for _, _, job in self._heap:
+                depth_by_risk[job.label] = depth_by_risk.get(job.label, 0) + 1
+            waits = np.asarray(self._waits_ms)
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "depth": len(self._heap),
+                "depth_by_risk": depth_by_risk,
+                "active": self._active,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "evicted": self._evicted,
+                "wait_ms_p50": round(float(np.percentile(waits, 50)), 3) if len(waits) else 0.0,
+                "wait_ms_p95": round(float(np.percentile(waits, 95)), 3) if len(waits) else 0.0,
+                "service_ms_ewma": round(self._service_s * 1000.0, 3),
+                "retry_after_s": self._retry_after(),
+            }
+
+    def close(self, timeout: Optional[float] = 5.0):
+        """Hentikan worker; pekerjaan yang masih antri dibatalkan (bisa start lagi)"""
+        with self._cond:
+            self._generation += 1
+            pending = [job for _, _, job in self._heap]
+            self._heap = []
+            threads = self._threads
+            self._threads = []
+            self._cond.notify_all()
+        for job in pending:
+            job.future.cancel()
+        for thread in threads:
+            thread.join(timeout)
+
+
+# Global scheduler untuk /analyze, /analyze/image dan frame WebSocket
+vision_scheduler = VisionScheduler(workers=config.VISION_WORKERS, capacity=config.VISION_QUEUE_SIZE)
@@ -8,31 +8,306 @@ Class untuk menjalankan inferensi model YOLOv11 pada gambar kesehatan.
 import cv2
 import numpy as np
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, NamedTuple, Tuple, Optional
 import base64
-import io
-from PIL import Image
-
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import config
+from degradation import TIER_FULL, TIER_REDUCED, TIER_SMALL
+from inference_backends import Detections, InferenceBackend, TorchBackend, get_backend_class
+from preprocessing import PreparedFrame, decode_image, prepare_frame, scale_boxes
+from metrics import VISION_FALLBACKS, time_stage
+from motion_gate import MotionGate
+from result_cache import ResultCache, content_digest
+from triage_rules import CompiledRules, VisionCondition, get_rules
+
+logger = logging.getLogger(__name__)
+
+# Library backend (ultralytics/torch, onnxruntime, openvino) baru diimport
+# saat model dimuat di background thread, di sini hanya dicek keberadaannya
+# supaya import modul ini tetap cepat
 try:
-    from ultralytics import YOLO
-    YOLO_AVAILABLE = True
-except ImportError:
+    _backend_class = get_backend_class(config.INFERENCE_BACKEND)
+except ValueError as e:
+    # Salah ketik TRIAGE_INFERENCE_BACKEND: server tetap jalan (sensor saja),
+    # status model 'failed' dengan pesan yang sama di /health/ready
+    logger.error("Konfigurasi TRIAGE_INFERENCE_BACKEND tidak valid: %s", e)
     YOLO_AVAILABLE = False
-    print("⚠️  ultralytics tidak terinstall. Install dengan: pip install ultralytics")
+else:
+    YOLO_AVAILABLE = _backend_class.available()
+    if not YOLO_AVAILABLE:
+        logger.warning("Library backend '%s' tidak terinstall. Install dengan: pip install %s",
+                       config.INFERENCE_BACKEND, ' '.join(_backend_class.requires))
+
+class InferenceBatcher:
+    """
+    Scheduler micro-batching di depan model YOLO.
+
+    Frame dari beberapa request dikumpulkan sampai max_batch_size frame atau
+    max_wait_ms milidetik (mana yang lebih dulu), lalu dijalankan dalam satu
+    forward pass. Hasil tiap frame dikirim balik ke Future milik pemanggilnya.
+    """
+
+    def __init__(self, infer_fn, max_batch_size: int = 8, max_wait_ms: float = 15.0):
+        """
+        Args:
+            infer_fn: Callable yang menerima list gambar dan mengembalikan
+                list hasil dengan urutan yang sama
+            max_batch_size: Jumlah frame maksimum per batch
+            max_wait_ms: Waktu tunggu maksimum untuk mengisi batch
+        """
+        self.infer_fn = infer_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # Statistik batch yang tercapai
+        self._batches = 0
+        self._frames = 0
+        self._last_batch_size = 0
+        self._max_batch_seen = 0
+
+    def submit(self, image: np.ndarray) -> Future:
+        """Masukkan satu frame ke antrian. Future berisi (hasil, ukuran_batch)"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistik ukuran batch yang tercapai"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batches': self._batches,
+                'frames': self._frames,
+                'avg_batch_size': (self._frames / self._batches) if self._batches else 0.0,
+                'last_batch_size': self._last_batch_size,
+                'max_batch_seen': self._max_batch_seen,
+                'pending': self._queue.qsize()
+            }
+
+    def close(self):
+        """Hentikan worker thread (frame yang masih antri tetap diproses)"""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5.0)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="yolo-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect_batch(self, first) -> Tuple[List[Tuple[np.ndarray, Future]], bool]:
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect_batch(first)
+
+            # Buang request yang sudah dibatalkan pemanggilnya. Frame dengan
+            # ukuran input berbeda (tier reduced) tidak bisa digabung dalam
+            # satu forward pass: satu batch per ukuran.
+            groups: Dict[tuple, List[Tuple[np.ndarray, Future]]] = {}
+            for image, future in batch:
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(image.shape, []).append((image, future))
+            for group in groups.values():
+                self._run_batch(group)
+
+    def _run_batch(self, batch: List[Tuple[np.ndarray, Future]]):
+        batch_size = len(batch)
+        with self._lock:
+            self._batches += 1
+            self._frames += batch_size
+            self._last_batch_size = batch_size
+            self._max_batch_seen = max(self._max_batch_seen, batch_size)
+
+        try:
+            results = self.infer_fn([image for image, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result((result, batch_size))
+
+
+class ClassTable(NamedTuple):
+    """Lookup per class id untuk post-processing kolumnar"""
+    rules: CompiledRules
+    standard: bool
+    names: np.ndarray            # nama kelas (object) per class id
+    condition_index: np.ndarray  # class id -> index kondisi, -1 jika tidak ada
+    conditions: Tuple[VisionCondition, ...]
+    condition_names: Tuple[str, ...]
+    condition_dicts: Tuple[Dict[str, Any], ...]
+    severity_rank: np.ndarray
+
+    @classmethod
+    def build(cls, rules: CompiledRules, custom_class_names: Dict[int, str], standard: bool) -> "ClassTable":
+        if standard:
+            names = ['person_detected']
+        else:
+            size = max(custom_class_names) + 1 if custom_class_names else 0
+            names = [custom_class_names.get(i, f"class_{i}") for i in range(size)]
+
+        conditions = tuple(rules.vision_conditions.values())
+        position = {name: i for i, name in enumerate(rules.vision_conditions)}
+        return cls(
+            rules=rules,
+            standard=standard,
+            names=np.array(names, dtype=object),
+            condition_index=np.array([position.get(name, -1) for name in names], dtype=np.intp),
+            conditions=conditions,
+            condition_names=tuple(c.condition for c in conditions),
+            condition_dicts=tuple({
+                'condition': c.condition,
+                'severity': c.severity,
+                'symptoms': list(c.symptoms),
+                'recommendations': list(c.recommendations)
+            } for c in conditions),
+            severity_rank=np.array([c.severity_rank for c in conditions], dtype=np.intp)
+        )
+
+
+def format_vision(analysis: Dict[str, Any], style: str = "full") -> Dict[str, Any]:
+    """
+    Bagian `vision` response untuk client: deteksi per box ("full") atau
+    kolom array ("compact"), apa pun bentuk yang disimpan analyzer
+    """
+    detections = analysis.get('detections', [])
+    conditions = analysis.get('health_conditions', [])
+    columnar = isinstance(detections, dict)
+
+    if style == "compact" and not columnar:
+        detections = {
+            'boxes': [d['bbox'] for d in detections],
+            'scores': [d['confidence'] for d in detections],
+            'classes': [d['class'] for d in detections]
+        }
+        summary: Dict[str, Dict[str, Any]] = {}
+        for c in conditions:
+            entry = summary.setdefault(c['condition'], {'condition': c['condition'], 'severity': c['severity'],
+                                                        'count': 0, 'max_confidence': 0.0})
+            entry['count'] += 1
+            entry['max_confidence'] = max(entry['max_confidence'], c['confidence'])
+        conditions = list(summary.values())
+    elif style == "full" and columnar:
+        vision_conditions = get_rules().vision_conditions
+        full_conditions = []
+        for name, confidence in zip(detections['classes'], detections['scores']):
+            condition = vision_conditions.get(name)
+            if condition is not None:
+                full_conditions.append(YOLOHealthAnalyzer._condition_to_dict(condition, confidence))
+        detections = [
+            {'class': name, 'confidence': confidence, 'bbox': box}
+            for name, confidence, box in zip(detections['classes'], detections['scores'], detections['boxes'])
+        ]
+        conditions = full_conditions
+
+    return {
+        'format': style,
+        'model_used': analysis.get('model_used'),
+        'batch_size': analysis.get('batch_size', 0),
+        'cache_hit': analysis.get('cache_hit', False),
+        'motion_skipped': analysis.get('motion_skipped', False),
+        'detections': detections,
+        'health_conditions': conditions
+    }
+
+
+class TierModel(NamedTuple):
+    """Model yang melayani satu tier degradasi (lihat degradation.py)"""
+    tier: str
+    backend: InferenceBackend
+    imgsz: int
+    batcher: InferenceBatcher
+    fingerprint: Optional[str]  # namespace cache/motion gate
+
 
 class YOLOHealthAnalyzer:
     """Class untuk analisis kesehatan menggunakan YOLOv11"""
 
-    def __init__(self, model_path: str = "models/health_triage_yolo.pt"):
+    # Status pemuatan model
+    STATE_PENDING = "pending"
+    STATE_LOADING = "loading"
+    STATE_READY = "ready"
+    STATE_UNAVAILABLE = "unavailable"
+    STATE_FAILED = "failed"
+
+    def __init__(self, model_path: str = "models/health_triage_yolo.pt", backend: str = "torch"):
         """
-        Initialize YOLO analyzer
+        Initialize YOLO analyzer (model belum dimuat, lihat load())
         
         Args:
             model_path: Path ke model YOLO yang sudah dilatih
+            backend: Nama backend inferensi (torch, onnxruntime, openvino)
         """
         self.model_path = Path(model_path)
-        self.model = None
+        self.backend_name = backend
+        self.model: Optional[InferenceBackend] = None
         self.using_standard_model = False
+        self.state = self.STATE_PENDING
+        self.state_detail: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self._load_lock = threading.Lock()
+        self._loaded = threading.Event()
+        # Buffer input model per thread, dipakai ulang antar request
+        self._buffers = threading.local()
+        # Cache deteksi per isi gambar, di-namespace dengan fingerprint model
+        self.cache = ResultCache(config.RESULT_CACHE_SIZE, config.RESULT_CACHE_TTL_S)
+        self.model_fingerprint: Optional[str] = None
+        # Lewati inferensi untuk frame station yang scene-nya tidak berubah
+        self.motion_gate = MotionGate(
+            threshold=config.MOTION_THRESHOLD,
+            pixel_delta=config.MOTION_PIXEL_DELTA,
+            max_age_s=config.MOTION_MAX_AGE_S,
+            max_stations=config.MOTION_MAX_STATIONS
+        )
+        self.batcher = InferenceBatcher(
+            self._infer_batch,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_wait_ms=config.BATCH_MAX_WAIT_MS
+        )
+        # Model kecil/terkuantisasi untuk tier 'small' (TRIAGE_SMALL_MODEL_PATH)
+        self.small_model: Optional[InferenceBackend] = None
+        self.small_fingerprint: Optional[str] = None
+        self.small_batcher = InferenceBatcher(
+            self._infer_small_batch,
+            max_batch_size=config.BATCH_MAX_SIZE,
+            max_wait_ms=config.BATCH_MAX_WAIT_MS
+        )
         
         # Mapping kelas untuk model medis custom
         self.custom_class_names = {
@@ -48,39 +323,204 @@ class YOLOHealthAnalyzer:
         self.coco_class_names = {
             0: 'person'
         }
+        self._class_table_cache: Optional[ClassTable] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == self.STATE_READY
+
+    def status(self) -> Dict[str, Any]:
+        """Status model dan statistik batcher/cache/motion gate (readiness, /metrics)"""
+        return {
+            "state": self.state,
+            "detail": self.state_detail,
+            "load_seconds": self.load_seconds,
+            "backend": self.backend_name,
+            "batching": self.batcher.stats(),
+            "cache": {**self.cache.stats(), "model_fingerprint": self.model_fingerprint},
+            "motion_gate": self.motion_gate.stats(),
+            "tiers": self.tiers(),
+        }
 
-        if YOLO_AVAILABLE:
+    def tiers(self) -> List[str]:
+        """Tier vision yang bisa dilayani model yang dimuat, urut dari yang paling akurat"""
+        tiers = [TIER_FULL]
+        if self._reduced_imgsz() is not None:
+            tiers.append(TIER_REDUCED)
+        if self.small_model is not None:
+            tiers.append(TIER_SMALL)
+        return tiers
+
+    def _reduced_imgsz(self) -> Optional[int]:
+        """Ukuran input tier reduced (None jika model berinput tetap atau tier dimatikan)"""
+        model = self.model
+        if model is None or not model.dynamic_imgsz or not 0 < config.REDUCED_IMGSZ < model.imgsz:
+            return None
+        return config.REDUCED_IMGSZ
+
+    def _tier_model(self, tier: str) -> TierModel:
+        """Model untuk tier yang diminta; tier yang tidak tersedia dilayani tier full"""
+        small = self.small_model
+        if tier == TIER_SMALL and small is not None:
+            return TierModel(TIER_SMALL, small, small.imgsz, self.small_batcher, self.small_fingerprint)
+        if tier == TIER_REDUCED:
+            imgsz = self._reduced_imgsz()
+            if imgsz is not None:
+                return TierModel(TIER_REDUCED, self.model, imgsz, self.batcher, f"{self.model_fingerprint}@{imgsz}")
+        return TierModel(TIER_FULL, self.model, self.model.imgsz, self.batcher, self.model_fingerprint)
+
+    def start_background_load(self) -> threading.Thread:
+        """Muat dan warm-up model di background thread supaya startup server cepat"""
+        thread = threading.Thread(target=self.load, name="yolo-loader", daemon=True)
+        thread.start()
+        return thread
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Tunggu sampai proses load selesai (berhasil maupun gagal)"""
+        return self._loaded.wait(timeout)
+
+    def load(self):
+        """Import ultralytics, muat model lalu jalankan warm-up inference"""
+        with self._load_lock:
+            if self.state not in (self.STATE_PENDING, self.STATE_FAILED):
+                return
+            self.state = self.STATE_LOADING
+            start = time.time()
             try:
-                if self.model_path.exists():
-                    self.model = YOLO(str(self.model_path))
-                    print(f"✅ Model Medis Custom dimuat: {model_path}")
-                    self.using_standard_model = False
-                else:
-                    # Fallback ke model standar YOLOv8n
-                    print(f"⚠️  Model medis tidak ditemukan di {model_path}")
-                    print("   🔄 Mengunduh/Memuat model standar YOLOv8n untuk demonstrasi...")
-                    self.model = YOLO("yolov8n.pt") 
-                    self.using_standard_model = True
-                    print("✅ Model Standar (yolov8n) siap digunakan")
-                    
+                self._load_model()
             except Exception as e:
-                print(f"❌ Gagal load model: {e}")
+                logger.exception("Gagal load model: %s", e)
                 self.model = None
-        else:
-            print("⚠️  Ultralytics library tidak tersedia")
+                self.state = self.STATE_FAILED
+                self.state_detail = str(e)
+            finally:
+                self.load_seconds = time.time() - start
+                self._loaded.set()
 
-    def analyze_image(self, image_data: str) -> Dict[str, Any]:
+    def _resolve_model(self) -> Tuple[Optional[Path], bool]:
+        """
+        Tentukan file model untuk backend yang dipilih
+
+        Returns:
+            (path model atau None jika tidak tersedia, pakai model standar COCO)
+        """
+        if self.backend_name != TorchBackend.name:
+            # Backend ONNX Runtime/OpenVINO memakai artefak hasil export
+            # (train_yolo.py menulis .onnx di sebelah .pt)
+            exported = Path(config.EXPORTED_MODEL_PATH) if config.EXPORTED_MODEL_PATH else self.model_path.with_suffix('.onnx')
+            if exported.exists():
+                logger.info("Model Medis Custom (%s) ditemukan: %s", self.backend_name, exported)
+                return exported, False
+            logger.warning("Model export tidak ditemukan di %s (jalankan export di train_yolo.py)", exported)
+            self.state_detail = f"model {exported} tidak ditemukan"
+            return None, False
+
+        if self.model_path.exists():
+            return self.model_path, False
+
+        # Fallback ke model standar YOLOv8n
+        logger.warning("Model medis tidak ditemukan di %s", self.model_path)
+        fallback = Path(config.FALLBACK_MODEL)
+        if not fallback.exists() and not config.ALLOW_MODEL_DOWNLOAD:
+            logger.warning("%s tidak ada dan download model dimatikan (TRIAGE_ALLOW_MODEL_DOWNLOAD=0)", fallback)
+            self.state_detail = f"model {self.model_path} tidak ditemukan"
+            return None, False
+        logger.info("Mengunduh/Memuat model standar YOLOv8n untuk demonstrasi...")
+        return fallback, True
+
+    def _load_model(self):
+        backend_class = get_backend_class(self.backend_name)
+        if not backend_class.available():
+            logger.warning("Library untuk backend '%s' tidak tersedia (%s)", self.backend_name, ', '.join(backend_class.requires))
+            self.state = self.STATE_UNAVAILABLE
+            self.state_detail = f"{', '.join(backend_class.requires)} tidak terinstall"
+            return
+
+        model_path, using_standard_model = self._resolve_model()
+        if model_path is None:
+            self.state = self.STATE_UNAVAILABLE
+            return
+
+        backend = backend_class(model_path, conf=0.3, iou=0.5, imgsz=config.INFERENCE_IMGSZ)
+        backend.load()
+        if using_standard_model:
+            logger.info("Model Standar (yolov8n) siap digunakan")
+        else:
+            logger.info("Model Medis Custom dimuat: %s (backend %s)", model_path, backend.name)
+
+        self._warmup(backend)
+        # Model kecil hanya untuk model custom (kelasnya harus sama)
+        small_model = None if using_standard_model else self._load_small_model(backend_class)
+
+        # Hasil cache dari model/backend lain tidak boleh dipakai lagi
+        fingerprint = self._fingerprint(backend)
+        if fingerprint != self.model_fingerprint:
+            self.cache.clear()
+
+        # Model baru dipakai request setelah warm-up selesai
+        self.using_standard_model = using_standard_model
+        self.model_fingerprint = fingerprint
+        self.small_model = small_model
+        self.small_fingerprint = self._fingerprint(small_model) if small_model is not None else None
+        self.model = backend
+        self.state = self.STATE_READY
+        self.state_detail = None
+
+    def _load_small_model(self, backend_class) -> Optional[InferenceBackend]:
+        """Model tier 'small'; jika gagal dimuat, tier itu tidak tersedia"""
+        if not config.SMALL_MODEL_PATH:
+            return None
+        path = Path(config.SMALL_MODEL_PATH)
+        if not path.exists():
+            logger.warning("Model kecil %s tidak ditemukan, tier 'small' tidak tersedia", path)
+            return None
+        try:
+            backend = backend_class(path, conf=0.3, iou=0.5, imgsz=config.INFERENCE_IMGSZ)
+            backend.load()
+            self._warmup(backend)
+        except Exception as e:
+            logger.warning("Gagal load model kecil %s: %s", path, e)
+            return None
+        logger.info("Model kecil untuk tier 'small' dimuat: %s", path)
+        return backend
+
+    @staticmethod
+    def _warmup(backend: InferenceBackend):
+        """Warm-up dengan frame dummy supaya kernel/alokasi siap sebelum request pertama"""
+        dummy = np.zeros((backend.imgsz, backend.imgsz, 3), dtype=np.uint8)
+        for _ in range(max(config.WARMUP_RUNS, 0)):
+            backend.predict([dummy])
+
+    @staticmethod
+    def _fingerprint(backend: InferenceBackend) -> str:
+        """Identitas model yang dimuat: backend, file (path, mtime, ukuran) dan imgsz"""
+        try:
+            stat = backend.model_path.stat()
+            file_id = f"{backend.model_path.resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+        except OSError:
+            file_id = str(backend.model_path)
+        return f"{backend.name}:{file_id}:{backend.imgsz}"
+
+    @staticmethod
+    def _cache_key(target: TierModel, kind: str, data) -> Tuple[Optional[str], str, bytes]:
+        return target.fingerprint, kind, content_digest(data)
+
+    def analyze_image(self, image_data: str, station_id: Optional[str] = None,
+                      tier: str = TIER_FULL) -> Dict[str, Any]:
         """
         Analisis gambar menggunakan YOLOv11
         
         Args:
             image_data: Base64 encoded image string
+            station_id: ID station feed kamera (mengaktifkan motion gate)
+            tier: Tier degradasi (full, reduced, small)
             
         Returns:
             Dictionary berisi hasil analisis kesehatan
         """
         if not self.model:
-            return self._fallback_analysis()
+            return self._fallback_analysis('model_unavailable')
+        target = self._tier_model(tier)
 
         try:
             # 1. Bersihkan string base64
@@ -89,145 +529,264 @@ class YOLOHealthAnalyzer:
             else:
                 encoded = image_data
 
+            # Frame yang sama dikirim ulang: pakai hasil cache tanpa decode
+            cache_key = self._cache_key(target, 'base64', encoded)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return self._build_analysis(cached, batch_size=0, cache_hit=True, tier=target.tier)
+
             # 2. Tambahkan padding jika kurang (fix common base64 error)
             encoded += "=" * ((4 - len(encoded) % 4) % 4)
 
             # 3. Decode
-            image_bytes = base64.b64decode(encoded)
-            
-            # 4. Validasi byte gambar
+            with time_stage("base64_decode"):
+                image_bytes = base64.b64decode(encoded)
+        except Exception as e:
+            logger.warning("Error decoding base64 image: %s", e)
+            return self._fallback_analysis('base64_error')
+
+        return self._analyze_bytes(image_bytes, cache_key, target, station_id)
+
+    def analyze_image_bytes(self, image_bytes: bytes, station_id: Optional[str] = None,
+                            tier: str = TIER_FULL) -> Dict[str, Any]:
+        """
+        Analisis gambar yang sudah berupa byte terenkode (JPEG/PNG)
+
+        Byte didecode langsung dari buffer dengan cv2.imdecode tanpa
+        round-trip base64/PIL (JPEG besar langsung pada resolusi tereduksi),
+        di-letterbox ke ukuran input model, lalu box dikembalikan ke
+        koordinat gambar asli. Gambar yang sama persis dilayani dari cache;
+        frame station yang scene-nya tidak berubah memakai hasil sebelumnya.
+
+        Args:
+            image_bytes: Isi file gambar (bytes, bytearray atau memoryview)
+            station_id: ID station feed kamera (mengaktifkan motion gate)
+            tier: Tier degradasi (full, reduced, small); tier yang tidak
+                tersedia dilayani tier full (lihat 'tier' di hasil)
+
+        Returns:
+            Dictionary berisi hasil analisis kesehatan
+        """
+        if not self.model:
+            return self._fallback_analysis('model_unavailable')
+
+        target = self._tier_model(tier)
+        cache_key = self._cache_key(target, 'raw', image_bytes)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return self._build_analysis(cached, batch_size=0, cache_hit=True, tier=target.tier)
+        return self._analyze_bytes(image_bytes, cache_key, target, station_id)
+
+    def _analyze_bytes(self, image_bytes: bytes, cache_key, target: TierModel,
+                       station_id: Optional[str] = None) -> Dict[str, Any]:
+        """Decode + inferensi (cache miss), hasil disimpan ke cache"""
+        try:
+            # Validasi byte gambar
             if len(image_bytes) == 0:
-                print("❌ Error: Decoded image bytes is empty")
-                return self._fallback_analysis()
+                logger.warning("Decoded image bytes is empty")
+                return self._fallback_analysis('empty_image')
+
+            # Motion gate: bandingkan thumbnail dengan frame terakhir station
+            thumbnail = None
+            if station_id is not None and self.motion_gate.enabled:
+                thumbnail = self.motion_gate.thumbnail(image_bytes)
+                if thumbnail is not None:
+                    previous = self.motion_gate.lookup(station_id, thumbnail, target.fingerprint)
+                    if previous is not None:
+                        return {**previous, 'batch_size': 0, 'motion_skipped': True}
+
+            frame = self._preprocess(image_bytes, target.imgsz)
+            if frame is None:
+                logger.warning("Format gambar tidak dikenali")
+                return self._fallback_analysis('unsupported_format')
+
+            # Run YOLO inference (lewat micro-batching queue)
+            height, width = frame.shape
+            logger.debug("Running inference", extra={"width": width, "height": height, "reduction": frame.reduction})
+            detections, batch_size = self._infer(frame, target.batcher)
+            self.cache.put(cache_key, detections)
+
+            with time_stage("post_processing"):
+                analysis = self._build_analysis(detections, batch_size, tier=target.tier)
+            if thumbnail is not None:
+                self.motion_gate.update(station_id, thumbnail, analysis, target.fingerprint)
+            return analysis
 
-            # 5. Buka dengan PIL
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Konversi ke RGB jika perlu (misal gambar RGBA)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-                
-            image_np = np.array(image)
-
-            # Run YOLO inference
-            print(f"📸 Running inference on image size: {image.size}")
-            results = self.model(image_np, conf=0.3, iou=0.5)
-
-            # Process results
-            detections = []
-            health_conditions = []
-
-            for result in results:
-                boxes = result.boxes
-                if boxes is not None:
-                    for box in boxes:
-                        # Get bounding box coordinates
-                        x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                        confidence = float(box.conf[0].cpu().numpy())
-                        class_id = int(box.cls[0].cpu().numpy())
-                        
-                        # Tentukan nama kelas berdasarkan model yang dipakai
-                        if self.using_standard_model:
-                            # Jika model standar, kita hanya peduli 'person'
-                            if class_id == 0: 
-                                class_name = 'person_detected'
-                            else:
-                                continue # Skip objek lain (kursi, meja, dll)
-                        else:
-                            class_name = self.custom_class_names.get(class_id, f"class_{class_id}")
-
-                        detection = {
-                            'class': class_name,
-                            'confidence': confidence,
-                            'bbox': [float(x1), float(y1), float(x2), float(y2)]
-                        }
-                        detections.append(detection)
-
-                        # Map ke kondisi kesehatan
-                        health_condition = self._map_detection_to_health(class_name, confidence)
-                        if health_condition:
-                            health_conditions.append(health_condition)
-
-            # Aggregate health analysis
-            health_analysis = self._aggregate_health_analysis(health_conditions)
-            
-            # Tambahkan metadata
-            health_analysis['model_type'] = 'Standard/Demo' if self.using_standard_model else 'Medical/Custom'
+        except Exception as e:
+            logger.exception("Error in YOLO analysis: %s", e)
+            return self._fallback_analysis('error')
 
-            return {
-                'detections': detections,
-                'health_conditions': health_conditions,
-                'overall_analysis': health_analysis,
-                'model_used': 'YOLOv8n' if self.using_standard_model else 'CustomYOLO',
-                'confidence': 0.85
-            }
+    def analyze_frame(self, image: np.ndarray, station_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analisis frame BGR yang sudah didecode (mis. dari cv2.VideoCapture)
+
+        Tanpa encode/base64/decode: frame langsung di-letterbox ke buffer
+        input model. Frame station yang scene-nya tidak berubah memakai hasil
+        sebelumnya (motion gate).
+
+        Args:
+            image: Frame BGR uint8 (H, W, 3)
+            station_id: ID sumber/station (mengaktifkan motion gate)
+
+        Returns:
+            Dictionary berisi hasil analisis kesehatan
+        """
+        if not self.model:
+            return self._fallback_analysis('model_unavailable')
+
+        try:
+            thumbnail = None
+            if station_id is not None and self.motion_gate.enabled:
+                thumbnail = self.motion_gate.thumbnail_from_image(image)
+                previous = self.motion_gate.lookup(station_id, thumbnail, self.model_fingerprint)
+                if previous is not None:
+                    return {**previous, 'batch_size': 0, 'motion_skipped': True}
+
+            imgsz = self.model.imgsz
+            frame = prepare_frame(image, imgsz, out=self._input_buffer(imgsz))
+            detections, batch_size = self._infer(frame, self.batcher)
+
+            with time_stage("post_processing"):
+                analysis = self._build_analysis(detections, batch_size)
+            if thumbnail is not None:
+                self.motion_gate.update(station_id, thumbnail, analysis, self.model_fingerprint)
+            return analysis
 
         except Exception as e:
-            print(f"❌ Error in YOLO analysis: {e}")
-            return self._fallback_analysis()
+            logger.exception("Error in YOLO analysis: %s", e)
+            return self._fallback_analysis('error')
+
+    def _infer(self, frame: PreparedFrame, batcher: InferenceBatcher) -> Tuple[Detections, int]:
+        """Inferensi satu frame lewat batcher, box dikembalikan ke koordinat asli"""
+        with time_stage("yolo_inference"):
+            result, batch_size = batcher.submit(frame.image).result()
+        detections = Detections(scale_boxes(result.boxes, frame.scale, frame.pad, frame.shape),
+                                result.scores, result.classes)
+        for array in detections:
+            array.flags.writeable = False
+        return detections, batch_size
+
+    def _class_table(self) -> "ClassTable":
+        """
+        Tabel lookup per class id untuk model dan aturan yang aktif; dibangun
+        ulang hanya jika model (standar/custom) atau tabel aturan berganti
+        """
+        rules = get_rules()
+        table = self._class_table_cache
+        if table is None or table.rules is not rules or table.standard != self.using_standard_model:
+            table = ClassTable.build(rules, self.custom_class_names, self.using_standard_model)
+            self._class_table_cache = table
+        return table
+
+    def _build_analysis(self, result: Detections, batch_size: int, cache_hit: bool = False,
+                        compact: Optional[bool] = None, tier: str = TIER_FULL) -> Dict[str, Any]:
+        """
+        Susun hasil analisis dari deteksi (koordinat gambar asli)
 
-    def _map_detection_to_health(self, class_name: str, confidence: float) -> Optional[Dict[str, Any]]:
-        """Map deteksi YOLO ke kondisi kesehatan"""
-        
-        # Mapping Khusus untuk Demo dengan Model Standar
-        if class_name == 'person_detected':
-            return {
-                'condition': 'Pasien Terdeteksi',
-                'severity': 'LOW',
-                'symptoms': ['Kehadiran pasien terkonfirmasi'],
-                'recommendations': ['Lanjutkan pemeriksaan visual', 'Cek tanda vital']
+        Kolumnar: filter kelas dengan mask, class id -> kondisi lewat array
+        index, agregasi dengan np.unique. Dengan compact (default
+        TRIAGE_VISION_COMPACT_OUTPUT) deteksi berupa kolom array, bukan dict
+        per box.
+        """
+        if compact is None:
+            compact = config.VISION_COMPACT_OUTPUT
+        table = self._class_table()
+
+        boxes, scores, classes = result.boxes, result.scores, result.classes
+        # Model standar: hanya 'person' (class 0); model custom: semua kelas,
+        # termasuk id di luar tabel (dinamai class_<id>)
+        if table.standard:
+            keep = classes == 0
+            boxes, scores, classes = boxes[keep], scores[keep], classes[keep]
+        in_range = (classes >= 0) & (classes < len(table.names))
+        safe = np.where(in_range, classes, 0)
+
+        names = table.names[safe]
+        if not in_range.all():
+            names = names.copy()
+            for i in np.flatnonzero(~in_range):
+                names[i] = f"class_{classes[i]}"
+        condition_index = np.where(in_range, table.condition_index[safe], -1)
+
+        matched = condition_index >= 0
+        matched_index = condition_index[matched]
+        matched_scores = scores[matched]
+        health_analysis = self._aggregate_health_analysis(table, matched_index)
+
+        # Tambahkan metadata
+        health_analysis['model_type'] = 'Standard/Demo' if self.using_standard_model else 'Medical/Custom'
+
+        if compact:
+            detections = {
+                'boxes': boxes.tolist(),
+                'scores': scores.tolist(),
+                'classes': names.tolist()
             }
+            health_conditions = self._condition_summary(table, matched_index, matched_scores)
+        else:
+            detections = [
+                {'class': name, 'confidence': confidence, 'bbox': box}
+                for name, confidence, box in zip(names.tolist(), scores.tolist(), boxes.tolist())
+            ]
+            health_conditions = [
+                {**table.condition_dicts[index], 'confidence': confidence}
+                for index, confidence in zip(matched_index.tolist(), matched_scores.tolist())
+            ]
 
-        health_mapping = {
-            'normal_posture': {
-                'condition': 'Postur Normal',
-                'severity': 'LOW',
-                'symptoms': [],
-                'recommendations': ['Pertahankan postur baik']
-            },
-            'abnormal_posture': {
-                'condition': 'Postur Abnormal',
-                'severity': 'MEDIUM',
-                'symptoms': ['Postur tubuh tidak normal'],
-                'recommendations': ['Perbaiki postur', 'Konsultasi fisioterapis']
-            },
-            'fatigue_signs': {
-                'condition': 'Tanda-tanda Kelelahan',
-                'severity': 'MEDIUM',
-                'symptoms': ['Kelelahan fisik', 'Mata lelah', 'Ekspresi lelah'],
-                'recommendations': ['Istirahat cukup', 'Minum air', 'Olahraga ringan']
-            },
-            'distress_signs': {
-                'condition': 'Tanda-tanda Distress',
-                'severity': 'HIGH',
-                'symptoms': ['Kecemasan', 'Ketegangan', 'Gelagat tidak nyaman'],
-                'recommendations': ['Tenangkan pasien', 'Hubungi keluarga', 'Konsultasi psikolog']
-            },
-            'pain_expression': {
-                'condition': 'Ekspresi Nyeri',
-                'severity': 'HIGH',
-                'symptoms': ['Nyeri fisik', 'Ketidaknyamanan', 'Wajah meringis'],
-                'recommendations': ['Berikan analgesik', 'Identifikasi sumber nyeri', 'Pantau kondisi']
-            },
-            'breathing_difficulty': {
-                'condition': 'Kesulitan Bernapas',
-                'severity': 'CRITICAL',
-                'symptoms': ['Sesak napas', 'Napas cepat', 'Napas berbunyi'],
-                'recommendations': ['Berikan oksigen', 'Siapkan ventilator', 'Hubungi tim medis darurat']
-            }
+        return {
+            'detections': detections,
+            'health_conditions': health_conditions,
+            'overall_analysis': health_analysis,
+            'model_used': 'YOLOv8n' if self.using_standard_model else 'CustomYOLO',
+            'model_backend': self.model.name,
+            'confidence': 0.85,
+            'batch_size': batch_size,
+            'cache_hit': cache_hit,
+            'motion_skipped': False,
+            'tier': tier
         }
 
-        if class_name in health_mapping:
-            condition = health_mapping[class_name].copy()
-            condition['confidence'] = confidence
-            return condition
-
-        return None
-
-    def _aggregate_health_analysis(self, health_conditions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Aggregate multiple health conditions menjadi analisis keseluruhan"""
+    def _preprocess(self, image_bytes: bytes, imgsz: int) -> Optional[PreparedFrame]:
+        """
+        Decode (JPEG langsung pada resolusi tereduksi) lalu letterbox ke
+        buffer input model (imgsz) milik thread ini
 
-        if not health_conditions:
+        Buffer tidak ditimpa selama thread masih menunggu hasil batch-nya,
+        karena thread yang sama baru memakai buffer lagi di request berikutnya.
+        """
+        with time_stage("image_decode"):
+            decoded = decode_image(image_bytes, imgsz if config.REDUCED_DECODE else None)
+            if decoded is None:
+                return None
+            image, shape, reduction = decoded
+            return prepare_frame(image, imgsz, shape=shape, reduction=reduction, out=self._input_buffer(imgsz))
+
+    def _input_buffer(self, imgsz: int) -> np.ndarray:
+        """Buffer (imgsz, imgsz, 3) milik thread pemanggil, satu per ukuran input tier"""
+        buffers = getattr(self._buffers, 'frames', None)
+        if buffers is None:
+            buffers = self._buffers.frames = {}
+        buffer = buffers.get(imgsz)
+        if buffer is None:
+            buffer = buffers[imgsz] = np.empty((imgsz, imgsz, 3), dtype=np.uint8)
+        return buffer
+
+    def _infer_batch(self, images: List[np.ndarray]) -> List[Detections]:
+        """Satu forward pass untuk sekumpulan frame (satu ukuran, lihat InferenceBatcher)"""
+        imgsz = images[0].shape[0]
+        if imgsz != self.model.imgsz:
+            return self.model.predict(images, imgsz=imgsz)
+        return self.model.predict(images)
+
+    def _infer_small_batch(self, images: List[np.ndarray]) -> List[Detections]:
+        """Forward pass model kecil (tier 'small')"""
+        return self.small_model.predict(images)
+
+    @staticmethod
+    def _aggregate_health_analysis(table: "ClassTable", condition_index: np.ndarray) -> Dict[str, Any]:
+        """Aggregate kondisi kesehatan (index per deteksi) menjadi analisis keseluruhan"""
+
+        if not len(condition_index):
             return {
                 'status': 'NORMAL',
                 'message': 'Tidak ada kondisi abnormal terdeteksi',
@@ -235,37 +794,20 @@ class YOLOHealthAnalyzer:
                 'recommendations': ['Lanjutkan pemantauan rutin']
             }
 
-        # Hitung severity tertinggi
-        severity_levels = {'LOW': 1, 'MEDIUM': 2, 'HIGH': 3, 'CRITICAL': 4}
-        max_severity = max(health_conditions, key=lambda x: severity_levels.get(x['severity'], 1))
+        # Kondisi unik dalam urutan kemunculan pertama
+        unique, first = np.unique(condition_index, return_index=True)
+        present = unique[np.argsort(first)]
+        conditions = [table.conditions[i] for i in present.tolist()]
 
-        # Aggregate symptoms dan recommendations
-        all_symptoms = []
-        all_recommendations = []
+        # Severity tertinggi
+        severity = table.conditions[present[np.argmax(table.severity_rank[present])]].severity
 
-        for condition in health_conditions:
-            all_symptoms.extend(condition.get('symptoms', []))
-            all_recommendations.extend(condition.get('recommendations', []))
-
-        # Remove duplicates
-        all_symptoms = list(set(all_symptoms))
-        all_recommendations = list(set(all_recommendations))
+        # Aggregate symptoms dan recommendations (tanpa duplikat, urutan tetap)
+        all_symptoms = list(dict.fromkeys(s for condition in conditions for s in condition.symptoms))
+        all_recommendations = list(dict.fromkeys(r for condition in conditions for r in condition.recommendations))
 
         # Determine overall status
-        severity = max_severity['severity']
-
-        if severity == 'CRITICAL':
-            status = 'DARURAT'
-            message = 'Perlu penanganan darurat segera!'
-        elif severity == 'HIGH':
-            status = 'KRITIS'
-            message = 'Perlu perhatian medis segera'
-        elif severity == 'MEDIUM':
-            status = 'WASPADA'
-            message = 'Perlu pemantauan kesehatan'
-        else:
-            status = 'NORMAL'
-            message = 'Kondisi dalam batas normal'
+        status, message = table.rules.vision_outcomes[severity]
 
         return {
             'status': status,
@@ -273,11 +815,42 @@ class YOLOHealthAnalyzer:
             'risk_level': severity,
             'symptoms': all_symptoms,
             'recommendations': all_recommendations,
-            'detected_conditions': [c['condition'] for c in health_conditions]
+            'detected_conditions': [table.condition_names[i] for i in condition_index.tolist()]
         }
 
-    def _fallback_analysis(self) -> Dict[str, Any]:
-        """Fallback analysis jika model tidak tersedia"""
+    @staticmethod
+    def _condition_summary(table: "ClassTable", condition_index: np.ndarray,
+                           scores: np.ndarray) -> List[Dict[str, Any]]:
+        """Satu entri per kondisi: jumlah deteksi dan confidence tertinggi"""
+        if not len(condition_index):
+            return []
+        unique, first, inverse, counts = np.unique(condition_index, return_index=True,
+                                                   return_inverse=True, return_counts=True)
+        best = np.zeros(len(unique), dtype=np.float64)
+        np.maximum.at(best, inverse, scores)
+        return [
+            {
+                'condition': table.conditions[unique[k]].condition,
+                'severity': table.conditions[unique[k]].severity,
+                'count': int(counts[k]),
+                'max_confidence': float(best[k])
+            }
+            for k in np.argsort(first).tolist()
+        ]
+
+    @staticmethod
+    def _condition_to_dict(condition: VisionCondition, confidence: float) -> Dict[str, Any]:
+        return {
+            'condition': condition.condition,
+            'severity': condition.severity,
+            'symptoms': list(condition.symptoms),
+            'recommendations': list(condition.recommendations),
+            'confidence': confidence
+        }
+
+    def _fallback_analysis(self, reason: str = "model_unavailable") -> Dict[str, Any]:
+        """Fallback analysis jika model tidak tersedia (reason dicatat di /metrics)"""
+        VISION_FALLBACKS.inc(reason=reason)
         return {
             'detections': [],
             'health_conditions': [],
@@ -292,17 +865,35 @@ class YOLOHealthAnalyzer:
             'confidence': 0.5
         }
 
-# Global instance
-yolo_analyzer = YOLOHealthAnalyzer()
+# Global instance (model dimuat lewat yolo_analyzer.start_background_load())
+yolo_analyzer = YOLOHealthAnalyzer(config.MODEL_PATH, backend=config.INFERENCE_BACKEND)
 
-def analyze_health_image(image_data: str) -> Dict[str, Any]:
+def analyze_health_image(image_data: str, station_id: Optional[str] = None,
+                         tier: str = TIER_FULL) -> Dict[str, Any]:
     """
     Function untuk analisis gambar kesehatan (untuk import mudah)
 
     Args:
         image_data: Base64 encoded image
+        station_id: ID station feed kamera (opsional, untuk motion gate)
+        tier: Tier degradasi (full, reduced, small)
+
+    Returns:
+        Dictionary hasil analisis
+    """
+    return yolo_analyzer.analyze_image(image_data, station_id, tier)
+
+def analyze_health_image_bytes(image_bytes: bytes, station_id: Optional[str] = None,
+                               tier: str = TIER_FULL) -> Dict[str, Any]:
+    """
+    Function untuk analisis gambar biner (JPEG/PNG) tanpa base64
+
+    Args:
+        image_bytes: Isi file gambar
+        station_id: ID station feed kamera (opsional, untuk motion gate)
+        tier: Tier degradasi (full, reduced, small)
 
     Returns:
         Dictionary hasil analisis
     """
-    return yolo_analyzer.analyze_image(image_data)
\ No newline at end of file
+    return yolo_analyzer.analyze_image_bytes(image_bytes, station_id, tier)